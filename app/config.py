@@ -1,3 +1,4 @@
+import json
 import os
 from dataclasses import dataclass
 from dotenv import load_dotenv
@@ -20,6 +21,62 @@ def _parse_admin_user_ids(value: str) -> tuple[int, ...]:
     return tuple(result)
 
 
+@dataclass(frozen=True)
+class LLMProviderConfig:
+    name: str
+    base_url: str
+    api_key: str
+    model: str
+    whisper_model: str = "whisper-1"
+    fast_model: str = ""  # дешёвая быстрая модель первого прохода (если пусто — только model)
+    rpm: int = 0  # лимит запросов в минуту у провайдера (0 — без ограничения)
+    tpm: int = 0  # лимит токенов в минуту (0 — без ограничения)
+
+
+def _parse_llm_providers(value: str) -> tuple[LLMProviderConfig, ...]:
+    """
+    LLM_PROVIDERS — JSON-список провайдеров в порядке приоритета:
+    [{"name": "main", "base_url": "...", "api_key": "...", "model": "...", "fast_model": "...",
+      "whisper_model": "whisper-1", "rpm": 500, "tpm": 200000}, ...]
+    Если не задан (или не разобрался) — используется один провайдер из LLM_BASE_URL/LLM_API_KEY/LLM_MODEL.
+    """
+    result: list[LLMProviderConfig] = []
+    try:
+        items = json.loads(value) if value else []
+    except ValueError:
+        items = []
+    for i, item in enumerate(items if isinstance(items, list) else []):
+        if not isinstance(item, dict):
+            continue
+        result.append(
+            LLMProviderConfig(
+                name=str(item.get("name") or f"provider{i + 1}"),
+                base_url=str(item.get("base_url") or ""),
+                api_key=str(item.get("api_key") or ""),
+                model=str(item.get("model") or ""),
+                whisper_model=str(item.get("whisper_model") or os.getenv("WHISPER_MODEL", "whisper-1")),
+                fast_model=str(item.get("fast_model") or os.getenv("LLM_FAST_MODEL", "")),
+                rpm=int(item.get("rpm") or os.getenv("LLM_RPM", "0")),
+                tpm=int(item.get("tpm") or os.getenv("LLM_TPM", "0")),
+            )
+        )
+    if result:
+        return tuple(result)
+
+    return (
+        LLMProviderConfig(
+            name="default",
+            base_url=os.getenv("LLM_BASE_URL", ""),
+            api_key=os.getenv("LLM_API_KEY", ""),
+            model=os.getenv("LLM_MODEL", ""),
+            whisper_model=os.getenv("WHISPER_MODEL", "whisper-1"),
+            fast_model=os.getenv("LLM_FAST_MODEL", ""),
+            rpm=int(os.getenv("LLM_RPM", "0")),
+            tpm=int(os.getenv("LLM_TPM", "0")),
+        ),
+    )
+
+
 @dataclass(frozen=True)
 class Settings:
     # Telegram
@@ -33,12 +90,99 @@ class Settings:
     google_oauth_client_path: str = os.getenv("GOOGLE_OAUTH_CLIENT_PATH", "")
     google_sheets_spreadsheet_id: str = os.getenv("GOOGLE_SHEETS_SPREADSHEET_ID", "")
     google_sheets_journal_sheet_name: str = os.getenv("GOOGLE_SHEETS_JOURNAL_SHEET_NAME", "Журнал")
+    # Разбиение журнала на листы по периоду записи: none | year ("Журнал 2026") | month ("Журнал 2026-02")
+    journal_partition: str = os.getenv("JOURNAL_PARTITION", "none").strip().lower()
+    # Проверять перед записью по счётчику, что строки в конце журнала свободны (лишнее чтение на каждую запись;
+    # включать, если строки в журнал добавляют руками)
+    journal_verify_next_rows: bool = os.getenv("JOURNAL_VERIFY_NEXT_ROWS", "0") == "1"
     # LLM (OpenAI-compatible)
     llm_base_url: str = os.getenv("LLM_BASE_URL", "")
     llm_api_key: str = os.getenv("LLM_API_KEY", "")
     llm_model: str = os.getenv("LLM_MODEL", "")
     llm_enabled: bool = os.getenv("LLM_ENABLED", "0") == "1"
+    # Таймаут одного HTTP-запроса и общий бюджет на сообщение (обе попытки)
+    llm_timeout_s: float = float(os.getenv("LLM_TIMEOUT_S", "10"))
+    llm_budget_s: float = float(os.getenv("LLM_BUDGET_S", "12"))
+    # Двухуровневый разбор: быстрая модель (LLM_FAST_MODEL) сначала, основная — только если
+    # результат попал под одно из правил эскалации: needs_review, unknown_category, zero_amount
+    llm_escalate_on: tuple[str, ...] = tuple(
+        part.strip()
+        for part in os.getenv("LLM_ESCALATE_ON", "needs_review,unknown_category,zero_amount").split(",")
+        if part.strip()
+    )
+    # SSE-стриминг: ответ разбирается, как только закрылся JSON-объект
+    llm_stream: bool = os.getenv("LLM_STREAM", "0") == "1"
+    # Circuit breaker: сколько ошибок/медленных ответов подряд, что считать медленным, пауза
+    llm_breaker_failures: int = int(os.getenv("LLM_BREAKER_FAILURES", "3"))
+    llm_breaker_slow_s: float = float(os.getenv("LLM_BREAKER_SLOW_S", "8"))
+    llm_breaker_open_s: float = float(os.getenv("LLM_BREAKER_OPEN_S", "30"))
     whisper_model: str = os.getenv("WHISPER_MODEL", "whisper-1")
+    # Длинные голосовые режутся по паузам и распознаются параллельно (нужен ffmpeg; 0 — выключено)
+    whisper_chunk_threshold_s: float = float(os.getenv("WHISPER_CHUNK_THRESHOLD_S", "40"))
+    whisper_chunk_target_s: float = float(os.getenv("WHISPER_CHUNK_TARGET_S", "30"))
+    whisper_chunk_max_s: float = float(os.getenv("WHISPER_CHUNK_MAX_S", "45"))
+    whisper_chunk_parallelism: int = int(os.getenv("WHISPER_CHUNK_PARALLELISM", "4"))
+    # Предобработка перед загрузкой (нужен ffmpeg): моно 16 кГц, обрезка тишины, отказ на пустых голосовых
+    whisper_preprocess: bool = os.getenv("WHISPER_PREPROCESS", "1") == "1"
+    whisper_silence_rms: float = float(os.getenv("WHISPER_SILENCE_RMS", "300"))
+    whisper_min_speech_s: float = float(os.getenv("WHISPER_MIN_SPEECH_S", "0.3"))
+    # Бэкенд распознавания: remote (Whisper API провайдеров) или local (faster-whisper на CPU, int8)
+    transcriber_backend: str = os.getenv("TRANSCRIBER_BACKEND", "remote").strip().lower()
+    local_whisper_model: str = os.getenv("LOCAL_WHISPER_MODEL", "small")
+    local_whisper_compute_type: str = os.getenv("LOCAL_WHISPER_COMPUTE_TYPE", "int8")
+    local_whisper_workers: int = int(os.getenv("LOCAL_WHISPER_WORKERS", "1"))
+    local_whisper_cpu_threads: int = int(os.getenv("LOCAL_WHISPER_CPU_THREADS", "0"))
+    local_whisper_language: str = os.getenv("LOCAL_WHISPER_LANGUAGE", "ru")
+    # Голосовые длиннее — сразу в удалённый Whisper (0 — всё локально)
+    local_whisper_max_s: float = float(os.getenv("LOCAL_WHISPER_MAX_S", "60"))
+    # Очередь голосовых: одновременно обрабатываемых и максимум ожидающих (остальным — вежливый отказ)
+    voice_workers: int = int(os.getenv("VOICE_WORKERS", "2"))
+    voice_queue_max: int = int(os.getenv("VOICE_QUEUE_MAX", "20"))
+    # Несколько OpenAI-совместимых провайдеров (LLM и Whisper) в порядке приоритета
+    llm_providers: tuple[LLMProviderConfig, ...] = _parse_llm_providers(os.getenv("LLM_PROVIDERS", ""))
+    # Hedging: через сколько секунд (p95 основного провайдера, но не меньше min) слать запрос резервному
+    llm_hedge_min_delay_s: float = float(os.getenv("LLM_HEDGE_MIN_DELAY_S", "0.5"))
+    llm_hedge_default_delay_s: float = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY_S", "3"))
+    # Общий планировщик LLM/Whisper: одновременных HTTP-запросов (hedged-запрос — отдельный слот)
+    # и предельная длина очереди по классам
+    llm_max_in_flight: int = int(os.getenv("LLM_MAX_IN_FLIGHT", "8"))
+    llm_max_queue_text: int = int(os.getenv("LLM_MAX_QUEUE_TEXT", "50"))
+    llm_max_queue_voice: int = int(os.getenv("LLM_MAX_QUEUE_VOICE", "20"))
+    llm_max_queue_background: int = int(os.getenv("LLM_MAX_QUEUE_BACKGROUND", "5"))
+    # Учёт расхода LLM/Whisper (токены, секунды аудио, попытки, время) по дням и пользователям
+    usage_path: str = os.getenv("USAGE_PATH", "storage/usage.sqlite3")
+
+    # Локальный outbox операций (пишем сюда до Google Sheets)
+    outbox_path: str = os.getenv("OUTBOX_PATH", "storage/outbox.sqlite3")
+    outbox_batch_size: int = int(os.getenv("OUTBOX_BATCH_SIZE", "20"))
+    outbox_replay_interval_s: float = float(os.getenv("OUTBOX_REPLAY_INTERVAL_S", "10"))
+    # Сколько раз пробовать отправить операцию, прежде чем отложить её до перезапуска
+    outbox_max_attempts: int = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+    # Проверка дублей: окно последних tg_message_id + фильтр Блума по всему журналу (файл на диске)
+    dedup_path: str = os.getenv("DEDUP_PATH", "storage/dedup.bloom")
+    dedup_window: int = int(os.getenv("DEDUP_WINDOW", "5000"))
+    dedup_capacity: int = int(os.getenv("DEDUP_CAPACITY", "1000000"))
+    dedup_error_rate: float = float(os.getenv("DEDUP_ERROR_RATE", "0.001"))
+    dedup_save_interval_s: float = float(os.getenv("DEDUP_SAVE_INTERVAL_S", "60"))
+
+    # Локальный классификатор категорий (по журналу): уверенный прогноз — без вызова LLM
+    classifier_enabled: bool = os.getenv("CLASSIFIER_ENABLED", "1") == "1"
+    classifier_min_confidence: float = float(os.getenv("CLASSIFIER_MIN_CONFIDENCE", "0.95"))
+    classifier_min_examples: int = int(os.getenv("CLASSIFIER_MIN_EXAMPLES", "20"))
+    # Алиасы пользователя (слово/магазин -> категория), выученные из ручного выбора категории
+    aliases_path: str = os.getenv("ALIASES_PATH", "storage/aliases.sqlite3")
+    # Few-shot из истории: сколько похожих прошлых операций подставлять в промпт (0 — выключено)
+    llm_examples_k: int = int(os.getenv("LLM_EXAMPLES_K", "3"))
+    llm_examples_min_similarity: float = float(os.getenv("LLM_EXAMPLES_MIN_SIMILARITY", "0.3"))
+
+    # Фоновый разбор pending-строк: как часто, сколько за раз, с какого возраста строки, сколько попыток LLM
+    pending_sweep_enabled: bool = os.getenv("PENDING_SWEEP_ENABLED", "1") == "1"
+    pending_sweep_interval_s: float = float(os.getenv("PENDING_SWEEP_INTERVAL_S", "300"))
+    pending_sweep_batch_size: int = int(os.getenv("PENDING_SWEEP_BATCH_SIZE", "20"))
+    pending_sweep_min_age_s: float = float(os.getenv("PENDING_SWEEP_MIN_AGE_S", "600"))
+    pending_sweep_max_attempts: int = int(os.getenv("PENDING_SWEEP_MAX_ATTEMPTS", "3"))
+    # Присылать пользователю одно сообщение со списком фоном разобранных записей
+    pending_digest: bool = os.getenv("PENDING_DIGEST", "1") == "1"
 
 
 def get_settings() -> Settings:
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import time
+from typing import Callable
+
+from app.event_log import log_event
+
+
+class CircuitBreaker:
+    """
+    Простой circuit breaker для внешнего провайдера.
+
+    - closed: запросы идут как обычно; считаем подряд идущие ошибки/медленные ответы
+    - open: запросы сразу отклоняются (вызывающий код уходит в pending)
+    - half_open: после паузы пропускаем один пробный запрос;
+      успех -> closed, ошибка -> снова open
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str = "llm",
+        failure_threshold: int = 3,
+        slow_call_s: float = 10.0,
+        open_s: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.slow_call_s = slow_call_s
+        self.open_s = open_s
+        self._clock = clock
+
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    def _transition(self, new_state: str, reason: str) -> None:
+        if new_state == self.state:
+            return
+        log_event(f"Circuit breaker [{self.name}]: {self.state} -> {new_state} ({reason}).")
+        self.state = new_state
+        if new_state == self.OPEN:
+            self._opened_at = self._clock()
+        if new_state != self.HALF_OPEN:
+            self._probe_in_flight = False
+
+    def allow_request(self) -> bool:
+        """
+        Можно ли сейчас отправлять запрос провайдеру.
+        """
+        if self.state == self.OPEN and self._clock() - self._opened_at >= self.open_s:
+            self._transition(self.HALF_OPEN, "пауза истекла, пробуем один запрос")
+
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        return False
+
+    def is_available(self) -> bool:
+        """
+        Как allow_request, но без резервирования пробного запроса.
+        """
+        if self.state == self.OPEN:
+            return self._clock() - self._opened_at >= self.open_s
+        if self.state == self.HALF_OPEN:
+            return not self._probe_in_flight
+        return True
+
+    def record_success(self, elapsed_s: float) -> None:
+        if elapsed_s > self.slow_call_s:
+            self.record_failure(f"медленный ответ {elapsed_s:.1f} с")
+            return
+        self._failures = 0
+        self._transition(self.CLOSED, "успешный ответ")
+
+    def release_probe(self) -> None:
+        """
+        Запрос отменён вызывающим кодом: результата нет, разрешаем новый пробный запрос.
+        """
+        self._probe_in_flight = False
+
+    def record_failure(self, reason: str) -> None:
+        self._failures += 1
+        if self.state == self.HALF_OPEN:
+            self._transition(self.OPEN, f"пробный запрос неуспешен: {reason}")
+        elif self.state == self.CLOSED and self._failures >= self.failure_threshold:
+            self._transition(self.OPEN, f"{self._failures} неуспешных запросов подряд: {reason}")
@@ -1,8 +1,28 @@
-import json
-from typing import Any, Dict
+import asyncio
+import contextlib
+import time
+from typing import Any, Dict, Mapping, Optional
 
 import httpx
 
+from app.event_log import log_event
+from app.llm.json_repair import REPAIR_STATS, JsonRepairError, extract_json_object
+from app.llm.json_stream import read_json_text_from_sse
+from app.llm.providers import TIER_FAST, TIER_STRONG, NoProviderAvailableError, Provider, ProviderPool
+from app.llm.scheduler import PRIORITY_TEXT, RequestScheduler, SchedulerOverloadedError
+from app.llm.usage import KIND_LLM, OUTCOME_ERROR, OUTCOME_UNAVAILABLE, CallUsage, UsageStore
+
+# Запас на ответ модели при оценке токенов запроса (JSON операции короткий)
+ESTIMATED_COMPLETION_TOKENS = 150
+
+
+class LLMUnavailableError(RuntimeError):
+    """
+    LLM сейчас не используется: все провайдеры выключены circuit breaker'ом
+    или исчерпан бюджет времени.
+    Вызывающий код должен уйти в pending-режим.
+    """
+
 
 class LLMClient:
     """
@@ -10,33 +30,130 @@ class LLMClient:
 
     Ожидаем endpoint:
       POST {base_url}/chat/completions
+
+    Запросы идут через ProviderPool (несколько провайдеров, hedged-запросы).
+    timeout_s — таймаут одного HTTP-запроса,
+    budget_s — общий бюджет времени на сообщение (все попытки и провайдеры вместе),
+    stream — первая попытка идёт через SSE (stream=true) и завершается, как только
+    в потоке закрылся JSON-объект; остаток потока отменяется,
+    escalate_on — правила, по которым ответ быстрой модели отправляется основной
+    (см. gpt_parse_service),
+    scheduler — общий планировщик (лимит одновременных запросов, приоритеты, load shedding),
+    usage_store — учёт токенов, попыток и времени по пользователям и дням.
     """
 
-    def __init__(self, base_url: str, api_key: str, model: str, timeout_s: float = 30.0):
-        if not base_url:
-            raise ValueError("LLM_BASE_URL is empty")
-        if not api_key:
-            raise ValueError("LLM_API_KEY is empty")
-        if not model:
-            raise ValueError("LLM_MODEL is empty")
-
-        self.base_url = base_url.rstrip("/")
-        self.api_key = api_key
-        self.model = model
+    TIER_FAST = TIER_FAST
+    TIER_STRONG = TIER_STRONG
+
+    def __init__(
+        self,
+        providers: ProviderPool,
+        timeout_s: float = 30.0,
+        budget_s: float = 12.0,
+        stream: bool = False,
+        escalate_on: tuple[str, ...] = (),
+        scheduler: Optional[RequestScheduler] = None,
+        usage_store: Optional[UsageStore] = None,
+    ):
+        self.providers = providers
         self.timeout_s = timeout_s
+        self.budget_s = budget_s
+        self.stream = stream
+        self.escalate_on = frozenset(escalate_on)
+        self.scheduler = scheduler
+        self.usage_store = usage_store
+
+    def is_available(self) -> bool:
+        return self.providers.is_available()
+
+    def has_fast_tier(self) -> bool:
+        return self.providers.has_fast_tier()
+
+    def new_deadline(self) -> float:
+        """
+        Срок для всех вызовов chat_json по одному сообщению (быстрая модель + эскалация).
+        """
+        return time.monotonic() + self.budget_s
 
-    def chat_json(self, system: str, user: str) -> Dict[str, Any]:
+    @staticmethod
+    def estimate_tokens(system: str, user: str) -> int:
+        # Грубо: ~3 символа на токен для смеси русского и латиницы.
+        return (len(system) + len(user)) // 3 + ESTIMATED_COMPLETION_TOKENS
+
+    async def chat_json(
+        self,
+        system: str,
+        user: str,
+        tier: str = TIER_STRONG,
+        schema: Optional[Mapping[str, Any]] = None,
+        priority: int = PRIORITY_TEXT,
+        tg_user_id: int = 0,
+        deadline: Optional[float] = None,
+    ) -> Dict[str, Any]:
         """
         Возвращает dict (JSON), который модель обязана выдать.
+        tier="fast" — использовать fast_model провайдера (если задана).
+        schema — {ключ: тип(ы)}; ответ чинится локально (json_repair) и проверяется по ней.
+        priority — класс запроса для планировщика (текст, голос, фон).
+        tg_user_id — для учёта расхода (0 — фоновые задачи без конкретного пользователя).
+        Все попытки, включая ожидание в очереди планировщика, укладываются в общий бюджет budget_s.
+        deadline — общий срок (time.monotonic(), см. new_deadline) для нескольких вызовов на одно сообщение:
+        вызов получает только оставшееся до него время.
+        Если все провайдеры выключены breaker'ом, очередь переполнена или бюджет исчерпан —
+        LLMUnavailableError.
+        """
+        started = time.monotonic()
+        budget_s = self.budget_s if deadline is None else max(0.0, min(self.budget_s, deadline - started))
+        usage = CallUsage(kind=KIND_LLM, tg_user_id=tg_user_id)
+        slot = self.scheduler.slot(priority) if self.scheduler is not None else contextlib.nullcontext()
+        try:
+            async with asyncio.timeout(budget_s), slot:
+                return await self.providers.call(
+                    lambda provider: self._chat_json_attempts(provider, system, user, tier, schema, usage),
+                    tokens=self.estimate_tokens(system, user),
+                    tier=tier,
+                    scheduler=self.scheduler,
+                )
+        except TimeoutError as e:
+            usage.outcome = OUTCOME_UNAVAILABLE
+            elapsed = time.monotonic() - started
+            log_event(f"LLM: превышен бюджет {budget_s:.1f} с на сообщение ({elapsed:.1f} с).")
+            raise LLMUnavailableError(f"LLM budget of {budget_s:.1f}s exceeded") from e
+        except (NoProviderAvailableError, SchedulerOverloadedError) as e:
+            usage.outcome = OUTCOME_UNAVAILABLE
+            raise LLMUnavailableError(str(e)) from e
+        except BaseException:
+            usage.outcome = OUTCOME_ERROR
+            raise
+        finally:
+            usage.wall_s = time.monotonic() - started
+            if self.usage_store is not None:
+                try:
+                    self.usage_store.record(usage)
+                except Exception as e:
+                    log_event(f"LLM: не удалось записать учёт расхода: {repr(e)}")
+
+    async def _chat_json_attempts(
+        self,
+        provider: Provider,
+        system: str,
+        user: str,
+        tier: str = TIER_STRONG,
+        schema: Optional[Mapping[str, Any]] = None,
+        usage: Optional[CallUsage] = None,
+    ) -> Dict[str, Any]:
+        """
         Делаем 2 попытки:
-        1) с response_format (если провайдер поддерживает)
-        2) без response_format (fallback)
+        1) с response_format (если провайдер поддерживает), в stream-режиме — через SSE
+        2) без response_format и без стриминга (fallback)
+        Вторая попытка нужна, только если первая упала по HTTP или её ответ
+        не удалось починить локально (```-ограждения, текст вокруг, висячие запятые и т.п. чинятся).
         """
-        url = f"{self.base_url}/chat/completions"
-        headers = {"Authorization": f"Bearer {self.api_key}"}
+        url = f"{provider.base_url}/chat/completions"
+        headers = {"Authorization": f"Bearer {provider.api_key}"}
 
         base_payload: Dict[str, Any] = {
-            "model": self.model,
+            "model": (provider.fast_model or provider.model) if tier == self.TIER_FAST else provider.model,
             "temperature": 0,
             "messages": [
                 {"role": "system", "content": system},
@@ -44,7 +161,10 @@ class LLMClient:
             ],
         }
 
-        def _extract_json(resp_json: Dict[str, Any]) -> Dict[str, Any]:
+        usage = usage if usage is not None else CallUsage(kind=KIND_LLM)
+
+        def _extract_content(resp_json: Dict[str, Any]) -> str:
+            usage.add_usage(resp_json.get("usage"))
             try:
                 content = resp_json["choices"][0]["message"]["content"]
             except Exception as e:
@@ -52,22 +172,51 @@ class LLMClient:
 
             if content is None or str(content).strip() == "":
                 raise ValueError("LLM returned empty content")
+            return str(content)
 
-            try:
-                return json.loads(content)
-            except Exception as e:
-                raise ValueError(f"LLM returned non-JSON: {content}") from e
-
-        with httpx.Client(timeout=self.timeout_s) as client:
+        async with httpx.AsyncClient(timeout=self.timeout_s) as client:
             # Try 1: with response_format
             payload = dict(base_payload)
             payload["response_format"] = {"type": "json_object"}
             try:
-                resp = client.post(url, headers=headers, json=payload)
-                resp.raise_for_status()
-                return _extract_json(resp.json())
-            except Exception:
+                usage.attempts += 1
+                if self.stream:
+                    content = await self._stream_content(client, url, headers, payload)
+                    # В SSE usage приходит только в конце потока, а мы его не дочитываем — оцениваем.
+                    usage.add_usage(None, (len(system) + len(user)) // 3, len(content) // 3)
+                else:
+                    resp = await client.post(url, headers=headers, json=payload)
+                    resp.raise_for_status()
+                    content = _extract_content(resp.json())
+                return extract_json_object(content, schema)
+            except (asyncio.CancelledError, TimeoutError):
+                raise
+            except Exception as e:
+                if isinstance(e, JsonRepairError):
+                    REPAIR_STATS["retry"] += 1
+                    log_event(
+                        f"LLM: ответ не удалось починить локально, повторяем запрос. "
+                        f"Счётчики: {dict(REPAIR_STATS)}."
+                    )
                 # Try 2: without response_format
-                resp = client.post(url, headers=headers, json=base_payload)
+                usage.attempts += 1
+                resp = await client.post(url, headers=headers, json=base_payload)
                 resp.raise_for_status()
-                return _extract_json(resp.json())
\ No newline at end of file
+                return extract_json_object(_extract_content(resp.json()), schema)
+
+    async def _stream_content(
+        self,
+        client: httpx.AsyncClient,
+        url: str,
+        headers: Dict[str, str],
+        payload: Dict[str, Any],
+    ) -> str:
+        """
+        SSE-запрос: возвращаем текст JSON, как только закрылась его внешняя скобка.
+        Выход из контекста stream закрывает соединение — хвост ответа не читаем.
+        """
+        payload = dict(payload)
+        payload["stream"] = True
+        async with client.stream("POST", url, headers=headers, json=payload) as resp:
+            resp.raise_for_status()
+            return await read_json_text_from_sse(resp.aiter_lines())
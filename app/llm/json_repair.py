@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import json
+import re
+from collections import Counter
+from typing import Any, Mapping, Optional
+
+from app.llm.json_stream import JsonObjectScanner
+
+# Счётчики: clean — ответ разобрался как есть, repaired — починили локально,
+# retry — починить не удалось и пришлось повторить запрос.
+REPAIR_STATS: Counter[str] = Counter()
+
+_FENCE_RE = re.compile(r"```[a-zA-Z0-9_-]*\s*|```")
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "„": '"', "«": '"', "»": '"'})
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+
+class JsonRepairError(ValueError):
+    """
+    Ответ модели не удалось превратить в JSON-объект нужной схемы.
+    """
+
+
+def _close_truncated(text: str) -> Optional[str]:
+    """
+    Если объект начался, но не закрылся (ответ обрезан), дописываем недостающие скобки.
+    """
+    scanner = JsonObjectScanner()
+    if scanner.feed(text) is not None or scanner.start is None:
+        return None
+    tail = '"' if scanner.in_string else ""
+    return text[scanner.start:] + tail + "}" * scanner.depth
+
+
+def _fix_common_slips(text: str) -> str:
+    """
+    Правит типичные ошибки вне строковых литералов:
+    одинарные кавычки, ключи без кавычек, True/False/None, висячие запятые, // комментарии.
+    """
+    text = text.translate(_SMART_QUOTES)
+    out: list[str] = []
+    i = 0
+    n = len(text)
+    while i < n:
+        ch = text[i]
+
+        if ch in "\"'":
+            # Строка: переписываем в двойные кавычки, экранирование сохраняем.
+            quote = ch
+            j = i + 1
+            buf: list[str] = []
+            while j < n and text[j] != quote:
+                if text[j] == "\\" and j + 1 < n:
+                    buf.append(text[j:j + 2])
+                    j += 2
+                    continue
+                if text[j] == '"' and quote == "'":
+                    buf.append('\\"')
+                else:
+                    buf.append(text[j])
+                j += 1
+            out.append('"' + "".join(buf) + '"')
+            i = j + 1
+            continue
+
+        if ch == "/" and text.startswith("//", i):
+            while i < n and text[i] != "\n":
+                i += 1
+            continue
+
+        if ch == ",":
+            j = i + 1
+            while j < n and text[j].isspace():
+                j += 1
+            if j < n and text[j] in "}]":
+                i += 1
+                continue
+
+        if ch.isalpha() or ch == "_":
+            j = i
+            while j < n and (text[j].isalnum() or text[j] == "_"):
+                j += 1
+            word = text[i:j]
+            k = j
+            while k < n and text[k].isspace():
+                k += 1
+            if k < n and text[k] == ":":
+                out.append(f'"{word}"')
+            else:
+                out.append(_LITERALS.get(word, word))
+            i = j
+            continue
+
+        out.append(ch)
+        i += 1
+    return "".join(out)
+
+
+def _validate(obj: Any, schema: Optional[Mapping[str, Any]]) -> dict:
+    if not isinstance(obj, dict):
+        raise JsonRepairError(f"LLM returned non-object JSON: {obj!r}")
+    if not schema:
+        return obj
+    missing = [key for key in schema if key not in obj]
+    if missing:
+        raise JsonRepairError(f"LLM JSON misses keys {missing}: {obj!r}")
+    for key, expected in schema.items():
+        if obj[key] is not None and not isinstance(obj[key], expected):
+            raise JsonRepairError(f"LLM JSON key {key!r} has type {type(obj[key]).__name__}: {obj!r}")
+    return obj
+
+
+def extract_json_object(content: str, schema: Optional[Mapping[str, Any]] = None) -> dict:
+    """
+    Достаёт JSON-объект из ответа модели и проверяет его по схеме {ключ: тип(ы)}.
+
+    Порядок: как есть -> без ```-ограждений и текста вокруг (первый сбалансированный объект)
+    -> с починкой типичных ошибок -> с закрытием обрезанного объекта.
+    Обновляет REPAIR_STATS (clean/repaired). Если ничего не помогло — JsonRepairError.
+    """
+    text = (content or "").strip()
+    if not text:
+        raise JsonRepairError("LLM returned empty content")
+
+    try:
+        obj = _validate(json.loads(text), schema)
+        REPAIR_STATS["clean"] += 1
+        return obj
+    except (ValueError, JsonRepairError):
+        pass
+
+    unfenced = _FENCE_RE.sub("", text)
+    candidates: list[str] = []
+    balanced = JsonObjectScanner().feed(unfenced)
+    if balanced is not None:
+        candidates.extend([balanced, _fix_common_slips(balanced)])
+    truncated = _close_truncated(unfenced)
+    if truncated is not None:
+        candidates.append(_fix_common_slips(truncated))
+
+    last_error = JsonRepairError(f"LLM returned non-JSON: {content}")
+    for candidate in candidates:
+        try:
+            obj = _validate(json.loads(candidate), schema)
+        except JsonRepairError as e:
+            last_error = e
+            continue
+        except ValueError:
+            continue
+        REPAIR_STATS["repaired"] += 1
+        return obj
+
+    raise last_error
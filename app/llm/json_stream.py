@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import json
+from typing import AsyncIterator, Optional
+
+
+class JsonObjectScanner:
+    """
+    Инкрементально ищет первый полностью закрытый JSON-объект верхнего уровня.
+
+    Текст подаётся кусками (feed); как только закрывается фигурная скобка,
+    открывшая объект, feed возвращает текст объекта. Скобки внутри строк
+    (с учётом экранирования) не считаются.
+    """
+
+    def __init__(self) -> None:
+        self._chunks: list[str] = []
+        self._length = 0
+        self._start: Optional[int] = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self.result: Optional[str] = None
+
+    @property
+    def start(self) -> Optional[int]:
+        """Позиция открывающей скобки объекта (None, если объект ещё не начался)."""
+        return self._start
+
+    @property
+    def depth(self) -> int:
+        return self._depth
+
+    @property
+    def in_string(self) -> bool:
+        return self._in_string
+
+    @property
+    def text(self) -> str:
+        return "".join(self._chunks)
+
+    def feed(self, chunk: str) -> Optional[str]:
+        if self.result is not None:
+            return self.result
+
+        offset = self._length
+        self._chunks.append(chunk)
+        self._length += len(chunk)
+
+        for i, ch in enumerate(chunk):
+            if self._start is None:
+                if ch == "{":
+                    self._start = offset + i
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                self._in_string = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self.result = self.text[self._start:offset + i + 1]
+                    return self.result
+        return None
+
+
+async def read_json_text_from_sse(lines: AsyncIterator[str]) -> str:
+    """
+    Читает SSE-поток Chat Completions (stream=true) и возвращает текст первого JSON-объекта
+    из delta.content, не дожидаясь конца потока. Остаток потока вызывающий код закрывает сам.
+    Если объект так и не закрылся — возвращает весь накопленный текст (его попробуют починить).
+    """
+    scanner = JsonObjectScanner()
+    async for line in lines:
+        if not line.startswith("data:"):
+            continue
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            break
+        try:
+            event = json.loads(data)
+        except ValueError:
+            continue
+        if not isinstance(event, dict):
+            # data: [..] / "..." — не событие Chat Completions
+            continue
+
+        choices = event.get("choices")
+        choice = choices[0] if isinstance(choices, list) and choices else None
+        delta = choice.get("delta") if isinstance(choice, dict) else None
+        content = delta.get("content") if isinstance(delta, dict) else None
+        if not isinstance(content, str) or not content:
+            continue
+
+        obj_text = scanner.feed(content)
+        if obj_text is not None:
+            return obj_text
+
+    return scanner.text
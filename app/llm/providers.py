@@ -0,0 +1,324 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Iterable, Mapping, Optional, TypeVar
+
+from app.config import LLMProviderConfig
+from app.event_log import log_event
+from app.llm.circuit_breaker import CircuitBreaker
+from app.llm.scheduler import RateLimiter, RequestScheduler
+
+T = TypeVar("T")
+
+STATS_WINDOW = 50
+MIN_SAMPLES_FOR_P95 = 5
+
+# Уровни моделей провайдера: основная и быстрая (fast_model)
+TIER_STRONG = "strong"
+TIER_FAST = "fast"
+
+
+class NoProviderAvailableError(RuntimeError):
+    """
+    Все провайдеры выключены circuit breaker'ом.
+    """
+
+
+class ProviderStats:
+    """
+    Скользящее окно задержек успешных ответов и исходов (ok/ошибка) по провайдеру.
+    Отменённые медленные запросы добавляются цензурированными (record_censored): их настоящая задержка
+    не меньше прожитого времени. Без них p95 считался бы только по победителям и занижался.
+    """
+
+    def __init__(self, window: int = STATS_WINDOW):
+        self._latencies: deque[float] = deque(maxlen=window)
+        self._outcomes: deque[bool] = deque(maxlen=window)
+
+    def record(self, latency_s: float, ok: bool) -> None:
+        self._outcomes.append(ok)
+        if ok:
+            self._latencies.append(latency_s)
+
+    def record_censored(self, latency_s: float) -> None:
+        """
+        Запрос отменили через latency_s: ответ был бы не раньше. Исход не пишется — это не ошибка.
+        """
+        self._latencies.append(latency_s)
+
+    @property
+    def samples(self) -> int:
+        return len(self._latencies)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self._latencies:
+            return None
+        ordered = sorted(self._latencies)
+        idx = min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))
+        return ordered[idx]
+
+    def error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return sum(1 for ok in self._outcomes if not ok) / len(self._outcomes)
+
+
+@dataclass
+class Provider:
+    name: str
+    base_url: str
+    api_key: str
+    model: str
+    whisper_model: str
+    breaker: CircuitBreaker
+    fast_model: str = ""
+    stats: ProviderStats = field(default_factory=ProviderStats)
+    index: int = 0  # позиция в конфиге — tie-breaker при сортировке
+    rate_limiter: Optional[RateLimiter] = None  # RPM/TPM провайдера (общий для LLM и Whisper)
+    # У быстрой модели свои задержки: отдельные статистика и breaker, чтобы не искажать p95
+    # и порог "медленного" ответа основной модели
+    fast_breaker: Optional[CircuitBreaker] = None
+    fast_stats: ProviderStats = field(default_factory=ProviderStats)
+
+    def breaker_for(self, tier: str) -> CircuitBreaker:
+        if tier == TIER_FAST and self.fast_breaker is not None:
+            return self.fast_breaker
+        return self.breaker
+
+    def stats_for(self, tier: str) -> ProviderStats:
+        # Без отдельной быстрой модели запрос уровня fast идёт в основную — и статистика её же
+        if tier == TIER_FAST and self.fast_breaker is not None:
+            return self.fast_stats
+        return self.stats
+
+
+class ProviderPool:
+    """
+    Упорядоченный набор OpenAI-совместимых провайдеров с hedged-запросами.
+
+    - порядок маршрутизации определяется по статистике (медианная задержка с учётом доли ошибок);
+      у провайдеров без статистики сохраняется порядок из конфига
+    - call(): шлём запрос основному провайдеру; если он не ответил за свой p95,
+      параллельно шлём резервному; берём первый успешный ответ, проигравшего отменяем;
+      hedged-запрос занимает ещё один слот планировщика, а если свободного нет — не отправляется
+    - статистика и breaker ведутся по паре (провайдер, уровень модели)
+    """
+
+    def __init__(
+        self,
+        providers: list[Provider],
+        kind: str = "llm",
+        hedge_min_delay_s: float = 0.5,
+        hedge_default_delay_s: float = 3.0,
+    ):
+        if not providers:
+            raise ValueError(f"No {kind} providers configured")
+        self.providers = providers
+        self.kind = kind
+        self.hedge_min_delay_s = hedge_min_delay_s
+        self.hedge_default_delay_s = hedge_default_delay_s
+
+    @classmethod
+    def from_configs(
+        cls,
+        configs: Iterable[LLMProviderConfig],
+        kind: str = "llm",
+        breaker_factory: Optional[Callable[[str], CircuitBreaker]] = None,
+        hedge_min_delay_s: float = 0.5,
+        hedge_default_delay_s: float = 3.0,
+        rate_limiters: Optional[Mapping[str, RateLimiter]] = None,
+    ) -> "ProviderPool":
+        providers: list[Provider] = []
+        for i, cfg in enumerate(configs):
+            if not cfg.base_url or not cfg.api_key:
+                continue
+            if kind == "llm" and not cfg.model:
+                continue
+            name = f"{kind}:{cfg.name}"
+            breaker = breaker_factory(name) if breaker_factory else CircuitBreaker(name=name)
+            fast_breaker = None
+            if cfg.fast_model and cfg.fast_model != cfg.model:
+                fast_name = f"{name}:{TIER_FAST}"
+                fast_breaker = breaker_factory(fast_name) if breaker_factory else CircuitBreaker(name=fast_name)
+            providers.append(
+                Provider(
+                    name=cfg.name,
+                    base_url=cfg.base_url.rstrip("/"),
+                    api_key=cfg.api_key,
+                    model=cfg.model,
+                    whisper_model=cfg.whisper_model,
+                    fast_model=cfg.fast_model,
+                    breaker=breaker,
+                    fast_breaker=fast_breaker,
+                    index=i,
+                    rate_limiter=(rate_limiters or {}).get(cfg.name),
+                )
+            )
+        return cls(
+            providers,
+            kind=kind,
+            hedge_min_delay_s=hedge_min_delay_s,
+            hedge_default_delay_s=hedge_default_delay_s,
+        )
+
+    def _score(self, provider: Provider, tier: str = TIER_STRONG) -> float:
+        stats = provider.stats_for(tier)
+        p50 = stats.percentile(0.5)
+        if p50 is None:
+            p50 = self.hedge_default_delay_s
+        return p50 * (1.0 + 4.0 * stats.error_rate())
+
+    def ordered(self, tier: str = TIER_STRONG) -> list[Provider]:
+        available = [p for p in self.providers if p.breaker_for(tier).is_available()]
+        return sorted(available, key=lambda p: (self._score(p, tier), p.index))
+
+    def is_available(self) -> bool:
+        return any(p.breaker.is_available() for p in self.providers)
+
+    def has_fast_tier(self) -> bool:
+        """
+        Есть ли провайдер с отдельной быстрой моделью, чей breaker её сейчас пропускает.
+        """
+        return any(
+            p.fast_model and p.fast_model != p.model and p.breaker_for(TIER_FAST).is_available()
+            for p in self.providers
+        )
+
+    def hedge_delay(self, provider: Provider, tier: str = TIER_STRONG) -> float:
+        stats = provider.stats_for(tier)
+        if stats.samples < MIN_SAMPLES_FOR_P95:
+            return self.hedge_default_delay_s
+        p95 = stats.percentile(0.95) or self.hedge_default_delay_s
+        return max(self.hedge_min_delay_s, p95)
+
+    async def _attempt(
+        self,
+        provider: Provider,
+        fn: Callable[[Provider], Awaitable[T]],
+        tokens: int = 0,
+        tier: str = TIER_STRONG,
+    ) -> T:
+        if provider.rate_limiter is not None:
+            waited = await provider.rate_limiter.acquire(tokens)
+            if waited >= 1.0:
+                log_event(f"{self.kind}: {provider.name} — ждали бюджет RPM/TPM {waited:.1f} с.")
+        breaker = provider.breaker_for(tier)
+        stats = provider.stats_for(tier)
+        if not breaker.allow_request():
+            raise NoProviderAvailableError(f"{breaker.name} circuit breaker is open")
+
+        started = time.monotonic()
+        try:
+            result = await fn(provider)
+        except asyncio.CancelledError:
+            # Проигравший hedged-запрос или исчерпанный бюджет.
+            # Если к моменту отмены запрос уже был "медленным" — это сигнал для breaker.
+            elapsed = time.monotonic() - started
+            if elapsed >= self.hedge_delay(provider, tier):
+                # Проигравший уже пережил свой порог hedge: его время — нижняя граница задержки.
+                # Быстро отменённые резервные запросы не пишем — они занизили бы p95.
+                stats.record_censored(elapsed)
+            if elapsed > breaker.slow_call_s:
+                breaker.record_failure(f"отменён после {elapsed:.1f} с")
+            else:
+                breaker.release_probe()
+            raise
+        except Exception as e:
+            stats.record(time.monotonic() - started, ok=False)
+            breaker.record_failure(repr(e))
+            raise
+
+        elapsed = time.monotonic() - started
+        stats.record(elapsed, ok=True)
+        breaker.record_success(elapsed)
+        return result
+
+    async def call(
+        self,
+        fn: Callable[[Provider], Awaitable[T]],
+        tokens: int = 0,
+        tier: str = TIER_STRONG,
+        scheduler: Optional[RequestScheduler] = None,
+    ) -> T:
+        """
+        Выполняет fn(provider) с hedging по доступным провайдерам.
+        tokens — оценка токенов запроса для TPM-бюджета провайдера.
+        tier — уровень модели: по нему выбираются статистика (порядок, задержка hedge) и breaker.
+        scheduler — планировщик, слот которого уже занят вызывающим; hedged-запрос берёт в нём
+        ещё один слот (try_acquire) и без свободного слота не отправляется.
+        Возвращает первый успешный результат; если все попытки упали — пробрасывает последнюю ошибку.
+        """
+        candidates = self.ordered(tier)
+        if not candidates:
+            raise NoProviderAvailableError(f"All {self.kind} providers are unavailable")
+
+        pending: dict[asyncio.Task, Provider] = {}
+        last_error: Optional[BaseException] = None
+
+        # Пока планировщик полон, hedge не повторяем: ждём основной запрос
+        hedge_blocked = False
+
+        async def _release_after(attempt: Awaitable[T]) -> T:
+            try:
+                return await attempt
+            finally:
+                scheduler.release()
+
+        def _launch(provider: Provider, hedge: bool = False) -> None:
+            attempt = self._attempt(provider, fn, tokens, tier)
+            if hedge and scheduler is not None:
+                attempt = _release_after(attempt)
+            pending[asyncio.create_task(attempt)] = provider
+
+        _launch(candidates.pop(0))
+        try:
+            while pending:
+                timeout = None
+                if candidates and not hedge_blocked:
+                    primary = next(iter(pending.values()))
+                    timeout = self.hedge_delay(primary, tier)
+
+                done, _ = await asyncio.wait(
+                    pending.keys(),
+                    timeout=timeout,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+
+                if not done:
+                    primary_name = next(iter(pending.values())).name
+                    if scheduler is not None and not scheduler.try_acquire():
+                        hedge_blocked = True
+                        log_event(
+                            f"{self.kind}: {primary_name} не ответил за {timeout:.1f} с, "
+                            f"но свободного слота планировщика нет — hedged-запрос не отправляем."
+                        )
+                        continue
+                    backup = candidates.pop(0)
+                    log_event(
+                        f"{self.kind}: {primary_name} не ответил за "
+                        f"{timeout:.1f} с, отправляем hedged-запрос в {backup.name}."
+                    )
+                    _launch(backup, hedge=True)
+                    continue
+
+                for task in done:
+                    provider = pending.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        return task.result()
+                    last_error = error
+                    log_event(f"{self.kind}: провайдер {provider.name} вернул ошибку: {repr(error)}")
+
+                # Упавший запрос не ждёт p95 — сразу пробуем следующего.
+                if not pending and candidates:
+                    hedge_blocked = False
+                    _launch(candidates.pop(0))
+        finally:
+            for task in pending:
+                task.cancel()
+
+        assert last_error is not None
+        raise last_error
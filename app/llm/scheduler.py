@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Mapping, Optional
+
+from app.event_log import log_event
+
+# Классы приоритета: меньше — важнее.
+PRIORITY_TEXT = 0
+PRIORITY_VOICE = 1
+PRIORITY_BACKGROUND = 2
+
+PRIORITY_NAMES = {
+    PRIORITY_TEXT: "text",
+    PRIORITY_VOICE: "voice",
+    PRIORITY_BACKGROUND: "background",
+}
+
+# Сколько ожидание в очереди считается заметным (пишем в лог)
+SLOW_QUEUE_WAIT_S = 1.0
+
+
+class SchedulerOverloadedError(RuntimeError):
+    """
+    Очередь к LLM/Whisper слишком длинная — запрос сброшен сразу (load shedding).
+    Вызывающий код уходит в pending-режим.
+    """
+
+
+class QueueStats:
+    """
+    Счётчики одного класса приоритета: сколько запросов допущено/сброшено и сколько они ждали.
+    """
+
+    def __init__(self) -> None:
+        self.admitted = 0
+        self.shed = 0
+        self.wait_total_s = 0.0
+        self.wait_max_s = 0.0
+
+    def record_wait(self, wait_s: float) -> None:
+        self.admitted += 1
+        self.wait_total_s += wait_s
+        self.wait_max_s = max(self.wait_max_s, wait_s)
+
+    def summary(self) -> str:
+        avg = self.wait_total_s / self.admitted if self.admitted else 0.0
+        return f"{self.admitted} (ср. {avg:.2f} с, макс {self.wait_max_s:.2f} с, сброшено {self.shed})"
+
+
+class RequestScheduler:
+    """
+    Общий планировщик запросов к LLM и Whisper.
+
+    - не больше max_in_flight HTTP-запросов одновременно на весь бот
+      (hedged-запрос занимает отдельный слот, см. try_acquire);
+    - освободившийся слот получает самый приоритетный ожидающий
+      (текст > голос > фоновые задачи), внутри класса — по очереди;
+    - если в очереди класса уже max_queue[priority] запросов, новый сразу
+      получает SchedulerOverloadedError (сообщение уйдёт в pending, а не будет ждать минутами);
+    - время ожидания в очереди копится в stats по классам.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = 8,
+        max_queue: Optional[Mapping[int, int]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue = dict(max_queue or {})
+        self._clock = clock
+        self._in_flight = 0
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self.stats: dict[int, QueueStats] = {p: QueueStats() for p in PRIORITY_NAMES}
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def queue_depth(self, priority: Optional[int] = None) -> int:
+        return sum(
+            1
+            for p, _, fut in self._waiters
+            if not fut.done() and (priority is None or p == priority)
+        )
+
+    def summary(self) -> str:
+        return ", ".join(
+            f"{PRIORITY_NAMES.get(p, p)}={stats.summary()}" for p, stats in sorted(self.stats.items())
+        )
+
+    async def _acquire(self, priority: int) -> None:
+        started = self._clock()
+        if self._in_flight < self.max_in_flight and not self.queue_depth():
+            self._in_flight += 1
+            self.stats.setdefault(priority, QueueStats()).record_wait(0.0)
+            return
+
+        limit = self.max_queue.get(priority)
+        if limit is not None and self.queue_depth(priority) >= limit:
+            stats = self.stats.setdefault(priority, QueueStats())
+            stats.shed += 1
+            log_event(
+                f"Планировщик LLM: очередь {PRIORITY_NAMES.get(priority, priority)} переполнена "
+                f"({limit}), запрос сброшен. Очереди: {self.summary()}."
+            )
+            raise SchedulerOverloadedError(
+                f"LLM queue for {PRIORITY_NAMES.get(priority, priority)} is full ({limit})"
+            )
+
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), fut))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            # Слот уже успели передать нам — отдаём его следующему.
+            if fut.done() and not fut.cancelled():
+                self._release()
+            raise
+
+        waited = self._clock() - started
+        self.stats.setdefault(priority, QueueStats()).record_wait(waited)
+        if waited >= SLOW_QUEUE_WAIT_S:
+            log_event(
+                f"Планировщик LLM: запрос {PRIORITY_NAMES.get(priority, priority)} ждал слот {waited:.1f} с "
+                f"(в работе {self._in_flight}, в очереди {self.queue_depth()})."
+            )
+
+    def try_acquire(self) -> bool:
+        """
+        Занимает свободный слот без ожидания; False — все слоты заняты или кто-то уже ждёт в очереди.
+        Для hedged-запросов: второй HTTP-запрос к другому провайдеру тоже занимает слот,
+        но ради него не стоит задерживать чужие запросы. Слот возвращается через release().
+        """
+        if self._in_flight < self.max_in_flight and not self.queue_depth():
+            self._in_flight += 1
+            return True
+        return False
+
+    def release(self) -> None:
+        self._release()
+
+    def _release(self) -> None:
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                # Слот переходит ожидающему напрямую, счётчик in_flight не меняется.
+                fut.set_result(None)
+                return
+        self._in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_TEXT) -> AsyncIterator[None]:
+        await self._acquire(priority)
+        try:
+            yield
+        finally:
+            self._release()
+
+
+class RateLimiter:
+    """
+    Бюджет провайдера на скользящую минуту: не больше rpm запросов и tpm токенов (0 — без ограничения).
+    acquire() ждёт, пока в окне появится место, и резервирует его.
+    """
+
+    def __init__(
+        self,
+        rpm: int = 0,
+        tpm: int = 0,
+        window_s: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.window_s = window_s
+        self._clock = clock
+        self._events: deque[tuple[float, int]] = deque()
+        self._lock = asyncio.Lock()
+
+    def _delay(self, tokens: int, now: float) -> float:
+        while self._events and self._events[0][0] + self.window_s <= now:
+            self._events.popleft()
+        if not self._events:
+            return 0.0
+
+        delay = 0.0
+        if self.rpm and len(self._events) >= self.rpm:
+            delay = max(delay, self._events[-self.rpm][0] + self.window_s - now)
+        if self.tpm:
+            excess = sum(t for _, t in self._events) + tokens - self.tpm
+            for ts, t in self._events:
+                if excess <= 0:
+                    break
+                excess -= t
+                delay = max(delay, ts + self.window_s - now)
+        return delay
+
+    async def acquire(self, tokens: int = 0) -> float:
+        """
+        Возвращает, сколько секунд пришлось ждать.
+        """
+        if not self.rpm and not self.tpm:
+            return 0.0
+        started = self._clock()
+        async with self._lock:
+            while True:
+                delay = self._delay(tokens, self._clock())
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+            self._events.append((self._clock(), tokens))
+        return self._clock() - started
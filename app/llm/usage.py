@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional
+
+USAGE_PATH = "storage/usage.sqlite3"
+
+KIND_LLM = "llm"
+KIND_WHISPER = "whisper"
+KIND_WHISPER_LOCAL = "whisper_local"  # локальная модель на CPU, без токенов и денег
+
+OUTCOME_OK = "ok"
+OUTCOME_ERROR = "error"
+OUTCOME_UNAVAILABLE = "unavailable"  # breaker, переполненная очередь или исчерпанный бюджет
+OUTCOME_SILENT = "silent"  # голосовое без речи — Whisper не вызывался
+
+
+@dataclass
+class CallUsage:
+    """
+    Учёт одного вызова chat_json / transcribe_ogg (все попытки и провайдеры вместе).
+    Попытки дописывают сюда токены по мере ответов; итог записывается в UsageStore.
+    """
+
+    kind: str
+    tg_user_id: int = 0
+    attempts: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    estimated: bool = False  # провайдер не вернул usage (например, в stream-режиме) — токены оценены
+    audio_seconds: float = 0.0
+    wall_s: float = 0.0
+    outcome: str = OUTCOME_OK
+
+    def add_usage(self, usage: Optional[dict], prompt_estimate: int = 0, completion_estimate: int = 0) -> None:
+        if usage:
+            self.prompt_tokens += int(usage.get("prompt_tokens") or 0)
+            self.completion_tokens += int(usage.get("completion_tokens") or 0)
+        else:
+            self.prompt_tokens += prompt_estimate
+            self.completion_tokens += completion_estimate
+            self.estimated = True
+
+
+class UsageStore:
+    """
+    Агрегаты расхода LLM/Whisper по дням и пользователям (локальный SQLite).
+
+    Ключ строки: (день, tg_user_id, kind, outcome); record() только увеличивает счётчики,
+    поэтому запись — один UPSERT на вызов.
+    """
+
+    def __init__(self, path: str = USAGE_PATH):
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS usage (
+                day TEXT NOT NULL,
+                tg_user_id INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                outcome TEXT NOT NULL,
+                calls INTEGER NOT NULL DEFAULT 0,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                prompt_tokens INTEGER NOT NULL DEFAULT 0,
+                completion_tokens INTEGER NOT NULL DEFAULT 0,
+                estimated_calls INTEGER NOT NULL DEFAULT 0,
+                audio_seconds REAL NOT NULL DEFAULT 0,
+                wall_s REAL NOT NULL DEFAULT 0,
+                wall_max_s REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, tg_user_id, kind, outcome)
+            )
+            """
+        )
+
+    def record(self, usage: CallUsage, day: Optional[str] = None) -> None:
+        day = day or datetime.now().strftime("%Y-%m-%d")
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO usage (day, tg_user_id, kind, outcome, calls, attempts, prompt_tokens,
+                                   completion_tokens, estimated_calls, audio_seconds, wall_s, wall_max_s)
+                VALUES (?, ?, ?, ?, 1, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (day, tg_user_id, kind, outcome) DO UPDATE SET
+                    calls = calls + 1,
+                    attempts = attempts + excluded.attempts,
+                    prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+                    completion_tokens = completion_tokens + excluded.completion_tokens,
+                    estimated_calls = estimated_calls + excluded.estimated_calls,
+                    audio_seconds = audio_seconds + excluded.audio_seconds,
+                    wall_s = wall_s + excluded.wall_s,
+                    wall_max_s = MAX(wall_max_s, excluded.wall_max_s)
+                """,
+                (
+                    day,
+                    int(usage.tg_user_id),
+                    usage.kind,
+                    usage.outcome,
+                    usage.attempts,
+                    usage.prompt_tokens,
+                    usage.completion_tokens,
+                    1 if usage.estimated else 0,
+                    usage.audio_seconds,
+                    usage.wall_s,
+                    usage.wall_s,
+                ),
+            )
+
+    def dump(self, days: int = 30, tg_user_id: Optional[int] = None) -> list[dict]:
+        """
+        Строки агрегатов за последние days дней (машиночитаемо, для JSON).
+        """
+        since = (datetime.now() - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+        query = "SELECT * FROM usage WHERE day >= ?"
+        params: list = [since]
+        if tg_user_id is not None:
+            query += " AND tg_user_id = ?"
+            params.append(int(tg_user_id))
+        query += " ORDER BY day, tg_user_id, kind, outcome"
+        with self._lock:
+            cur = self._conn.execute(query, params)
+            columns = [c[0] for c in cur.description]
+            return [dict(zip(columns, row)) for row in cur.fetchall()]
+
+    def summary_text(self, days: int = 7, tg_user_id: Optional[int] = None) -> str:
+        """
+        Короткая сводка для /usage: по дням, отдельно LLM и Whisper.
+        Голосовые без речи (OUTCOME_SILENT) — не ошибки: считаются отдельно, если такие были.
+        """
+        rows = self.dump(days=days, tg_user_id=tg_user_id)
+        if not rows:
+            return f"За последние {days} дн. вызовов LLM/Whisper не было."
+
+        totals: dict[tuple[str, str], dict] = {}
+        for row in rows:
+            agg = totals.setdefault(
+                (row["day"], row["kind"]),
+                {"calls": 0, "failed": 0, "silent": 0, "attempts": 0, "tokens_in": 0, "tokens_out": 0, "audio": 0.0, "wall": 0.0},
+            )
+            agg["calls"] += row["calls"]
+            if row["outcome"] == OUTCOME_SILENT:
+                agg["silent"] += row["calls"]
+            elif row["outcome"] != OUTCOME_OK:
+                agg["failed"] += row["calls"]
+            agg["attempts"] += row["attempts"]
+            agg["tokens_in"] += row["prompt_tokens"]
+            agg["tokens_out"] += row["completion_tokens"]
+            agg["audio"] += row["audio_seconds"]
+            agg["wall"] += row["wall_s"]
+
+        lines = [f"Расход LLM/Whisper за {days} дн.:"]
+        for (day, kind), agg in sorted(totals.items()):
+            avg_wall = agg["wall"] / agg["calls"] if agg["calls"] else 0.0
+            outcomes = f"ошибок {agg['failed']}"
+            if agg["silent"]:
+                outcomes += f", без речи {agg['silent']}"
+            line = (
+                f"{day} · {kind}: вызовов {agg['calls']} ({outcomes}), "
+                f"попыток {agg['attempts']}, ср. {avg_wall:.1f} с"
+            )
+            if kind == KIND_LLM:
+                line += f", токены {agg['tokens_in']}/{agg['tokens_out']}"
+            else:
+                line += f", аудио {agg['audio']:.0f} с"
+            lines.append(line)
+        return "\n".join(lines)
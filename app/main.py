@@ -3,8 +3,27 @@ import asyncio
 from app.config import get_settings
 from app.data.category_templates import DEFAULT_TEMPLATE
 from app.event_log import clear_event_log, log_event, setup_event_log
+from app.llm.circuit_breaker import CircuitBreaker
 from app.llm.client import LLMClient
+from app.llm.providers import ProviderPool
+from app.llm.scheduler import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_TEXT,
+    PRIORITY_VOICE,
+    RateLimiter,
+    RequestScheduler,
+)
+from app.llm.usage import UsageStore
+from app.services.alias_service import AliasStore
+from app.services.category_classifier import CategoryClassifierRegistry, train_from_journal
+from app.services.dedup_service import MessageDedup
+from app.services.example_index import ExampleIndex
+from app.services.local_transcriber import LocalWhisperTranscriber
+from app.services.outbox_service import OperationOutbox, OutboxReplayer
+from app.services.pending_index import PendingIndex
+from app.services.pending_sweeper import PendingSweeper
 from app.services.transcribe_service import WhisperTranscriber
+from app.services.voice_queue import VoiceQueue
 from app.sheets.category_repo import CategoryRepo
 from app.sheets.client import SheetsClient
 from app.sheets.journal_repo import JournalRepo
@@ -41,9 +60,36 @@ async def main() -> None:
         sheets_client,
         settings.google_sheets_spreadsheet_id,
         settings.google_sheets_journal_sheet_name,
+        partition=settings.journal_partition,
+        verify_next_rows=settings.journal_verify_next_rows,
     )
     dp.workflow_data["journal_repo"] = journal_repo
 
+    # --- Индекс pending-строк журнала (вместо полного скана при каждом поиске) ---
+    pending_index = PendingIndex()
+    dp.workflow_data["pending_index"] = pending_index
+
+    # --- Outbox: операции сначала пишутся локально, в Sheets уходят в фоне ---
+    outbox = OperationOutbox(settings.outbox_path, max_attempts=settings.outbox_max_attempts)
+    dedup = MessageDedup(
+        journal_repo,
+        path=settings.dedup_path,
+        window=settings.dedup_window,
+        capacity=settings.dedup_capacity,
+        error_rate=settings.dedup_error_rate,
+    )
+    outbox_replayer = OutboxReplayer(
+        outbox,
+        journal_repo,
+        batch_size=settings.outbox_batch_size,
+        interval_s=settings.outbox_replay_interval_s,
+        pending_index=pending_index,
+        dedup=dedup,
+    )
+    dp.workflow_data["dedup"] = dedup
+    dp.workflow_data["outbox"] = outbox
+    dp.workflow_data["outbox_replayer"] = outbox_replayer
+
     category_repo = CategoryRepo(
         sheets_client,
         settings.google_sheets_spreadsheet_id,
@@ -57,14 +103,69 @@ async def main() -> None:
         log_event(f"Не удалось проверить/заполнить категории при старте: {repr(e)}")
     dp.workflow_data["category_repo"] = category_repo
 
+    # --- Локальный классификатор категорий (обучается по журналу в фоне) ---
+    category_classifier = None
+    if settings.classifier_enabled:
+        category_classifier = CategoryClassifierRegistry(
+            min_confidence=settings.classifier_min_confidence,
+            min_examples=settings.classifier_min_examples,
+        )
+    dp.workflow_data["category_classifier"] = category_classifier
+    alias_store = AliasStore(settings.aliases_path)
+    dp.workflow_data["alias_store"] = alias_store
+
+    # --- Похожие прошлые операции для few-shot в промпте LLM ---
+    example_index = None
+    if settings.llm_examples_k > 0:
+        example_index = ExampleIndex(
+            k=settings.llm_examples_k,
+            min_similarity=settings.llm_examples_min_similarity,
+        )
+    dp.workflow_data["example_index"] = example_index
+
+    # --- Общий планировщик LLM/Whisper и RPM/TPM-бюджеты провайдеров ---
+    scheduler = RequestScheduler(
+        max_in_flight=settings.llm_max_in_flight,
+        max_queue={
+            PRIORITY_TEXT: settings.llm_max_queue_text,
+            PRIORITY_VOICE: settings.llm_max_queue_voice,
+            PRIORITY_BACKGROUND: settings.llm_max_queue_background,
+        },
+    )
+    rate_limiters = {cfg.name: RateLimiter(rpm=cfg.rpm, tpm=cfg.tpm) for cfg in settings.llm_providers}
+
+    # --- Учёт расхода LLM/Whisper (/usage) ---
+    usage_store = UsageStore(settings.usage_path)
+    dp.workflow_data["usage_store"] = usage_store
+    dp.workflow_data["bot_owner_ids"] = frozenset(settings.bot_owner_ids)
+
     # --- LLM wiring ---
+    def llm_breaker(name: str) -> CircuitBreaker:
+        return CircuitBreaker(
+            name=name,
+            failure_threshold=settings.llm_breaker_failures,
+            slow_call_s=settings.llm_breaker_slow_s,
+            open_s=settings.llm_breaker_open_s,
+        )
+
     llm = None
     if settings.llm_enabled:
         try:
             llm = LLMClient(
-                base_url=settings.llm_base_url,
-                api_key=settings.llm_api_key,
-                model=settings.llm_model,
+                providers=ProviderPool.from_configs(
+                    settings.llm_providers,
+                    kind="llm",
+                    breaker_factory=llm_breaker,
+                    hedge_min_delay_s=settings.llm_hedge_min_delay_s,
+                    hedge_default_delay_s=settings.llm_hedge_default_delay_s,
+                    rate_limiters=rate_limiters,
+                ),
+                timeout_s=settings.llm_timeout_s,
+                budget_s=settings.llm_budget_s,
+                stream=settings.llm_stream,
+                escalate_on=settings.llm_escalate_on,
+                scheduler=scheduler,
+                usage_store=usage_store,
             )
         except Exception as e:
             log_event(f"LLM не удалось инициализировать, работаем без него: {repr(e)}")
@@ -73,25 +174,110 @@ async def main() -> None:
         log_event("LLM выключен в настройках. Будет использоваться режим pending.")
     dp.workflow_data["llm"] = llm
     if llm is not None:
-        log_event("LLM подключен и готов к разбору сообщений.")
+        names = ", ".join(p.name for p in llm.providers.providers)
+        log_event(f"LLM подключен и готов к разбору сообщений (провайдеры: {names}).")
 
     # --- Whisper wiring (transcriber) ---
+    def whisper_breaker(name: str) -> CircuitBreaker:
+        # У распознавания свои задержки: "медленным" считаем ответ дольше минуты.
+        return CircuitBreaker(
+            name=name,
+            failure_threshold=settings.llm_breaker_failures,
+            slow_call_s=60.0,
+            open_s=settings.llm_breaker_open_s,
+        )
+
     transcriber = None
     try:
         transcriber = WhisperTranscriber(
-            base_url=settings.llm_base_url,  # тот же провайдер, что и GPT
-            api_key=settings.llm_api_key,
-            model=settings.whisper_model,
+            providers=ProviderPool.from_configs(
+                settings.llm_providers,  # те же провайдеры, что и для GPT
+                kind="whisper",
+                breaker_factory=whisper_breaker,
+                hedge_min_delay_s=settings.llm_hedge_min_delay_s,
+                hedge_default_delay_s=settings.llm_hedge_default_delay_s * 3,
+                rate_limiters=rate_limiters,
+            ),
+            scheduler=scheduler,
+            usage_store=usage_store,
+            chunk_threshold_s=settings.whisper_chunk_threshold_s,
+            chunk_target_s=settings.whisper_chunk_target_s,
+            chunk_max_s=settings.whisper_chunk_max_s,
+            chunk_parallelism=settings.whisper_chunk_parallelism,
+            preprocess=settings.whisper_preprocess,
+            silence_rms=settings.whisper_silence_rms,
+            min_speech_s=settings.whisper_min_speech_s,
         )
     except Exception as e:
         log_event(f"Распознавание голоса недоступно: {repr(e)}")
         transcriber = None
+
+    local_transcriber = None
+    if settings.transcriber_backend == "local":
+        try:
+            local_transcriber = LocalWhisperTranscriber(
+                model_name=settings.local_whisper_model,
+                compute_type=settings.local_whisper_compute_type,
+                workers=settings.local_whisper_workers,
+                cpu_threads=settings.local_whisper_cpu_threads,
+                language=settings.local_whisper_language,
+                max_seconds=settings.local_whisper_max_s,
+                fallback=transcriber,
+                usage_store=usage_store,
+            )
+            transcriber = local_transcriber
+        except Exception as e:
+            log_event(f"Локальный Whisper недоступен, используем удалённый: {repr(e)}")
     dp.workflow_data["transcriber"] = transcriber
     if transcriber is not None:
-        log_event("Модуль распознавания голоса подключен.")
+        log_event(f"Модуль распознавания голоса подключен ({'local' if local_transcriber else 'remote'}).")
+
+    voice_queue = VoiceQueue(workers=settings.voice_workers, max_depth=settings.voice_queue_max)
+    dp.workflow_data["voice_queue"] = voice_queue
+
+    replayer_task = asyncio.create_task(outbox_replayer.run())
+    background_tasks = [
+        replayer_task,
+        asyncio.create_task(voice_queue.run()),
+        asyncio.create_task(dedup.run(settings.dedup_save_interval_s)),
+    ]
+    if local_transcriber is not None:
+        background_tasks.append(asyncio.create_task(local_transcriber.warm_up()))
+    local_models = [m for m in (category_classifier, example_index) if m is not None]
+    if local_models:
+        background_tasks.append(asyncio.create_task(train_from_journal(journal_repo, local_models)))
 
+    if settings.pending_sweep_enabled:
+        async def send_digest(tg_user_id: int, text: str) -> None:
+            await bot.send_message(tg_user_id, text)
+
+        pending_sweeper = PendingSweeper(
+            pending_index,
+            journal_repo,
+            category_repo,
+            llm=llm,
+            category_classifier=category_classifier,
+            alias_store=alias_store,
+            example_index=example_index,
+            notifier=send_digest if settings.pending_digest else None,
+            interval_s=settings.pending_sweep_interval_s,
+            batch_size=settings.pending_sweep_batch_size,
+            min_age_s=settings.pending_sweep_min_age_s,
+            max_attempts=settings.pending_sweep_max_attempts,
+        )
+        background_tasks.append(asyncio.create_task(pending_sweeper.run()))
     log_event("Бот запущен и ожидает сообщения в Telegram.")
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        for task in background_tasks:
+            task.cancel()
+        try:
+            dedup.save()
+        except Exception as e:
+            log_event(f"Дедупликация: не удалось сохранить фильтр при остановке: {repr(e)}")
+        if local_transcriber is not None:
+            local_transcriber.close()
 
 
 if __name__ == "__main__":
@@ -1,6 +1,9 @@
+import re
 from dataclasses import dataclass
 from typing import Optional
 
+_OP_ID_RE = re.compile(r"op(\d+)-(\d+)")
+
 
 @dataclass
 class Operation:
@@ -16,4 +19,28 @@ class Operation:
     needs_review: str      # "TRUE" | "FALSE" строкой как в Sheets
     month_key: str         # "YYYY-MM"
     error: Optional[str] = ""
-    category_id: str = ""  # стабильный id категории (для сводки)
\ No newline at end of file
+    category_id: str = ""  # стабильный id категории (для сводки)
+    op_id: str = ""        # стабильный id операции (колонка N), не зависит от номера строки
+
+    def __post_init__(self) -> None:
+        if not self.op_id:
+            self.op_id = make_op_id(self.tg_user_id, self.tg_message_id)
+
+
+def make_op_id(tg_user_id: int, tg_message_id: int) -> str:
+    """
+    id операции выводится из сообщения, которым она создана: так он одинаков при повторной
+    отправке из outbox и для операций, записанных в outbox до появления колонки op_id.
+    Префикс нужен, чтобы Sheets (USER_ENTERED) не принял id вида "1-5" за дату.
+    """
+    return f"op{int(tg_user_id)}-{int(tg_message_id)}"
+
+
+def parse_op_id(op_id: str) -> Optional[tuple[int, int]]:
+    """
+    "op<tg_user_id>-<tg_message_id>" -> (tg_user_id, tg_message_id); None, если это не op_id.
+    """
+    m = _OP_ID_RE.fullmatch(str(op_id or ""))
+    if not m:
+        return None
+    return int(m.group(1)), int(m.group(2))
@@ -0,0 +1,275 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Iterable, Optional
+
+from app.services.text_features import normalize_text
+
+ALIASES_PATH = "storage/aliases.sqlite3"
+
+# Слова, которые ничего не говорят о категории: предлоги, глаголы оплаты, единицы, даты.
+_STOP_WORDS = frozenset(
+    """
+    на за во из для от до по со под про без при через
+    руб рубль рубля рублей тыс тысяч тысячи
+    сегодня вчера позавчера утром вечером днем
+    купил купила купили заплатил заплатила оплата оплатил оплатила потратил потратила
+    """.split()
+)
+
+# Адресаты и общие слова: встречаются в операциях любых категорий, магазином или сервисом не являются.
+# "подарок маме" не должен делать "маме" алиасом подарков.
+_GENERIC_WORDS = frozenset(
+    """
+    мама маме маму мамы папа папе папу папы жена жене жену жены муж мужу мужа
+    сын сыну сына дочь дочке дочери дочку брат брату сестра сестре бабушка бабушке дедушка дедушке
+    друг другу друга друзьям подруга подруге коллеге коллегам детям ребенку ребенка себе себя
+    подарок подарки подарка всем всех домой дома
+    """.split()
+)
+
+# Основа отдельного слова срабатывает сама по себе, только если пользователь отнёс к одной категории
+# не меньше стольких разных фраз с ней ("такси домой", "такси до работы") и ни одной — к другой
+ALIAS_MIN_PHRASES = 2
+
+
+def alias_stem(word: str) -> str:
+    """
+    Грубая основа слова, чтобы "пятёрочка" и "пятёрочке" давали один алиас.
+    """
+    if len(word) <= 4:
+        return word
+    return word[:max(4, len(word) - 2)]
+
+
+def extract_aliases(text: str) -> list[str]:
+    """
+    Кандидаты в алиасы из комментария операции: основы слов, похожих на название магазина или сервиса,
+    без повторов. Предлоги, единицы, даты, адресаты ("маме") и прочие общие слова пропускаются.
+    """
+    seen: list[str] = []
+    for word in normalize_text(text).split():
+        if len(word) < 3 or not word.isalpha() or word in _STOP_WORDS or word in _GENERIC_WORDS:
+            continue
+        stem = alias_stem(word)
+        if stem not in seen:
+            seen.append(stem)
+    return seen
+
+
+def alias_phrase(text: str) -> str:
+    """
+    Ключ фразы целиком: основы из extract_aliases в алфавитном порядке.
+    "Пятёрочка 1500" и "в пятерочке 700" дают один ключ, "такси до работы" и "обед на работе" — разные.
+    """
+    return " ".join(sorted(extract_aliases(text)))
+
+
+class AhoCorasickMatcher:
+    """
+    Автомат Ахо–Корасик: за один проход по тексту находит все вхождения всех шаблонов.
+
+    add() дописывает шаблон в бор (уже построенные вершины не трогаются),
+    ссылки-неудачи пересчитываются лениво — при первом поиске после изменений.
+    """
+
+    def __init__(self, patterns: Iterable[str] = ()):
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[list[str]] = [[]]
+        self._dirty = False
+        for pattern in patterns:
+            self.add(pattern)
+
+    def __len__(self) -> int:
+        return sum(len(out) for out in self._out)
+
+    def add(self, pattern: str) -> None:
+        if not pattern:
+            return
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        if pattern not in self._out[node]:
+            self._out[node].append(pattern)
+            self._dirty = True
+
+    def _build_failure_links(self) -> None:
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                candidate = self._goto[fail].get(ch, 0)
+                self._fail[child] = candidate if candidate != child else 0
+        self._dirty = False
+
+    def find_all(self, text: str) -> list[str]:
+        if self._dirty:
+            self._build_failure_links()
+        found: list[str] = []
+        node = 0
+        for ch in text:
+            while node and ch not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(ch, 0)
+            probe = node
+            while probe:
+                found.extend(self._out[probe])
+                probe = self._fail[probe]
+        return found
+
+
+class AliasStore:
+    """
+    Словарь алиасов пользователя (фраза -> category_id) в локальном SQLite.
+
+    Пополняется, когда пользователь сам выбирает категорию (pending-кнопки, /edit).
+    Запоминается фраза целиком (alias_phrase), и такая же фраза в следующий раз сразу получает
+    выбранную категорию. Основа отдельного слова срабатывает в других фразах, только если встречалась
+    в ALIAS_MIN_PHRASES разных фразах одной категории и ни разу с другой: одно "такси до работы"
+    не делает "обед на работе" транспортом.
+    Основы ищутся автоматом Ахо–Корасик, свой на каждого пользователя; новые основы
+    дописываются в него без перестройки с нуля.
+    """
+
+    def __init__(self, path: str = ALIASES_PATH):
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # Старая таблица aliases хранила основы отдельных слов после одного выбора и больше не читается
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS alias_phrases (
+                tg_user_id INTEGER NOT NULL,
+                phrase TEXT NOT NULL,
+                category_id TEXT NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                updated_at TEXT NOT NULL,
+                PRIMARY KEY (tg_user_id, phrase, category_id)
+            )
+            """
+        )
+        # tg_user_id -> phrase -> category_id -> hits
+        self._hits: dict[int, dict[str, dict[str, int]]] = {}
+        # tg_user_id -> основа -> фразы, в которых она встречалась
+        self._stem_phrases: dict[int, dict[str, set[str]]] = {}
+        self._matchers: dict[int, AhoCorasickMatcher] = {}
+        for tg_user_id, phrase, category_id, hits in self._conn.execute(
+            "SELECT tg_user_id, phrase, category_id, hits FROM alias_phrases WHERE hits > 0"
+        ):
+            tg_user_id = int(tg_user_id)
+            self._hits.setdefault(tg_user_id, {}).setdefault(phrase, {})[category_id] = int(hits)
+            self._index_phrase(tg_user_id, phrase)
+
+    def _index_phrase(self, tg_user_id: int, phrase: str) -> None:
+        user_stems = self._stem_phrases.setdefault(tg_user_id, {})
+        matcher = self._matchers.get(tg_user_id)
+        for stem in phrase.split():
+            user_stems.setdefault(stem, set()).add(phrase)
+            if matcher is not None:
+                matcher.add(f" {stem}")
+
+    def _matcher(self, tg_user_id: int) -> AhoCorasickMatcher:
+        matcher = self._matchers.get(tg_user_id)
+        if matcher is None:
+            # Шаблон с ведущим пробелом: основа совпадает только с началом слова.
+            matcher = AhoCorasickMatcher(f" {stem}" for stem in self._stem_phrases.get(tg_user_id, {}))
+            self._matchers[tg_user_id] = matcher
+        return matcher
+
+    def _bump(self, tg_user_id: int, phrase: str, category_id: str, delta: int) -> None:
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO alias_phrases (tg_user_id, phrase, category_id, hits, updated_at)
+                VALUES (?, ?, ?, MAX(?, 0), ?)
+                ON CONFLICT (tg_user_id, phrase, category_id)
+                DO UPDATE SET hits = MAX(hits + ?, 0), updated_at = excluded.updated_at
+                """,
+                (tg_user_id, phrase, category_id, delta, now, delta),
+            )
+            by_category = self._hits.setdefault(tg_user_id, {}).setdefault(phrase, {})
+            by_category[category_id] = max(by_category.get(category_id, 0) + delta, 0)
+            self._index_phrase(tg_user_id, phrase)
+
+    def learn(self, tg_user_id: int, text: str, category_id: str) -> None:
+        phrase = alias_phrase(text)
+        if phrase and category_id:
+            self._bump(int(tg_user_id), phrase, category_id, +1)
+
+    def relabel(self, tg_user_id: int, text: str, old_category_id: str, new_category_id: str) -> None:
+        phrase = alias_phrase(text)
+        if not phrase:
+            return
+        if old_category_id and old_category_id != new_category_id:
+            self._bump(int(tg_user_id), phrase, old_category_id, -1)
+        if new_category_id:
+            self._bump(int(tg_user_id), phrase, new_category_id, +1)
+
+    @staticmethod
+    def _live(by_category: dict[str, int]) -> list[str]:
+        return [cid for cid, hits in by_category.items() if hits > 0]
+
+    def _stem_category(self, tg_user_id: int, stem: str) -> Optional[str]:
+        """
+        Категория основы, если она встречалась в ALIAS_MIN_PHRASES разных фразах и все они — одной категории.
+        """
+        user_hits = self._hits[tg_user_id]
+        phrases = [
+            phrase
+            for phrase in self._stem_phrases.get(tg_user_id, {}).get(stem, ())
+            if self._live(user_hits.get(phrase, {}))
+        ]
+        categories = {cid for phrase in phrases for cid in self._live(user_hits[phrase])}
+        if len(categories) == 1 and len(phrases) >= ALIAS_MIN_PHRASES:
+            return categories.pop()
+        return None
+
+    def match(self, tg_user_id: int, text: str) -> Optional[str]:
+        """
+        category_id по алиасам пользователя или None.
+
+        Сначала ищется та же фраза целиком: хватает одного выбора, если фразу не относили к разным категориям.
+        Иначе учитываются только подтверждённые основы (см. _stem_category), и все найденные
+        должны указывать на одну категорию.
+        """
+        tg_user_id = int(tg_user_id)
+        user_hits = self._hits.get(tg_user_id)
+        if not user_hits:
+            return None
+
+        with self._lock:
+            live = self._live(user_hits.get(alias_phrase(text), {}))
+            if len(live) == 1:
+                return live[0]
+            if live:
+                return None
+            found = self._matcher(tg_user_id).find_all(f" {normalize_text(text)}")
+            categories = {self._stem_category(tg_user_id, pattern[1:]) for pattern in found}
+
+        categories.discard(None)
+        if len(categories) == 1:
+            return categories.pop()
+        return None
@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import asyncio
+import io
+import math
+import shutil
+import wave
+from array import array
+from typing import Optional
+
+SAMPLE_RATE = 16000  # Whisper всё равно ресемплирует в 16 кГц моно
+FRAME_S = 0.02
+# Для поиска тишины хватает каждого 4-го отсчёта — в 4 раза меньше работы в чистом Python.
+ENERGY_STRIDE = 4
+
+
+class AudioDecodeError(RuntimeError):
+    """
+    ffmpeg недоступен или не смог декодировать/закодировать запись.
+    """
+
+
+def ffmpeg_available() -> bool:
+    return shutil.which("ffmpeg") is not None
+
+
+async def _run_ffmpeg(args: list[str], stdin: Optional[bytes] = None) -> bytes:
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        raise AudioDecodeError("ffmpeg not found")
+
+    proc = await asyncio.create_subprocess_exec(
+        ffmpeg,
+        "-hide_banner",
+        "-loglevel", "error",
+        *args,
+        stdin=asyncio.subprocess.PIPE if stdin is not None else asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    stdout, stderr = await proc.communicate(stdin)
+    if proc.returncode != 0:
+        raise AudioDecodeError(f"ffmpeg exited with {proc.returncode}: {stderr.decode(errors='replace')[:200]}")
+    return stdout
+
+
+async def decode_to_pcm(file_path: str, sample_rate: int = SAMPLE_RATE) -> bytes:
+    """
+    Декодирует файл (ogg/opus из Telegram) в 16-битный моно PCM через ffmpeg:
+    сразу даунмикс в моно и ресемплинг в sample_rate.
+    """
+    return await _run_ffmpeg(
+        ["-i", file_path, "-f", "s16le", "-ac", "1", "-ar", str(sample_rate), "-"]
+    )
+
+
+async def encode_for_upload(pcm: bytes, sample_rate: int = SAMPLE_RATE) -> tuple[bytes, str, str]:
+    """
+    PCM -> (данные, имя файла, content-type) для загрузки в Whisper.
+    Обычно Opus в OGG (речь 16 кГц моно ~24 кбит/с — меньше исходника из Telegram);
+    если ffmpeg собран без libopus — WAV.
+    """
+    try:
+        data = await _run_ffmpeg(
+            [
+                "-f", "s16le", "-ar", str(sample_rate), "-ac", "1", "-i", "-",
+                "-c:a", "libopus", "-b:a", "24k", "-application", "voip", "-f", "ogg", "-",
+            ],
+            stdin=pcm,
+        )
+        return data, "voice.ogg", "audio/ogg"
+    except AudioDecodeError:
+        return pcm_to_wav(pcm, sample_rate), "voice.wav", "audio/wav"
+
+
+def frame_energies(pcm: bytes, sample_rate: int = SAMPLE_RATE, frame_s: float = FRAME_S) -> list[float]:
+    """
+    RMS-энергия по кадрам frame_s (по прореженным отсчётам).
+    """
+    samples = array("h")
+    samples.frombytes(pcm[: len(pcm) - len(pcm) % 2])
+    frame_len = max(1, int(sample_rate * frame_s))
+    energies: list[float] = []
+    for start in range(0, len(samples), frame_len):
+        frame = samples[start:start + frame_len:ENERGY_STRIDE]
+        energies.append(math.sqrt(sum(x * x for x in frame) / len(frame)) if frame else 0.0)
+    return energies
+
+
+def pcm_seconds(pcm: bytes, sample_rate: int = SAMPLE_RATE) -> float:
+    return len(pcm) / (2 * sample_rate)
+
+
+def trim_silence(
+    pcm: bytes,
+    threshold_rms: float,
+    sample_rate: int = SAMPLE_RATE,
+    pad_s: float = 0.2,
+) -> tuple[bytes, float]:
+    """
+    Простейший VAD по энергии: отрезает тишину в начале и в конце (с запасом pad_s).
+    Возвращает (обрезанный PCM, секунд речи — кадров громче threshold_rms).
+    Если речи нет совсем — (b"", 0.0).
+    """
+    energies = frame_energies(pcm, sample_rate)
+    voiced = [i for i, e in enumerate(energies) if e > threshold_rms]
+    if not voiced:
+        return b"", 0.0
+
+    pad = int(pad_s / FRAME_S)
+    bytes_per_frame = int(sample_rate * FRAME_S) * 2
+    start = max(0, voiced[0] - pad) * bytes_per_frame
+    end = min(len(energies), voiced[-1] + 1 + pad) * bytes_per_frame
+    return pcm[start:end], len(voiced) * FRAME_S
+
+
+def find_chunks(
+    energies: list[float],
+    frame_s: float = FRAME_S,
+    target_s: float = 30.0,
+    max_s: float = 45.0,
+    min_silence_s: float = 0.3,
+    silence_ratio: float = 0.1,
+) -> list[tuple[int, int]]:
+    """
+    Делит запись на куски [start_frame, end_frame) по паузам.
+
+    Тишина — кадры тише silence_ratio от громкого уровня (95-й перцентиль) записи.
+    Кусок закрывается в середине первой достаточно длинной паузы после target_s;
+    если паузы нет до max_s — режем в самом тихом кадре окна (лучше, чем посреди слова наугад).
+    """
+    n = len(energies)
+    if not n:
+        return []
+    target = max(1, int(target_s / frame_s))
+    limit = max(target, int(max_s / frame_s))
+    min_silence = max(1, int(min_silence_s / frame_s))
+    loud = sorted(energies)[min(n - 1, int(0.95 * (n - 1)))]
+    threshold = loud * silence_ratio
+
+    chunks: list[tuple[int, int]] = []
+    start = 0
+    while n - start > limit:
+        cut: Optional[int] = None
+        run = 0
+        for i in range(start + target, start + limit):
+            if energies[i] <= threshold:
+                run += 1
+                if run >= min_silence:
+                    cut = i - run // 2
+                    break
+            else:
+                run = 0
+        if cut is None:
+            window = range(start + target, start + limit)
+            cut = min(window, key=energies.__getitem__)
+        chunks.append((start, cut))
+        start = cut
+    chunks.append((start, n))
+    return chunks
+
+
+def pcm_to_wav(pcm: bytes, sample_rate: int = SAMPLE_RATE) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm)
+    return buf.getvalue()
+
+
+def split_pcm(
+    pcm: bytes,
+    sample_rate: int = SAMPLE_RATE,
+    target_s: float = 30.0,
+    max_s: float = 45.0,
+) -> list[bytes]:
+    """
+    PCM -> список PCM-кусков по паузам (в исходном порядке).
+    """
+    energies = frame_energies(pcm, sample_rate)
+    bytes_per_frame = int(sample_rate * FRAME_S) * 2
+    return [
+        pcm[start * bytes_per_frame:end * bytes_per_frame]
+        for start, end in find_chunks(energies, target_s=target_s, max_s=max_s)
+    ]
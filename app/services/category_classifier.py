@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import asyncio
+import math
+from collections import Counter
+from dataclasses import dataclass
+from typing import Iterable, Optional, Protocol
+
+from app.event_log import log_event
+from app.services.text_features import char_ngrams
+
+
+@dataclass(frozen=True)
+class CategoryPrediction:
+    category_id: str
+    confidence: float
+
+
+class NaiveBayesCategoryClassifier:
+    """
+    Мультиномиальный наивный Байес по символьным n-граммам комментария.
+
+    Всё хранится в разреженных счётчиках, поэтому модель учится инкрементально:
+    learn/forget просто меняют счётчики, переобучать с нуля не нужно.
+    """
+
+    def __init__(self, alpha: float = 0.5):
+        self.alpha = alpha
+        self.class_docs: Counter[str] = Counter()
+        self.class_features: dict[str, Counter[str]] = {}
+        self.class_totals: Counter[str] = Counter()
+        self.vocabulary: Counter[str] = Counter()
+
+    @property
+    def examples(self) -> int:
+        return sum(self.class_docs.values())
+
+    def learn(self, text: str, category_id: str) -> None:
+        features = char_ngrams(text)
+        if not features or not category_id:
+            return
+        self.class_docs[category_id] += 1
+        self.class_features.setdefault(category_id, Counter()).update(features)
+        self.class_totals[category_id] += sum(features.values())
+        self.vocabulary.update(features)
+
+    def forget(self, text: str, category_id: str) -> None:
+        """
+        Убирает пример (например, когда пользователь сменил категорию в /edit).
+        """
+        features = char_ngrams(text)
+        if not features or self.class_docs.get(category_id, 0) <= 0:
+            return
+        self.class_docs[category_id] -= 1
+        self.class_features[category_id].subtract(features)
+        self.class_totals[category_id] -= sum(features.values())
+        self.vocabulary.subtract(features)
+        if self.class_docs[category_id] <= 0:
+            del self.class_docs[category_id]
+            del self.class_features[category_id]
+            del self.class_totals[category_id]
+        self.vocabulary = +self.vocabulary
+
+    def predict(self, text: str) -> Optional[CategoryPrediction]:
+        features = {f: c for f, c in char_ngrams(text).items() if self.vocabulary.get(f, 0) > 0}
+        if not features or not self.class_docs:
+            return None
+
+        total_docs = self.examples
+        vocab_size = len(self.vocabulary)
+        log_probs: dict[str, float] = {}
+        for category_id, docs in self.class_docs.items():
+            counts = self.class_features[category_id]
+            denom = math.log(self.class_totals[category_id] + self.alpha * vocab_size)
+            lp = math.log(docs / total_docs)
+            for feature, count in features.items():
+                lp += count * (math.log(max(counts.get(feature, 0), 0) + self.alpha) - denom)
+            log_probs[category_id] = lp
+
+        best = max(log_probs, key=log_probs.__getitem__)
+        top = log_probs[best]
+        norm = sum(math.exp(lp - top) for lp in log_probs.values())
+        return CategoryPrediction(category_id=best, confidence=1.0 / norm)
+
+
+class CategoryClassifierRegistry:
+    """
+    Локальные классификаторы категорий — по одному на пользователя.
+
+    - fit(): полное обучение по журналу (см. train_from_journal)
+    - learn()/relabel(): инкрементальное дообучение по ответам LLM и правкам пользователя
+    - predict(): уверенный прогноз или None (тогда решает LLM)
+    """
+
+    def __init__(
+        self,
+        min_confidence: float = 0.95,
+        min_examples: int = 20,
+        min_class_examples: int = 3,
+    ):
+        self.min_confidence = min_confidence
+        self.min_examples = min_examples
+        self.min_class_examples = min_class_examples
+        self._models: dict[int, NaiveBayesCategoryClassifier] = {}
+
+    def _model(self, tg_user_id: int) -> NaiveBayesCategoryClassifier:
+        return self._models.setdefault(int(tg_user_id), NaiveBayesCategoryClassifier())
+
+    def fit(self, examples: Iterable[tuple[int, str, str]]) -> None:
+        """
+        Обучает модели с нуля по (tg_user_id, comment_raw, category_id) и атомарно подменяет текущие.
+        """
+        models: dict[int, NaiveBayesCategoryClassifier] = {}
+        for tg_user_id, text, category_id in examples:
+            models.setdefault(int(tg_user_id), NaiveBayesCategoryClassifier()).learn(text, category_id)
+        self._models = models
+
+    def learn(self, tg_user_id: int, text: str, category_id: str) -> None:
+        self._model(tg_user_id).learn(text, category_id)
+
+    def relabel(self, tg_user_id: int, text: str, old_category_id: str, new_category_id: str) -> None:
+        model = self._model(tg_user_id)
+        if old_category_id:
+            model.forget(text, old_category_id)
+        model.learn(text, new_category_id)
+
+    def predict(self, tg_user_id: int, text: str) -> Optional[CategoryPrediction]:
+        model = self._models.get(int(tg_user_id))
+        if model is None or model.examples < self.min_examples:
+            return None
+        prediction = model.predict(text)
+        if prediction is None or prediction.confidence < self.min_confidence:
+            return None
+        if model.class_docs.get(prediction.category_id, 0) < self.min_class_examples:
+            return None
+        return prediction
+
+
+class _JournalTrainable(Protocol):
+    def fit(self, examples: Iterable[tuple[int, str, str]]) -> None: ...
+
+
+async def train_from_journal(journal_repo, models: Iterable[_JournalTrainable]) -> None:
+    """
+    Один раз читает размеченные операции журнала (статус ok, есть category_id)
+    и обучает по ним локальные модели. Запускается в фоне при старте бота.
+    """
+    models = list(models)
+    try:
+        examples = await asyncio.to_thread(journal_repo.list_labelled_examples)
+        for model in models:
+            await asyncio.to_thread(model.fit, examples)
+    except Exception as e:
+        log_event(f"Локальные модели категорий: не удалось обучиться по журналу: {repr(e)}")
+        return
+    log_event(f"Локальные модели категорий обучены по журналу: примеров {len(examples)}.")
@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import math
+import os
+import struct
+import threading
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from app.event_log import log_event
+from app.sheets.journal_repo import JournalRepo
+
+DEDUP_PATH = "storage/dedup.bloom"
+
+# Заголовок файла: магия, capacity, error_rate, число элементов, сколько строк журнала покрыто,
+# длина имени листа-партиции, к которому относится покрытие (само имя — следом, в UTF-8)
+_HEADER = struct.Struct("<4sQdQQH")
+# BLM3: в фильтре op_id (BLM2 хранил голые tg_message_id — такой файл строится заново)
+_MAGIC = b"BLM3"
+
+
+class BloomFilter:
+    """
+    Фильтр Блума по строковым id: «точно нет» или «возможно есть».
+    Размер подбирается под capacity элементов с долей ложных срабатываний error_rate;
+    k позиций получаются двойным хешированием одного blake2b.
+    """
+
+    def __init__(self, capacity: int, error_rate: float, bits: Optional[bytearray] = None, count: int = 0):
+        self.capacity = max(1, int(capacity))
+        self.error_rate = float(error_rate)
+        self.size = max(8, int(math.ceil(-self.capacity * math.log(self.error_rate) / (math.log(2) ** 2))))
+        self.hashes = max(1, int(round(self.size / self.capacity * math.log(2))))
+        nbytes = (self.size + 7) // 8
+        if bits is not None and len(bits) != nbytes:
+            raise ValueError(f"bloom filter expects {nbytes} bytes, got {len(bits)}")
+        self.bits = bits if bits is not None else bytearray(nbytes)
+        self.count = count
+
+    def _positions(self, item: str) -> Iterable[int]:
+        digest = hashlib.blake2b(str(item).encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hashes):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, item: str) -> None:
+        new = False
+        for pos in self._positions(item):
+            byte, mask = pos >> 3, 1 << (pos & 7)
+            if not self.bits[byte] & mask:
+                self.bits[byte] |= mask
+                new = True
+        if new:
+            self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class MessageDedup:
+    """
+    Проверка «эта операция уже записана?» без чтения всего журнала.
+
+    Ключ — op_id (пользователь + сообщение): одинаковые message_id в разных чатах — разные операции.
+    - точное множество последних window op_id (скользящее окно) — типичный дубль это ретрай Telegram;
+    - фильтр Блума по всей истории журнала, сохраняется на диск; при старте догружается
+      только хвост журнала после последней покрытой строки, а без файла — строится заново;
+      покрытие строк относится к активной партиции журнала, после перехода на новую оно начинается заново;
+    - в Sheets идём только на «возможно есть» от фильтра (или пока он не загружен).
+    Память ограничена окном и размером фильтра при любой длине истории.
+    """
+
+    def __init__(
+        self,
+        journal_repo: JournalRepo,
+        path: str = DEDUP_PATH,
+        window: int = 5000,
+        capacity: int = 1_000_000,
+        error_rate: float = 0.001,
+    ):
+        self.journal_repo = journal_repo
+        self.path = path
+        self.window = max(1, window)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._lock = threading.Lock()
+        self._recent: OrderedDict[str, None] = OrderedDict()
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._rows_covered = 1  # строка 1 — заголовок
+        self._sheet_name = ""  # партиция журнала, к которой относится _rows_covered
+        self._dirty = False
+        self.ready = False
+
+    def _remember(self, op_id: str) -> None:
+        self._recent[op_id] = None
+        self._recent.move_to_end(op_id)
+        while len(self._recent) > self.window:
+            self._recent.popitem(last=False)
+
+    def _read_file(self) -> Optional[tuple[BloomFilter, int, str]]:
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            magic, capacity, error_rate, count, rows_covered, name_len = _HEADER.unpack_from(data)
+            if magic != _MAGIC or capacity != self.capacity or error_rate != self.error_rate:
+                log_event("Дедупликация: параметры фильтра изменились, строим заново.")
+                return None
+            offset = _HEADER.size + name_len
+            sheet_name = data[_HEADER.size:offset].decode("utf-8")
+            bloom = BloomFilter(capacity, error_rate, bytearray(data[offset:]), count)
+        except (struct.error, ValueError) as e:
+            log_event(f"Дедупликация: файл фильтра повреждён, строим заново: {repr(e)}")
+            return None
+        return bloom, rows_covered, sheet_name
+
+    def load(self) -> None:
+        """
+        Загружает фильтр с диска и догружает из журнала строки, записанные после сохранения.
+        Без файла (или с несовместимым файлом) перечитывает op_id всего листа;
+        если с сохранения журнал перешёл на другую партицию — фильтр сохраняется, а её op_id читаются целиком.
+        """
+        sheet_name = self.journal_repo.sheet_name
+        stored = self._read_file()
+        bloom, rows_covered, stored_sheet = (
+            stored if stored is not None else (BloomFilter(self.capacity, self.error_rate), 1, sheet_name)
+        )
+        if stored_sheet != sheet_name:
+            rows_covered = 1
+
+        ids, last_row = self.journal_repo.list_op_ids(rows_covered + 1)
+        for op_id in ids:
+            bloom.add(op_id)
+
+        with self._lock:
+            # Пока читали журнал, реплеер мог добавить новые id — переносим их в загруженный фильтр.
+            for op_id in self._recent:
+                bloom.add(op_id)
+            self._bloom = bloom
+            if self._sheet_name != sheet_name:
+                self._sheet_name = sheet_name
+                self._rows_covered = 1
+            self._rows_covered = max(rows_covered, last_row, self._rows_covered)
+            self._dirty = True
+            self.ready = True
+
+        if bloom.count > self.capacity:
+            log_event(
+                f"Дедупликация: в фильтре {bloom.count} id при рассчитанных {self.capacity}, "
+                f"ложных «возможно есть» станет больше — увеличьте DEDUP_CAPACITY."
+            )
+        log_event(
+            f"Дедупликация: фильтр готов ({bloom.count} id, "
+            f"{'дочитано' if stored else 'прочитано'} из журнала {len(ids)})."
+        )
+
+    def save(self) -> None:
+        with self._lock:
+            if not self._dirty or not self.ready:
+                return
+            name = self._sheet_name.encode("utf-8")
+            header = _HEADER.pack(
+                _MAGIC, self.capacity, self.error_rate, self._bloom.count, self._rows_covered, len(name)
+            )
+            data = header + name + bytes(self._bloom.bits)
+            self._dirty = False
+
+        parent = os.path.dirname(self.path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+
+    def add(self, op_ids: Iterable[str], row_range: Optional[tuple[int, int]] = None) -> None:
+        """
+        Регистрирует op_id, только что записанные в журнал (row_range — диапазон строк append).
+        Покрытие строк сдвигается, только если новые строки идут сразу за покрытыми,
+        иначе недостающие строки будут дочитаны при следующей загрузке.
+        """
+        with self._lock:
+            for op_id in op_ids:
+                self._remember(str(op_id))
+                self._bloom.add(str(op_id))
+            if row_range is not None and row_range[0] == self._rows_covered + 1:
+                self._rows_covered = row_range[1]
+            self._dirty = True
+
+    def start_partition(self) -> None:
+        """
+        Журнал перешёл на новую партицию: id остаются в фильтре, покрытие строк начинается с её заголовка.
+        """
+        with self._lock:
+            self._sheet_name = self.journal_repo.sheet_name
+            self._rows_covered = 1
+            self._dirty = True
+
+    def maybe_seen(self, op_ids: Iterable[str]) -> set[str]:
+        """
+        Подмножество op_id, которые могут уже быть в журнале (их стоит проверить в Sheets).
+        """
+        ids = {str(op_id) for op_id in op_ids}
+        with self._lock:
+            if not self.ready:
+                return ids
+            return {op_id for op_id in ids if op_id in self._recent or op_id in self._bloom}
+
+    def seen(self, op_id: str) -> bool:
+        """
+        Записана ли операция в журнал. Sheets читается только на «возможно есть» от фильтра.
+        """
+        op_id = str(op_id)
+        with self._lock:
+            if op_id in self._recent:
+                return True
+            if self.ready and op_id not in self._bloom:
+                return False
+
+        if not self.journal_repo.is_duplicate(op_id):
+            return False
+        with self._lock:
+            self._remember(op_id)
+        return True
+
+    async def run(self, save_interval_s: float = 60.0) -> None:
+        try:
+            await asyncio.to_thread(self.load)
+        except Exception as e:
+            log_event(f"Дедупликация: не удалось загрузить фильтр, проверяем дубли через Sheets: {repr(e)}")
+        while True:
+            await asyncio.sleep(save_interval_s)
+            try:
+                await asyncio.to_thread(self.save if self.ready else self.load)
+            except Exception as e:
+                log_event(f"Дедупликация: не удалось сохранить/загрузить фильтр: {repr(e)}")
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from typing import Iterable
+
+from app.services.text_features import char_ngrams, normalize_text
+
+
+@dataclass(frozen=True)
+class SimilarExample:
+    text: str
+    category_id: str
+    similarity: float
+
+
+class _UserIndex:
+    """
+    Размеченные комментарии одного пользователя и инвертированный индекс n-грамма -> [(№ примера, вес)].
+    Векторы нормированы, поэтому косинусная близость — просто сумма произведений весов.
+    """
+
+    def __init__(self) -> None:
+        self.examples: list[tuple[str, str]] = []
+        self.by_text: dict[str, int] = {}
+        self.postings: dict[str, list[tuple[int, float]]] = {}
+
+    def add(self, text: str, category_id: str) -> None:
+        key = normalize_text(text)
+        if not key or not category_id:
+            return
+        known = self.by_text.get(key)
+        if known is not None:
+            # Тот же комментарий с новой категорией — побеждает последний выбор пользователя.
+            self.examples[known] = (text, category_id)
+            return
+
+        vector = _unit_vector(text)
+        if not vector:
+            return
+        doc = len(self.examples)
+        self.examples.append((text, category_id))
+        self.by_text[key] = doc
+        for feature, weight in vector.items():
+            self.postings.setdefault(feature, []).append((doc, weight))
+
+    def similar(self, text: str, k: int, min_similarity: float) -> list[SimilarExample]:
+        scores: dict[int, float] = {}
+        for feature, weight in _unit_vector(text).items():
+            for doc, doc_weight in self.postings.get(feature, ()):
+                scores[doc] = scores.get(doc, 0.0) + weight * doc_weight
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        result: list[SimilarExample] = []
+        for doc, score in ranked:
+            if score < min_similarity or len(result) >= k:
+                break
+            example_text, category_id = self.examples[doc]
+            result.append(SimilarExample(example_text, category_id, score))
+        return result
+
+
+def _unit_vector(text: str) -> dict[str, float]:
+    features = char_ngrams(text)
+    norm = math.sqrt(sum(c * c for c in features.values()))
+    if not norm:
+        return {}
+    return {feature: count / norm for feature, count in features.items()}
+
+
+class ExampleIndex:
+    """
+    Поиск похожих прошлых операций пользователя (ближайшие соседи по символьным n-граммам).
+    Найденные примеры подставляются в промпт LLM как few-shot.
+    """
+
+    def __init__(self, k: int = 3, min_similarity: float = 0.3):
+        self.k = k
+        self.min_similarity = min_similarity
+        self._users: dict[int, _UserIndex] = {}
+
+    @property
+    def examples(self) -> int:
+        return sum(len(index.examples) for index in self._users.values())
+
+    def fit(self, examples: Iterable[tuple[int, str, str]]) -> None:
+        users: dict[int, _UserIndex] = {}
+        for tg_user_id, text, category_id in examples:
+            users.setdefault(int(tg_user_id), _UserIndex()).add(text, category_id)
+        self._users = users
+
+    def learn(self, tg_user_id: int, text: str, category_id: str) -> None:
+        self._users.setdefault(int(tg_user_id), _UserIndex()).add(text, category_id)
+
+    def similar(self, tg_user_id: int, text: str) -> list[SimilarExample]:
+        index = self._users.get(int(tg_user_id))
+        if index is None or self.k <= 0:
+            return []
+        return index.similar(text, self.k, self.min_similarity)
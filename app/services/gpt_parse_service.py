@@ -1,75 +1,345 @@
+import hashlib
+import time
+from collections import Counter
 from datetime import datetime
-from typing import Dict, Any, Iterable
+from typing import Dict, Any, Iterable, Sequence
 
 from app.data.category_templates import DEFAULT_TEMPLATE
-from app.llm.client import LLMClient
+from app.event_log import log_event
+from app.llm.client import LLMClient, LLMUnavailableError
+from app.llm.scheduler import PRIORITY_BACKGROUND, PRIORITY_TEXT
+from app.services.example_index import SimilarExample
+from app.sheets.category_repo import Category
 
-DEFAULT_CATEGORY_NAMES = [row["name"] for row in DEFAULT_TEMPLATE]
+DEFAULT_CATEGORIES = [(row["category_id"], row["name"]) for row in DEFAULT_TEMPLATE]
+
+# Длина хэш-части короткого кода категории (36^3 вариантов; при коллизии код удлиняется)
+CODE_HASH_CHARS = 3
+_BASE36 = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def _code_digits(category_id: str) -> str:
+    """
+    Хэш category_id в base36: код зависит только от самой категории, а не от её места в списке.
+    """
+    value = int.from_bytes(hashlib.blake2b(category_id.encode("utf-8"), digest_size=8).digest(), "big")
+    digits = []
+    while value:
+        value, rem = divmod(value, 36)
+        digits.append(_BASE36[rem])
+    return "".join(digits) or "0"
 
 SYSTEM_PROMPT_TEMPLATE = """
-Результат запроса Finbot для телеграм-бота.
-Тебе приходит короткое сообщение пользователя (иногда с скобками: 12к, 200k, "две тысячи").
-Нужно вернуть ТОЛЬКО JSON по схеме:
-
-{{
-  "op_date": "YYYY-MM-DD",        // дата операции. если не указана - сегодня.
-  "amount": 12345,               // целое число рублей. если суммы нет - 0.
-  "category": "..." ,            // одна из разрешенных категорий или пустая строка
-  "needs_review": true/false     // true если категория не уверенная или не удалось определить
-}}
-
-Разрешенные категории (строго выбирать из списка):
+Finbot: разбор короткого сообщения о доходе/расходе (бывает 12к, 200k, "две тысячи").
+Верни ТОЛЬКО JSON:
+{{"op_date":"YYYY-MM-DD","amount":12345,"category":"<код>","needs_review":false}}
+
+Категории (код=название), в category пиши ТОЛЬКО код:
 {categories_section}
 
 Правила:
-- Если категория не очевидна или подходит несколько, ставь category="" и needs_review=true
-- Если категория понятна, ставь needs_review=false и category = выбранная категория
-- Сумму нормализуй: "12к"=12000, "200k"=200000, "две тысячи"=2000
-- Если указано "вчера" - op_date = вчера относительно today.
-- Валюта всегда рубли.
-Верни ТОЛЬКО JSON. Без текста.
+- op_date: если не указана - today; "вчера" - today минус 1 день.
+- amount: целое число рублей, нормализуй "12к"=12000, "200k"=200000, "две тысячи"=2000; нет суммы - 0.
+- Категория не очевидна или подходит несколько: category="", needs_review=true.
+- Иначе needs_review=false и category = код категории.
+Без текста вокруг JSON.
 """.strip()
 
 
-def _build_categories_section(category_names: Iterable[str] | None) -> str:
-    seen: list[str] = []
-    source = list(category_names or [])
-    if not source:
-        source = [name for name in DEFAULT_CATEGORY_NAMES if name]
-    for name in source:
-        normalized = (name or "").strip()
-        if not normalized or normalized in seen:
-            continue
-        seen.append(normalized)
-    if not seen:
-        seen = [name for name in DEFAULT_CATEGORY_NAMES if name]
-    return "\n".join(f"- {name}" for name in seen)
+# Ожидаемая схема ответа: ключ -> допустимые типы (строки тоже допускаем, их нормализуем ниже).
+OPERATION_SCHEMA = {
+    "op_date": str,
+    "amount": (int, float, str),
+    "category": str,
+    "needs_review": (bool, str),
+}
+
+
+class CategoryCodes:
+    """
+    Короткие коды категорий для промпта ("c" + 3 символа хэша category_id) и обратный O(1)-маппинг.
+    category_id (must_products, user_<8hex>) в промпт не попадают — это лишние токены на каждый запрос;
+    модель возвращает короткий код, category_id и имя восстанавливаем локально по словарю.
+    Код выводится из category_id, поэтому не меняется, когда категории добавляют, удаляют или
+    переставляют: ответ модели и примеры в промпте не разъезжаются со справочником. При совпадении
+    хэшей категории, идущей позже по category_id, достаётся код длиннее.
+    """
+
+    def __init__(self, categories: Iterable[Category] | None):
+        pairs = [(c.category_id, c.name) for c in categories or []]
+        if not pairs:
+            pairs = list(DEFAULT_CATEGORIES)
+
+        names: dict[str, str] = {}
+        for category_id, name in pairs:
+            category_id = (category_id or "").strip()
+            name = (name or "").strip()
+            if category_id and name:
+                names.setdefault(category_id, name)
+
+        # Коллизии разбираем в порядке category_id — от порядка списка коды не зависят
+        self._code_by_id: dict[str, str] = {}
+        taken: set[str] = set()
+        for category_id in sorted(names):
+            digits = _code_digits(category_id)
+            size = CODE_HASH_CHARS
+            while f"c{digits[:size]}" in taken and size < len(digits):
+                size += 1
+            code = f"c{digits[:size]}"
+            taken.add(code)
+            self._code_by_id[category_id] = code
+
+        # Промпт — в порядке справочника
+        self.by_code: dict[str, tuple[str, str]] = {}
+        self._code_by_name: dict[str, str] = {}
+        for category_id, name in names.items():
+            code = self._code_by_id[category_id]
+            self.by_code[code] = (category_id, name)
+            self._code_by_name.setdefault(name.lower(), code)
+
+    def code_for(self, category_id: str) -> str:
+        """
+        category_id -> короткий код; "" если категории нет в списке.
+        """
+        return self._code_by_id.get(category_id, "")
+
+    def prompt_section(self) -> str:
+        return "\n".join(f"{code}={name}" for code, (_, name) in self.by_code.items())
+
+    def resolve(self, raw: str) -> tuple[str, str]:
+        """
+        Короткий код -> (category_id, name). Если модель всё же вернула category_id или имя — тоже находим.
+        Неизвестное значение -> ("", "").
+        """
+        candidate = (raw or "").strip()
+        code = candidate.lower()
+        if code not in self.by_code:
+            code = self._code_by_id.get(candidate) or self._code_by_name.get(candidate.lower(), "")
+        if code:
+            return self.by_code[code]
+        return "", ""
+
+
+ESCALATE_NEEDS_REVIEW = "needs_review"
+ESCALATE_UNKNOWN_CATEGORY = "unknown_category"
+ESCALATE_ZERO_AMOUNT = "zero_amount"
+
+
+class TierStats:
+    """
+    Счётчики двухуровневого разбора: сколько сообщений обработал каждый уровень,
+    суммарная задержка и причины эскалации.
+    """
+
+    def __init__(self) -> None:
+        self.calls: Counter[str] = Counter()
+        self.latency_s: Counter[str] = Counter()
+        self.escalations: Counter[str] = Counter()
+
+    def record(self, tier: str, elapsed_s: float) -> None:
+        self.calls[tier] += 1
+        self.latency_s[tier] += elapsed_s
+
+    def summary(self) -> str:
+        parts = []
+        for tier, calls in sorted(self.calls.items()):
+            avg = self.latency_s[tier] / calls if calls else 0.0
+            parts.append(f"{tier}={calls} (ср. {avg:.2f} с)")
+        return ", ".join(parts)
+
+
+TIER_STATS = TierStats()
+
+
+def _normalize_result(result: Dict[str, Any], today: datetime, codes: CategoryCodes) -> Dict[str, Any]:
+    op_date = str(result.get("op_date", today.strftime("%Y-%m-%d")))
+    amount = result.get("amount", 0)
+    try:
+        amount = int(float(str(amount).replace(" ", "").replace(",", ".")))
+    except Exception:
+        amount = 0
+
+    raw_category = str(result.get("category", "")).strip()
+    category_id, category = codes.resolve(raw_category)
+    needs_review = result.get("needs_review", False)
+    if isinstance(needs_review, str):
+        needs_review = needs_review.strip().lower() in ("true", "1", "yes")
+    needs_review = bool(needs_review)
+
+    return {
+        "op_date": op_date,
+        "amount": amount,
+        "category": category,
+        "category_id": category_id,
+        "raw_category": raw_category,
+        "needs_review": needs_review,
+    }
 
 
-def parse_operation_with_gpt(
+def _escalation_reasons(parsed: Dict[str, Any], rules: frozenset[str]) -> list[str]:
+    """
+    Проверяет ответ быстрой модели по правилам эскалации.
+    unknown_category — код категории не найден в списке (аналог промаха resolve_category_from_list).
+    """
+    reasons: list[str] = []
+    if ESCALATE_NEEDS_REVIEW in rules and parsed["needs_review"]:
+        reasons.append(ESCALATE_NEEDS_REVIEW)
+    if ESCALATE_UNKNOWN_CATEGORY in rules and not parsed["category_id"]:
+        reasons.append(ESCALATE_UNKNOWN_CATEGORY)
+    if ESCALATE_ZERO_AMOUNT in rules and parsed["amount"] == 0:
+        reasons.append(ESCALATE_ZERO_AMOUNT)
+    return reasons
+
+
+def _examples_section(examples: Sequence[SimilarExample], codes: CategoryCodes) -> str:
+    """
+    Похожие прошлые записи пользователя для few-shot: "текст -> код".
+    Примеры с категориями, которых уже нет в списке, пропускаем.
+    """
+    lines = [
+        f"{ex.text.strip()} -> {codes.code_for(ex.category_id)}"
+        for ex in examples
+        if codes.code_for(ex.category_id) and ex.text.strip()
+    ]
+    if not lines:
+        return ""
+    return "history (похожие записи пользователя, текст -> код):\n" + "\n".join(lines)
+
+
+async def _timed_chat(
+    llm: LLMClient,
+    system: str,
+    user: str,
+    tier: str,
+    priority: int,
+    tg_user_id: int,
+    deadline: float | None = None,
+) -> Dict[str, Any]:
+    started = time.monotonic()
+    try:
+        return await llm.chat_json(
+            system=system,
+            user=user,
+            tier=tier,
+            schema=OPERATION_SCHEMA,
+            priority=priority,
+            tg_user_id=tg_user_id,
+            deadline=deadline,
+        )
+    finally:
+        TIER_STATS.record(tier, time.monotonic() - started)
+
+
+async def parse_operation_with_gpt(
     llm: LLMClient,
     text: str,
     today: datetime,
-    category_names: Iterable[str] | None = None,
+    categories: Iterable[Category] | None = None,
+    examples: Sequence[SimilarExample] = (),
+    priority: int = PRIORITY_TEXT,
+    tg_user_id: int = 0,
 ) -> Dict[str, Any]:
-    system_prompt = SYSTEM_PROMPT_TEMPLATE.format(
-        categories_section=_build_categories_section(category_names)
-    )
+    """
+    Разбор сообщения через LLM.
+    priority — класс запроса для планировщика LLM (текст/голос), tg_user_id — для учёта расхода.
+    examples — похожие прошлые операции пользователя, идут в user-промпт как few-shot
+    (системный промпт при этом не меняется от сообщения к сообщению).
+    Если у провайдеров задана быстрая модель, сначала спрашиваем её;
+    основная модель вызывается только по правилам эскалации (llm.escalate_on).
+    Оба уровня делят один бюджет LLM_BUDGET_S: основной модели остаётся то, что не потратила быстрая.
+    """
+    codes = CategoryCodes(categories)
+    system_prompt = SYSTEM_PROMPT_TEMPLATE.format(categories_section=codes.prompt_section())
     user_prompt = f"""
 today={today.strftime("%Y-%m-%d")}
 text={text}
 """.strip()
+    history = _examples_section(examples, codes)
+    if history:
+        user_prompt = f"{history}\n{user_prompt}"
 
-    result = llm.chat_json(system=system_prompt, user=user_prompt)
+    deadline = llm.new_deadline()
+    if llm.has_fast_tier():
+        fast_error: Exception | None = None
+        try:
+            fast = _normalize_result(
+                await _timed_chat(
+                    llm, system_prompt, user_prompt, LLMClient.TIER_FAST, priority, tg_user_id, deadline
+                ),
+                today,
+                codes,
+            )
+            reasons = _escalation_reasons(fast, llm.escalate_on)
+        except LLMUnavailableError:
+            raise
+        except Exception as e:
+            fast_error = e
+            reasons = ["fast_error"]
 
-    op_date = str(result.get("op_date", today.strftime("%Y-%m-%d")))
-    amount = result.get("amount", 0)
-    try:
-        amount = int(amount)
-    except Exception:
-        amount = 0
+        if not reasons:
+            log_event(f"LLM: ответ быстрой модели принят. Уровни: {TIER_STATS.summary()}.")
+            return fast
 
-    category = str(result.get("category", "")).strip()
-    needs_review = bool(result.get("needs_review", False))
+        TIER_STATS.escalations.update(reasons)
+        log_event(
+            f"LLM: эскалация на основную модель ({', '.join(reasons)}"
+            f"{': ' + repr(fast_error) if fast_error else ''}). Уровни: {TIER_STATS.summary()}."
+        )
 
-    return {"op_date": op_date, "amount": amount, "category": category, "needs_review": needs_review}
+    result = await _timed_chat(
+        llm, system_prompt, user_prompt, LLMClient.TIER_STRONG, priority, tg_user_id, deadline
+    )
+    return _normalize_result(result, today, codes)
+
+
+BATCH_SYSTEM_PROMPT_TEMPLATE = """
+Finbot: для каждой записи о доходе/расходе определи категорию.
+Верни ТОЛЬКО JSON:
+{{"items":[{{"id":1,"category":"<код>"}}]}}
+
+Категории (код=название), в category пиши ТОЛЬКО код:
+{categories_section}
+
+Если категория не очевидна или подходит несколько - category="".
+Без текста вокруг JSON.
+""".strip()
+
+BATCH_SCHEMA = {"items": list}
+
+
+async def classify_batch_with_gpt(
+    llm: LLMClient,
+    items: Sequence[tuple[int, str]],
+    categories: Iterable[Category] | None = None,
+) -> Dict[int, tuple[str, str]]:
+    """
+    Определяет категории сразу для нескольких записей одним запросом (для фонового разбора pending).
+    items: [(id, текст)]. Возвращает {id: (category_id, name)} только для уверенно распознанных.
+    """
+    if not items:
+        return {}
+    codes = CategoryCodes(categories)
+    system_prompt = BATCH_SYSTEM_PROMPT_TEMPLATE.format(categories_section=codes.prompt_section())
+    user_prompt = "\n".join(f"{item_id}: {text}" for item_id, text in items)
+
+    result = await llm.chat_json(
+        system=system_prompt,
+        user=user_prompt,
+        tier=LLMClient.TIER_STRONG,
+        schema=BATCH_SCHEMA,
+        priority=PRIORITY_BACKGROUND,
+    )
+
+    known_ids = {item_id for item_id, _ in items}
+    resolved: Dict[int, tuple[str, str]] = {}
+    for entry in result.get("items") or []:
+        if not isinstance(entry, dict):
+            continue
+        try:
+            item_id = int(entry.get("id"))
+        except (TypeError, ValueError):
+            continue
+        category_id, name = codes.resolve(str(entry.get("category", "")))
+        if item_id in known_ids and category_id:
+            resolved[item_id] = (category_id, name)
+    return resolved
@@ -1,6 +1,6 @@
 import re
-from datetime import datetime
-from typing import Iterable
+from datetime import datetime, timedelta
+from typing import Iterable, Optional, Sequence
 
 from app.models.operation import Operation
 
@@ -56,26 +56,114 @@ def build_pending_operation_from_text(
     )
 
 
+# Всё, что похоже на дату кроме "сегодня/вчера/позавчера", локальный разбор не берёт — решает LLM.
+_DATE_HINT_RE = re.compile(
+    r"\d+[./-]\d+|числ|январ|феврал|март|апрел|ма[яй]|июн|июл|август|сентябр|октябр|ноябр|декабр"
+    r"|понедельник|вторник|сред[ау]|четверг|пятниц|суббот|воскресен|недел|назад"
+)
+# Число берётся целиком (без отката внутрь цифр), за ним допускаются только множитель тысяч
+# ("12к" — только слитно, "3 тыс"/"3 тысячи") и/или валюта (р/руб/рублей/₽). Буква, приклеенная к числу иначе
+# ("300г", "2шт"), попадает в последнюю группу — такое сообщение локально не разбираем.
+_LOCAL_AMOUNT_RE = re.compile(
+    r"(?<!\d)(\d{1,3}(?:[ \u00a0]\d{3})+|\d+)(?!\d)"
+    r"(?:(к|k|\s*тыс[а-я]*)(?![а-яa-z]))?"
+    r"(?:\s*(?:р|руб[а-я]*|₽)(?![а-яa-z]))?"
+    r"([а-яa-z]?)"
+)
+
+
+def parse_simple_amount_and_date(text: str, now: datetime) -> Optional[tuple[int, datetime]]:
+    """
+    Разбор суммы и даты без LLM — только для простых сообщений:
+    ровно одно число (допускаются "5 000", "12к", "3 тысячи", "500р", "300 руб"),
+    из дат — только сегодня/вчера/позавчера.
+    Для всего остального возвращает None.
+    """
+    lowered = (text or "").lower().replace("ё", "е")
+    if _DATE_HINT_RE.search(lowered):
+        return None
+    matches = _LOCAL_AMOUNT_RE.findall(lowered)
+    if len(matches) != 1:
+        return None
+    digits, suffix, glued = matches[0]
+    if glued:
+        return None
+    amount = int(re.sub(r"\D", "", digits)) * (1000 if suffix else 1)
+    if amount <= 0:
+        return None
+
+    if "позавчера" in lowered:
+        op_dt = now - timedelta(days=2)
+    elif "вчера" in lowered:
+        op_dt = now - timedelta(days=1)
+    else:
+        op_dt = now
+    return amount, op_dt
+
+
+def build_local_operation(
+    text: str,
+    tg_user_id: int,
+    tg_message_id: int,
+    category_id: str,
+    category_name: str,
+    source: str = "text",
+) -> Optional[Operation]:
+    """
+    Собирает ok-операцию без LLM, если категория уже известна локально
+    (классификатор), а сумма и дата разбираются простым парсером.
+    """
+    now = datetime.now()
+    parsed = parse_simple_amount_and_date(text, now)
+    if parsed is None or not category_id:
+        return None
+    amount, op_dt = parsed
+
+    return Operation(
+        created_at=now.strftime("%Y-%m-%d %H:%M:%S"),
+        op_date=op_dt.strftime("%Y-%m-%d"),
+        category=category_name,
+        amount=amount,
+        comment_raw=text,
+        source=source,
+        tg_user_id=tg_user_id,
+        tg_message_id=tg_message_id,
+        status="ok",
+        needs_review="FALSE",
+        month_key=op_dt.strftime("%Y-%m"),
+        error="",
+        category_id=category_id,
+    )
+
+
 from app.llm.client import LLMClient
+from app.llm.scheduler import PRIORITY_TEXT
+from app.services.example_index import SimilarExample
 from app.services.gpt_parse_service import parse_operation_with_gpt
+from app.sheets.category_repo import Category
 
 
-def build_operation_from_text_with_gpt(
+async def build_operation_from_text_with_gpt(
     llm: LLMClient,
     text: str,
     tg_user_id: int,
     tg_message_id: int,
     source: str = "text",
-    category_names: Iterable[str] | None = None,
+    categories: Iterable[Category] | None = None,
+    examples: Sequence[SimilarExample] = (),
+    priority: int = PRIORITY_TEXT,
 ) -> Operation:
     now = datetime.now()
     created_at = now.strftime("%Y-%m-%d %H:%M:%S")
 
-    parsed = parse_operation_with_gpt(
+    parsed = await parse_operation_with_gpt(
         llm=llm,
         text=text,
         today=now,
-        category_names=category_names,
+        categories=categories,
+        examples=examples,
+        priority=priority,
+        tg_user_id=tg_user_id,
     )
 
     op_date = parsed["op_date"]  # YYYY-MM-DD
@@ -83,12 +171,14 @@ def build_operation_from_text_with_gpt(
 
     amount = int(parsed["amount"])
     category = parsed["category"]
+    category_id = parsed["category_id"]
     needs_review = bool(parsed["needs_review"])
 
-    if needs_review or not category:
+    if needs_review or not category_id:
         status = "pending"
         needs_review_str = "TRUE"
         category = ""
+        category_id = ""
     else:
         status = "ok"
         needs_review_str = "FALSE"
@@ -106,4 +196,5 @@ def build_operation_from_text_with_gpt(
         needs_review=needs_review_str,
         month_key=month_key,
         error="",
+        category_id=category_id,
     )
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Optional
+
+from app.event_log import log_event
+from app.llm.scheduler import PRIORITY_VOICE
+from app.llm.usage import KIND_WHISPER_LOCAL, OUTCOME_ERROR, OUTCOME_SILENT, CallUsage, UsageStore
+from app.services.transcribe_service import TranscribeResult, Transcriber
+
+# Модель загружается один раз в каждом процессе пула (см. _init_worker).
+_MODEL: Any = None
+_LANGUAGE: Optional[str] = None
+
+
+def faster_whisper_available() -> bool:
+    return importlib.util.find_spec("faster_whisper") is not None
+
+
+def _init_worker(model_name: str, compute_type: str, cpu_threads: int, language: str) -> None:
+    global _MODEL, _LANGUAGE
+    from faster_whisper import WhisperModel
+
+    _MODEL = WhisperModel(model_name, device="cpu", compute_type=compute_type, cpu_threads=cpu_threads)
+    _LANGUAGE = language or None
+
+
+def _ping() -> bool:
+    return _MODEL is not None
+
+
+def _transcribe_in_worker(file_path: str) -> tuple[str, float]:
+    """
+    Выполняется в процессе пула. Возвращает (текст, секунд речи после VAD).
+    """
+    segments, info = _MODEL.transcribe(
+        file_path,
+        language=_LANGUAGE,
+        beam_size=1,
+        vad_filter=True,
+    )
+    text = " ".join(segment.text.strip() for segment in segments).strip()
+    speech_s = float(getattr(info, "duration_after_vad", None) or getattr(info, "duration", 0.0) or 0.0)
+    return text, speech_s
+
+
+class LocalWhisperTranscriber:
+    """
+    Распознавание на CPU локальной моделью семейства Whisper (faster-whisper, квантованная int8).
+
+    Модель живёт в отдельных процессах (ProcessPoolExecutor, spawn), чтобы не держать GIL
+    и event loop бота; каждый процесс загружает её один раз при старте.
+    Записи длиннее max_seconds и ошибки локальной модели уходят в fallback (обычно WhisperTranscriber).
+    Контракт тот же: TranscribeResult.
+    """
+
+    def __init__(
+        self,
+        model_name: str = "small",
+        compute_type: str = "int8",
+        workers: int = 1,
+        cpu_threads: int = 0,
+        language: str = "ru",
+        max_seconds: float = 60.0,
+        fallback: Optional[Transcriber] = None,
+        usage_store: Optional[UsageStore] = None,
+    ):
+        if not faster_whisper_available():
+            raise RuntimeError("faster-whisper is not installed (pip install faster-whisper)")
+
+        self.model_name = model_name
+        self.max_seconds = max_seconds
+        self.fallback = fallback
+        self.usage_store = usage_store
+        self._pool = ProcessPoolExecutor(
+            max_workers=max(1, workers),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model_name, compute_type, cpu_threads, language),
+        )
+
+    async def warm_up(self) -> None:
+        """
+        Поднимает процессы пула и загружает модель заранее, чтобы первое голосовое не ждало загрузки.
+        """
+        started = time.monotonic()
+        try:
+            await asyncio.get_running_loop().run_in_executor(self._pool, _ping)
+        except Exception as e:
+            log_event(f"Локальный Whisper: не удалось загрузить модель {self.model_name}: {repr(e)}")
+            return
+        log_event(f"Локальный Whisper: модель {self.model_name} загружена за {time.monotonic() - started:.1f} с.")
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    async def transcribe_ogg(
+        self,
+        file_path: str,
+        priority: int = PRIORITY_VOICE,
+        tg_user_id: int = 0,
+        audio_seconds: float = 0.0,
+    ) -> TranscribeResult:
+        if self.fallback is not None and self.max_seconds and audio_seconds > self.max_seconds:
+            return await self.fallback.transcribe_ogg(file_path, priority, tg_user_id, audio_seconds)
+
+        started = time.monotonic()
+        usage = CallUsage(kind=KIND_WHISPER_LOCAL, tg_user_id=tg_user_id, attempts=1, audio_seconds=audio_seconds)
+        try:
+            text, speech_s = await asyncio.get_running_loop().run_in_executor(
+                self._pool, _transcribe_in_worker, file_path
+            )
+            if not text and speech_s <= 0:
+                usage.outcome = OUTCOME_SILENT
+        except Exception as e:
+            usage.outcome = OUTCOME_ERROR
+            if self.fallback is None:
+                raise
+            log_event(f"Локальный Whisper: ошибка ({repr(e)}), отправляем голосовое в удалённый Whisper.")
+            return await self.fallback.transcribe_ogg(file_path, priority, tg_user_id, audio_seconds)
+        finally:
+            usage.wall_s = time.monotonic() - started
+            if self.usage_store is not None:
+                try:
+                    self.usage_store.record(usage)
+                except Exception as e:
+                    log_event(f"Локальный Whisper: не удалось записать учёт расхода: {repr(e)}")
+
+        if usage.outcome == OUTCOME_SILENT:
+            return TranscribeResult(text="", silent=True)
+        return TranscribeResult(text=text)
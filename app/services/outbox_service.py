@@ -0,0 +1,373 @@
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from app.event_log import log_event
+from app.models.operation import Operation
+from app.services.dedup_service import MessageDedup
+from app.services.pending_index import PendingIndex
+from app.sheets.journal_repo import JournalRepo
+
+OUTBOX_PATH = "storage/outbox.sqlite3"
+
+# После стольких неудачных попыток операция откладывается (parked) до перезапуска реплеера,
+# чтобы одна «битая» строка не держала очередь
+OUTBOX_MAX_ATTEMPTS = 8
+# Пауза перед повтором растёт вдвое с каждой попыткой, но не больше часа
+OUTBOX_RETRY_MAX_S = 3600.0
+
+_TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# {name} — operations или временная таблица при переносе старого outbox
+_CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS {name} (
+    op_id TEXT PRIMARY KEY,
+    tg_message_id INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    recorded_at TEXT NOT NULL,
+    sent_at TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT NOT NULL DEFAULT '',
+    retry_at TEXT
+)
+"""
+
+
+class OperationOutbox:
+    """
+    Локальный outbox операций (SQLite в режиме WAL).
+
+    Каждая операция сначала фиксируется здесь (synchronous=FULL -> fsync),
+    и только потом реплеер переносит её в Google Sheets.
+    Ключ идемпотентности — op_id (пользователь + сообщение): у разных чатов message_id совпадают.
+    Неудачные попытки считаются по строкам: до retry_at строка не выдаётся, а после max_attempts
+    откладывается (fetch_unsent её не видит), пока её не вернут в очередь requeue_parked.
+    """
+
+    def __init__(self, path: str = OUTBOX_PATH, max_attempts: int = OUTBOX_MAX_ATTEMPTS):
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+
+        self.path = path
+        self.max_attempts = max(1, int(max_attempts))
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(operations)")}
+        if columns and "op_id" not in columns:
+            self._migrate_to_op_id(columns)
+        self._conn.execute(_CREATE_TABLE.format(name="operations"))
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_operations_unsent ON operations (sent_at, recorded_at)"
+        )
+
+    def _migrate_to_op_id(self, columns: set[str]) -> None:
+        """
+        Переносит outbox с ключом tg_message_id в таблицу с ключом op_id (op_id берётся из payload).
+        """
+        retry_at = "retry_at" if "retry_at" in columns else "NULL"
+        rows = self._conn.execute(
+            f"""
+            SELECT payload, recorded_at, sent_at, attempts, last_error, {retry_at}
+            FROM operations ORDER BY recorded_at, tg_message_id
+            """
+        ).fetchall()
+        migrated = []
+        for payload, *rest in rows:
+            op = Operation(**json.loads(payload))
+            migrated.append((op.op_id, int(op.tg_message_id), payload, *rest))
+        self._conn.execute("BEGIN")
+        try:
+            self._conn.execute(_CREATE_TABLE.format(name="operations_new"))
+            self._conn.executemany(
+                """
+                INSERT OR IGNORE INTO operations_new
+                    (op_id, tg_message_id, payload, recorded_at, sent_at, attempts, last_error, retry_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                migrated,
+            )
+            self._conn.execute("DROP TABLE operations")
+            self._conn.execute("ALTER TABLE operations_new RENAME TO operations")
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        log_event(f"Outbox: таблица переведена на ключ op_id ({len(rows)} операций).")
+
+    def record(self, op: Operation) -> bool:
+        """
+        Сохраняет операцию. Возвращает False, если операция с тем же op_id уже была записана.
+        """
+        payload = json.dumps(dataclasses.asdict(op), ensure_ascii=False)
+        recorded_at = datetime.now().strftime(_TS_FORMAT)
+        with self._lock:
+            cur = self._conn.execute(
+                """
+                INSERT OR IGNORE INTO operations (op_id, tg_message_id, payload, recorded_at)
+                VALUES (?, ?, ?, ?)
+                """,
+                (op.op_id, int(op.tg_message_id), payload, recorded_at),
+            )
+        return cur.rowcount == 1
+
+    def contains(self, op_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM operations WHERE op_id = ?",
+                (str(op_id),),
+            ).fetchone()
+        return row is not None
+
+    def resolve_pending(self, op_id: str, category: str, category_id: str) -> Optional[Operation]:
+        """
+        Проставляет категорию pending-операции op_id, которая ещё не ушла в Sheets.
+        Строка ищется по ключу op_id; op_id из payload сверяется ещё раз на случай строк,
+        перенесённых из старого outbox.
+        Возвращает обновлённую операцию или None (операции нет, она уже отправлена или не pending).
+        """
+        op_id = str(op_id or "")
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM operations WHERE op_id = ? AND sent_at IS NULL",
+                (op_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            op = Operation(**json.loads(row[0]))
+            if op.op_id != op_id or op.status != "pending":
+                return None
+            op = dataclasses.replace(op, category=category, category_id=category_id, status="ok", needs_review="FALSE")
+            cur = self._conn.execute(
+                "UPDATE operations SET payload = ? WHERE op_id = ? AND sent_at IS NULL",
+                (json.dumps(dataclasses.asdict(op), ensure_ascii=False), op_id),
+            )
+        return op if cur.rowcount == 1 else None
+
+    def fetch_unsent(self, limit: int, now: Optional[datetime] = None) -> list[Operation]:
+        """
+        Возвращает до limit неотправленных операций в порядке записи.
+        Пропускает операции, чей повтор ещё не наступил (retry_at), и отложенные после max_attempts.
+        """
+        now_s = (now or datetime.now()).strftime(_TS_FORMAT)
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT payload FROM operations
+                WHERE sent_at IS NULL AND attempts < ? AND (retry_at IS NULL OR retry_at <= ?)
+                ORDER BY recorded_at, rowid
+                LIMIT ?
+                """,
+                (self.max_attempts, now_s, int(limit)),
+            ).fetchall()
+        return [Operation(**json.loads(payload)) for (payload,) in rows]
+
+    def mark_sent(self, op_ids: Iterable[str]) -> None:
+        sent_at = datetime.now().strftime(_TS_FORMAT)
+        ids = [(sent_at, str(op_id)) for op_id in op_ids]
+        if not ids:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE operations SET sent_at = ?, last_error = '' WHERE op_id = ?",
+                ids,
+            )
+
+    def mark_failed(
+        self,
+        op_ids: Iterable[str],
+        error: str,
+        base_delay_s: float = 0.0,
+        now: Optional[datetime] = None,
+    ) -> list[str]:
+        """
+        Засчитывает операциям неудачную попытку и откладывает следующую на base_delay_s * 2^(попытки-1)
+        (не больше OUTBOX_RETRY_MAX_S). Возвращает op_id операций, исчерпавших max_attempts (отложены).
+        """
+        now = now or datetime.now()
+        parked: list[str] = []
+        with self._lock:
+            for op_id in map(str, op_ids):
+                row = self._conn.execute(
+                    "SELECT attempts FROM operations WHERE op_id = ? AND sent_at IS NULL", (op_id,)
+                ).fetchone()
+                if row is None:
+                    continue
+                attempts = int(row[0]) + 1
+                delay_s = min(OUTBOX_RETRY_MAX_S, base_delay_s * 2 ** (attempts - 1))
+                retry_at = (now + timedelta(seconds=delay_s)).strftime(_TS_FORMAT)
+                self._conn.execute(
+                    "UPDATE operations SET attempts = ?, last_error = ?, retry_at = ? WHERE op_id = ?",
+                    (attempts, error, retry_at, op_id),
+                )
+                if attempts >= self.max_attempts:
+                    parked.append(op_id)
+        return parked
+
+    def note_error(self, op_ids: Iterable[str], error: str) -> None:
+        """
+        Запоминает ошибку без попытки: упала пачка целиком, и неясно, какая строка в ней виновата.
+        """
+        ids = [(error, str(op_id)) for op_id in op_ids]
+        if not ids:
+            return
+        with self._lock:
+            self._conn.executemany("UPDATE operations SET last_error = ? WHERE op_id = ?", ids)
+
+    def requeue_parked(self) -> int:
+        """
+        Возвращает отложенные операции в очередь (при запуске реплеера). Возвращает их число.
+        """
+        with self._lock:
+            cur = self._conn.execute(
+                "UPDATE operations SET attempts = 0, retry_at = NULL WHERE sent_at IS NULL AND attempts >= ?",
+                (self.max_attempts,),
+            )
+        return int(cur.rowcount)
+
+    def parked_count(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute(
+                "SELECT COUNT(*) FROM operations WHERE sent_at IS NULL AND attempts >= ?",
+                (self.max_attempts,),
+            ).fetchone()
+        return int(count)
+
+    def unsent_count(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute(
+                "SELECT COUNT(*) FROM operations WHERE sent_at IS NULL"
+            ).fetchone()
+        return int(count)
+
+
+class OutboxReplayer:
+    """
+    Фоновая задача: переносит операции из outbox в лист "Журнал" пачками.
+
+    - notify(): разбудить реплеер сразу после записи новой операции
+    - drain_once(): отправить одну пачку (повторно безопасно — дубли по op_id отсекаются);
+      если пачка упала, следующие отправки идут по одной операции, пока одна не пройдёт:
+      так «битая» строка копит попытки сама и уходит в отложенные, не задерживая остальные
+    - flush(): отправить всё, что накопилось (используется перед чтением журнала)
+    - run(): бесконечный цикл для asyncio.create_task
+    """
+
+    def __init__(
+        self,
+        outbox: OperationOutbox,
+        journal_repo: JournalRepo,
+        batch_size: int = 20,
+        interval_s: float = 10.0,
+        pending_index: Optional[PendingIndex] = None,
+        dedup: Optional[MessageDedup] = None,
+    ):
+        self.outbox = outbox
+        self.journal_repo = journal_repo
+        self.pending_index = pending_index
+        self.dedup = dedup
+        self.batch_size = batch_size
+        self.interval_s = interval_s
+        self._wakeup = asyncio.Event()
+        self._drain_lock = asyncio.Lock()
+        # После упавшей пачки шлём по одной операции, чтобы найти виноватую
+        self._isolate = False
+
+    def notify(self) -> None:
+        self._wakeup.set()
+
+    def _flush_batch(self, ops: list[Operation]) -> None:
+        ids = {op.op_id for op in ops}
+        # Фильтр дублей отсекает заведомо новые op_id — журнал читаем только ради «возможно есть».
+        candidates = self.dedup.maybe_seen(ids) if self.dedup is not None else ids
+        existing = self.journal_repo.find_existing_op_ids(candidates)
+        fresh = [op for op in ops if op.op_id not in existing]
+        if fresh:
+            epoch = self.journal_repo.partition_epoch
+            result = self.journal_repo.append_operations(fresh)
+            if self.journal_repo.partition_epoch != epoch and self.dedup is not None:
+                # Журнал перешёл на новую партицию: покрытие строк фильтра дублей начинается с нового листа,
+                # op_id прежнего остаются в фильтре, а find_existing_op_ids проверяет и предыдущий лист.
+                # Индекс pending хранит строки вместе с листом, так что прежние записи в нём остаются.
+                self.dedup.start_partition()
+            row_range = None
+            if self.pending_index is not None or self.dedup is not None:
+                row_range = self.journal_repo.appended_row_range(result)
+            if self.pending_index is not None:
+                self.pending_index.add_appended(fresh, row_range, self.journal_repo.appended_sheet_name(result))
+            if self.dedup is not None:
+                self.dedup.add((op.op_id for op in fresh), row_range)
+        self.outbox.mark_sent(ids)
+
+    async def resolve_pending(self, op_id: str, category: str, category_id: str) -> Optional[Operation]:
+        """
+        Проставляет категорию pending-операции, пока она ещё в outbox (см. OperationOutbox.resolve_pending).
+        Под тем же замком, что и отправка, чтобы пачка в полёте не увезла в Sheets старую версию.
+        """
+        async with self._drain_lock:
+            op = self.outbox.resolve_pending(op_id, category, category_id)
+        if op is not None:
+            self.notify()
+        return op
+
+    async def drain_once(self) -> int:
+        """
+        Отправляет одну пачку. Возвращает число отправленных операций (0 при ошибке).
+        """
+        async with self._drain_lock:
+            ops = self.outbox.fetch_unsent(1 if self._isolate else self.batch_size)
+            if not ops:
+                return 0
+            try:
+                await asyncio.to_thread(self._flush_batch, ops)
+            except Exception as e:
+                log_event(f"Outbox: не удалось отправить пачку из {len(ops)} операций в Sheets: {repr(e)}")
+                if len(ops) > 1:
+                    self.outbox.note_error((op.op_id for op in ops), repr(e))
+                    self._isolate = True
+                    return 0
+                for op_id in self.outbox.mark_failed([ops[0].op_id], repr(e), base_delay_s=self.interval_s):
+                    log_event(
+                        f"Outbox: операция {op_id} не ушла в Sheets за {self.outbox.max_attempts} попыток "
+                        f"и отложена до перезапуска: {repr(e)}"
+                    )
+                return 0
+            self._isolate = False
+
+        log_event(f"Outbox: отправлено в Sheets операций: {len(ops)}.")
+        return len(ops)
+
+    async def flush(self) -> bool:
+        """
+        Отправляет всё накопленное. Возвращает True, если outbox опустел.
+        """
+        while await self.drain_once():
+            pass
+        return self.outbox.unsent_count() == 0
+
+    async def run(self) -> None:
+        requeued = self.outbox.requeue_parked()
+        log_event(
+            f"Outbox: реплеер запущен, в очереди {self.outbox.unsent_count()} операций "
+            f"(из них снова в очереди после откладывания: {requeued})."
+        )
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval_s)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                # Например, "database is locked": задача реплеера не должна тихо завершиться
+                log_event(f"Outbox: ошибка реплеера, повторим через {self.interval_s:.0f} с: {repr(e)}")
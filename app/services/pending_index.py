@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Iterable, Optional
+
+from app.models.operation import Operation, make_op_id
+from app.sheets.sheet_layout import JournalRow
+
+
+# (лист, номер строки): номера строк разных партиций пересекаются
+PendingKey = tuple[str, int]
+
+
+@dataclass
+class PendingRow:
+    row_index: int
+    tg_user_id: int
+    tg_message_id: int
+    created_at: str
+    op_date: str
+    amount: int
+    comment_raw: str
+    op_id: str = ""  # чья это строка: row_index лишь подсказка, перед записью сверяем op_id
+    sheet_name: str = ""  # партиция журнала: после смены периода строка остаётся на прежнем листе
+    attempts: int = 0
+
+    @property
+    def key(self) -> PendingKey:
+        return self.sheet_name, self.row_index
+
+
+class PendingIndex:
+    """
+    Индекс pending-строк журнала в памяти: (лист, row_index) -> PendingRow.
+
+    Заполняется один раз полным чтением журнала (load), дальше поддерживается инкрементально:
+    реплеер outbox добавляет только что записанные pending-операции, а обработчики
+    и фоновый разбор удаляют разрешённые строки.
+    Номер строки — только подсказка: лист могут отсортировать или удалить строки руками.
+    Поэтому у каждой строки хранится op_id, и перед записью по row_index строка сверяется
+    с журналом (JournalRepo.pending_rows_matching); при расхождении индекс перечитывается.
+    Строки хранятся вместе с листом: при переходе журнала на новую партицию pending-строки
+    прежнего периода остаются в индексе и разбираются там, где лежат.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._rows: dict[PendingKey, PendingRow] = {}
+        self.loaded = False
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._rows)
+
+    def __contains__(self, key: PendingKey) -> bool:
+        with self._lock:
+            return key in self._rows
+
+    def load(self, rows: Iterable[JournalRow]) -> None:
+        """
+        Полная замена по результату JournalRepo.list_pending_rows().
+        """
+        fresh: dict[PendingKey, PendingRow] = {}
+        for row in rows:
+            pending = PendingRow(
+                row_index=row.row_index,
+                tg_user_id=row.tg_user_id,
+                tg_message_id=row.tg_message_id,
+                created_at=row.created_at,
+                op_date=row.op_date,
+                amount=row.amount,
+                comment_raw=row.comment_raw,
+                op_id=row.op_id or make_op_id(row.tg_user_id, row.tg_message_id),
+                sheet_name=row.sheet_name,
+            )
+            fresh[pending.key] = pending
+        with self._lock:
+            self._rows = fresh
+            self.loaded = True
+
+    def add_appended(
+        self, ops: list[Operation], row_range: Optional[tuple[int, int]], sheet_name: Optional[str]
+    ) -> None:
+        """
+        Регистрирует pending-операции, только что добавленные в журнал одним append
+        (row_range и sheet_name — из JournalRepo.appended_row_range / appended_sheet_name).
+        Если диапазон строк неизвестен или не сходится с пачкой — индекс помечается
+        устаревшим и при следующем обходе перечитывается целиком.
+        """
+        if row_range is None or sheet_name is None or row_range[1] - row_range[0] + 1 != len(ops):
+            with self._lock:
+                self.loaded = False
+            return
+        with self._lock:
+            for offset, op in enumerate(ops):
+                if op.status != "pending":
+                    continue
+                row_index = row_range[0] + offset
+                self._rows[(sheet_name, row_index)] = PendingRow(
+                    row_index=row_index,
+                    tg_user_id=int(op.tg_user_id),
+                    tg_message_id=int(op.tg_message_id),
+                    created_at=op.created_at,
+                    op_date=op.op_date,
+                    amount=int(op.amount or 0),
+                    comment_raw=op.comment_raw,
+                    op_id=op.op_id,
+                    sheet_name=sheet_name,
+                )
+
+    def invalidate(self) -> None:
+        """
+        Сбрасывает индекс (например, строки в листе переставили и номера разошлись с журналом);
+        при следующем обращении он будет перечитан.
+        """
+        with self._lock:
+            self._rows = {}
+            self.loaded = False
+
+    def discard(self, key: PendingKey) -> None:
+        with self._lock:
+            self._rows.pop(key, None)
+
+    def discard_op(self, op_id: str) -> None:
+        """
+        Убирает строку операции op_id (номер строки мог устареть — ищем по самой операции).
+        """
+        with self._lock:
+            for key, row in list(self._rows.items()):
+                if row.op_id == op_id:
+                    del self._rows[key]
+
+    def mark_attempt(self, key: PendingKey) -> None:
+        with self._lock:
+            row = self._rows.get(key)
+            if row is not None:
+                row.attempts += 1
+
+    def row_for_op(self, op_id: str) -> Optional[PendingRow]:
+        """
+        Строка операции по op_id (пользователь + сообщение): tg_message_id уникален только в пределах чата.
+        """
+        with self._lock:
+            for row in self._rows.values():
+                if row.op_id == op_id:
+                    return row
+        return None
+
+    def last_row_for_user(self, tg_user_id: int) -> Optional[PendingRow]:
+        """
+        Последняя pending-строка пользователя: партиции называются по периодам, так что
+        больший (лист, номер строки) — более поздняя запись.
+        """
+        with self._lock:
+            rows = [r for r in self._rows.values() if r.tg_user_id == int(tg_user_id)]
+        return max(rows, key=lambda r: r.key) if rows else None
+
+    def due(self, limit: int, min_age_s: float, max_attempts: int, now: Optional[datetime] = None) -> list[PendingRow]:
+        """
+        Строки для фонового разбора: старше min_age_s (пользователь успел бы нажать кнопку сам),
+        с суммой и не исчерпавшие попытки. Сначала самые старые.
+        """
+        now = now or datetime.now()
+        with self._lock:
+            rows = list(self._rows.values())
+
+        result: list[PendingRow] = []
+        for row in sorted(rows, key=lambda r: r.key):
+            if row.amount <= 0 or row.attempts >= max_attempts or not row.comment_raw.strip():
+                continue
+            try:
+                age_s = (now - datetime.strptime(row.created_at, "%Y-%m-%d %H:%M:%S")).total_seconds()
+            except ValueError:
+                age_s = min_age_s
+            if age_s < min_age_s:
+                continue
+            result.append(row)
+            if len(result) >= limit:
+                break
+        return result
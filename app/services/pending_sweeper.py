@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import asyncio
+from collections import defaultdict
+from typing import Awaitable, Callable, Optional
+
+from app.event_log import log_event
+from app.llm.client import LLMClient
+from app.services.alias_service import AliasStore
+from app.services.category_classifier import CategoryClassifierRegistry
+from app.services.example_index import ExampleIndex
+from app.services.gpt_parse_service import classify_batch_with_gpt
+from app.services.pending_index import PendingIndex, PendingKey, PendingRow
+from app.sheets.category_repo import CategoryRepo
+from app.sheets.journal_repo import JournalRepo
+
+Notifier = Callable[[int, str], Awaitable[None]]
+
+
+class PendingSweeper:
+    """
+    Фоновый разбор pending-строк, до которых пользователь не дошёл сам.
+
+    Раз в interval_s берёт из PendingIndex до batch_size старых pending-строк:
+    - сначала пробует алиасы и локальный классификатор;
+    - остальные отправляет в LLM одним запросом (только если провайдер доступен);
+    - все найденные категории записывает одним batch_update_values на лист, предварительно сверив
+      строки с журналом одним batchGet (строки могли переставить или разобрать вручную);
+      строки прежней партиции пишутся в свой лист, так что смена периода разбору не мешает;
+    - по желанию присылает каждому пользователю одно сообщение-дайджест.
+    """
+
+    def __init__(
+        self,
+        pending_index: PendingIndex,
+        journal_repo: JournalRepo,
+        category_repo: CategoryRepo,
+        llm: Optional[LLMClient] = None,
+        category_classifier: Optional[CategoryClassifierRegistry] = None,
+        alias_store: Optional[AliasStore] = None,
+        example_index: Optional[ExampleIndex] = None,
+        notifier: Optional[Notifier] = None,
+        interval_s: float = 300.0,
+        batch_size: int = 20,
+        min_age_s: float = 600.0,
+        max_attempts: int = 3,
+    ):
+        self.pending_index = pending_index
+        self.journal_repo = journal_repo
+        self.category_repo = category_repo
+        self.llm = llm
+        self.category_classifier = category_classifier
+        self.alias_store = alias_store
+        self.example_index = example_index
+        self.notifier = notifier
+        self.interval_s = interval_s
+        self.batch_size = batch_size
+        self.min_age_s = min_age_s
+        self.max_attempts = max_attempts
+
+    def _resolve_locally(self, row: PendingRow, names_by_id: dict[str, str]) -> Optional[str]:
+        if self.alias_store is not None:
+            category_id = self.alias_store.match(row.tg_user_id, row.comment_raw)
+            if category_id in names_by_id:
+                return category_id
+        if self.category_classifier is not None:
+            prediction = self.category_classifier.predict(row.tg_user_id, row.comment_raw)
+            if prediction is not None and prediction.category_id in names_by_id:
+                return prediction.category_id
+        return None
+
+    async def sweep_once(self) -> int:
+        """
+        Один проход. Возвращает число разрешённых строк.
+        """
+        if not self.pending_index.loaded:
+            self.pending_index.load(await asyncio.to_thread(self.journal_repo.list_pending_rows))
+            log_event(f"Pending: индекс загружен, строк в ожидании: {len(self.pending_index)}.")
+
+        due = self.pending_index.due(self.batch_size, self.min_age_s, self.max_attempts)
+        if not due:
+            return 0
+
+        categories = await asyncio.to_thread(self.category_repo.list_active_or_cached)
+        names_by_id = {c.category_id: c.name for c in categories}
+
+        resolved: dict[PendingKey, str] = {}
+        rest: list[PendingRow] = []
+        for row in due:
+            category_id = self._resolve_locally(row, names_by_id)
+            if category_id:
+                resolved[row.key] = category_id
+            else:
+                rest.append(row)
+
+        if rest and self.llm is not None and self.llm.is_available():
+            try:
+                # id — позиция в пачке: номера строк разных партиций могут совпасть
+                by_item = await classify_batch_with_gpt(
+                    self.llm,
+                    [(i, row.comment_raw) for i, row in enumerate(rest)],
+                    categories,
+                )
+            except Exception as e:
+                log_event(f"Pending: LLM не смог разобрать пачку из {len(rest)} строк: {repr(e)}")
+                by_item = {}
+            for i, row in enumerate(rest):
+                if i in by_item:
+                    resolved[row.key] = by_item[i][0]
+                else:
+                    self.pending_index.mark_attempt(row.key)
+
+        # Пока шёл разбор, пользователь мог сам выбрать категорию или отменить запись.
+        rows = [row for row in due if row.key in resolved and row.key in self.pending_index]
+        if not rows:
+            return 0
+
+        by_sheet: dict[str, list[tuple[int, str, str, str]]] = defaultdict(list)
+        for row in rows:
+            category_id = resolved[row.key]
+            by_sheet[row.sheet_name].append((row.row_index, row.op_id, names_by_id[category_id], category_id))
+        written: set[PendingKey] = set()
+        try:
+            for sheet_name, updates in by_sheet.items():
+                rows_written = await asyncio.to_thread(
+                    self.journal_repo.resolve_pending_rows, updates, sheet_name or None
+                )
+                written.update((sheet_name, row_index) for row_index in rows_written)
+        except Exception as e:
+            log_event(f"Pending: не удалось записать {len(rows)} категорий в Sheets: {repr(e)}")
+            return 0
+
+        stale = [row for row in rows if row.key not in written]
+        rows = [row for row in rows if row.key in written]
+        for row in rows:
+            self.pending_index.discard(row.key)
+            category_id = resolved[row.key]
+            if self.category_classifier is not None:
+                self.category_classifier.learn(row.tg_user_id, row.comment_raw, category_id)
+            if self.example_index is not None:
+                self.example_index.learn(row.tg_user_id, row.comment_raw, category_id)
+        if stale:
+            # Строки не совпали с журналом: индекс устарел, при следующем проходе перечитаем его
+            self.pending_index.invalidate()
+            log_event(f"Pending: {len(stale)} строк изменились в журнале, индекс будет перечитан.")
+        if not rows:
+            return 0
+        log_event(f"Pending: фоном разобрано строк: {len(rows)}, осталось в ожидании: {len(self.pending_index)}.")
+
+        if self.notifier is not None:
+            await self._send_digests(rows, resolved, names_by_id)
+        return len(rows)
+
+    async def _send_digests(
+        self,
+        rows: list[PendingRow],
+        resolved: dict[PendingKey, str],
+        names_by_id: dict[str, str],
+    ) -> None:
+        by_user: dict[int, list[str]] = defaultdict(list)
+        for row in rows:
+            name = names_by_id[resolved[row.key]]
+            by_user[row.tg_user_id].append(f"• {row.op_date} · {name} · {row.amount} ₽ — {row.comment_raw}")
+
+        for tg_user_id, lines in by_user.items():
+            text = (
+                f"🗂 Разобрал отложенные записи ({len(lines)}):\n"
+                + "\n".join(lines)
+                + "\n\nЕсли что-то не так — поправьте через /edit."
+            )
+            try:
+                await self.notifier(tg_user_id, text)
+            except Exception as e:
+                log_event(f"Pending: не удалось отправить дайджест пользователю {tg_user_id}: {repr(e)}")
+
+    async def run(self) -> None:
+        log_event(f"Pending: фоновый разбор запущен (каждые {self.interval_s:.0f} с).")
+        while True:
+            await asyncio.sleep(self.interval_s)
+            try:
+                await self.sweep_once()
+            except Exception as e:
+                log_event(f"Pending: ошибка фонового разбора: {repr(e)}")
@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+import re
+from collections import Counter
+
+_NON_WORD_RE = re.compile(r"[^a-zа-я]+")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Приводит комментарий операции к виду для сравнения:
+    нижний регистр, ё -> е, без цифр и знаков (суммы и даты не должны влиять на категорию).
+    """
+    lowered = (text or "").lower().replace("ё", "е")
+    return _NON_WORD_RE.sub(" ", lowered).strip()
+
+
+def char_ngrams(text: str, n_min: int = 2, n_max: int = 4) -> Counter[str]:
+    """
+    Символьные n-граммы по словам с маркерами границ: "такси" -> " т", "та", ..., "си ".
+    Разреженный вектор в виде Counter: n-грамма -> сколько раз встретилась.
+    """
+    features: Counter[str] = Counter()
+    for word in normalize_text(text).split():
+        padded = f" {word} "
+        for n in range(n_min, n_max + 1):
+            for i in range(len(padded) - n + 1):
+                features[padded[i:i + n]] += 1
+    return features
@@ -1,14 +1,48 @@
 from __future__ import annotations
 
+import asyncio
+import contextlib
+import time
 from dataclasses import dataclass
-from typing import Optional
+from typing import Optional, Protocol
 
 import httpx
 
+from app.llm.providers import Provider, ProviderPool
+from app.event_log import log_event
+from app.services.audio_processing import (
+    SAMPLE_RATE,
+    AudioDecodeError,
+    decode_to_pcm,
+    encode_for_upload,
+    ffmpeg_available,
+    pcm_seconds,
+    split_pcm,
+    trim_silence,
+)
+from app.llm.scheduler import PRIORITY_VOICE, RequestScheduler
+from app.llm.usage import KIND_WHISPER, OUTCOME_ERROR, OUTCOME_SILENT, CallUsage, UsageStore
+
 
 @dataclass
 class TranscribeResult:
     text: str
+    silent: bool = False  # в записи не нашлось речи, Whisper не вызывался
+
+
+class Transcriber(Protocol):
+    """
+    Общий контракт распознавания голосовых: удалённый Whisper API (WhisperTranscriber)
+    или локальная модель на CPU (LocalWhisperTranscriber).
+    """
+
+    async def transcribe_ogg(
+        self,
+        file_path: str,
+        priority: int = PRIORITY_VOICE,
+        tg_user_id: int = 0,
+        audio_seconds: float = 0.0,
+    ) -> TranscribeResult: ...
 
 
 class WhisperTranscriber:
@@ -16,27 +50,173 @@ class WhisperTranscriber:
     OpenAI-compatible transcriber.
     Работает и с Artemox (если проксирует /v1/audio/transcriptions),
     и с прямым OpenAI (https://api.openai.com/v1).
+
+    Запросы идут через ProviderPool: если основной провайдер не ответил за свой p95,
+    файл параллельно отправляется резервному, берётся первый ответ.
+    Очерёдность и лимит одновременных запросов — через общий с LLM планировщик (scheduler),
+    секунды аудио, попытки и время — в usage_store.
+
+    Предобработка (preprocess, нужен ffmpeg): декодирование в 16 кГц моно, обрезка тишины по краям
+    энергетическим VAD, отказ без вызова Whisper, если речи меньше min_speech_s, и перекодирование
+    в компактный Opus.
+
+    Длинные голосовые (дольше chunk_threshold_s) режутся по паузам на куски
+    около chunk_target_s, куски распознаются параллельно (не больше chunk_parallelism сразу)
+    и склеиваются по порядку — задержка определяется самым долгим куском, а не всей записью.
     """
 
-    def __init__(self, base_url: str, api_key: str, model: str = "whisper-1", timeout: float = 60.0):
-        self.base_url = base_url.rstrip("/")
-        self.api_key = api_key
-        self.model = model
+    def __init__(
+        self,
+        providers: ProviderPool,
+        timeout: float = 60.0,
+        scheduler: Optional[RequestScheduler] = None,
+        usage_store: Optional[UsageStore] = None,
+        chunk_threshold_s: float = 0.0,
+        chunk_target_s: float = 30.0,
+        chunk_max_s: float = 45.0,
+        chunk_parallelism: int = 4,
+        preprocess: bool = False,
+        silence_rms: float = 300.0,
+        min_speech_s: float = 0.3,
+    ):
+        self.providers = providers
         self.timeout = timeout
+        self.scheduler = scheduler
+        self.usage_store = usage_store
+        self.chunk_threshold_s = chunk_threshold_s
+        self.chunk_target_s = chunk_target_s
+        self.chunk_max_s = chunk_max_s
+        self.chunk_parallelism = max(1, chunk_parallelism)
+        self.preprocess = preprocess
+        self.silence_rms = silence_rms
+        self.min_speech_s = min_speech_s
 
-    def transcribe_ogg(self, file_path: str) -> TranscribeResult:
-        url = f"{self.base_url}/audio/transcriptions"
-        headers = {"Authorization": f"Bearer {self.api_key}"}
+    async def transcribe_ogg(
+        self,
+        file_path: str,
+        priority: int = PRIORITY_VOICE,
+        tg_user_id: int = 0,
+        audio_seconds: float = 0.0,
+    ) -> TranscribeResult:
+        """
+        audio_seconds — длительность голосового из Telegram (решение о нарезке, если нет предобработки).
+        Почти беззвучная запись в Whisper не отправляется: TranscribeResult(text="", silent=True).
+        """
+        started = time.monotonic()
+        usage = CallUsage(kind=KIND_WHISPER, tg_user_id=tg_user_id, audio_seconds=audio_seconds)
+        try:
+            pcm = await self._decode(file_path, audio_seconds)
+            if pcm is None:
+                # Читаем файл один раз: при hedging его может понадобиться отправить двум провайдерам.
+                with open(file_path, "rb") as f:
+                    audio = f.read()
+                text = await self._transcribe_one(audio, "voice.ogg", "audio/ogg", priority, usage)
+            elif not pcm:
+                usage.outcome = OUTCOME_SILENT
+                usage.audio_seconds = 0.0
+                log_event(f"Whisper: голосовое пользователя {tg_user_id} без речи, распознавание не запускали.")
+                return TranscribeResult(text="", silent=True)
+            else:
+                usage.audio_seconds = pcm_seconds(pcm)
+                text = await self._transcribe_pcm(pcm, priority, usage)
+        except BaseException:
+            usage.outcome = OUTCOME_ERROR
+            raise
+        finally:
+            usage.wall_s = time.monotonic() - started
+            if self.usage_store is not None:
+                try:
+                    self.usage_store.record(usage)
+                except Exception as e:
+                    log_event(f"Whisper: не удалось записать учёт расхода: {repr(e)}")
+        return TranscribeResult(text=text)
 
-        # multipart/form-data
-        with open(file_path, "rb") as f:
-            files = {"file": ("voice.ogg", f, "audio/ogg")}
-            data = {"model": self.model}
+    async def _decode(self, file_path: str, audio_seconds: float) -> Optional[bytes]:
+        """
+        Декодирует запись в 16 кГц моно PCM и (если включена предобработка) обрезает тишину по краям.
+        None — отправляем исходный файл как есть (нет ffmpeg, ошибка декодирования,
+        или предобработка выключена, а запись слишком короткая для нарезки).
+        b"" — речи в записи нет.
+        """
+        wants_chunks = bool(self.chunk_threshold_s) and audio_seconds > self.chunk_threshold_s
+        if not (self.preprocess or wants_chunks) or not ffmpeg_available():
+            return None
+        try:
+            pcm = await decode_to_pcm(file_path)
+        except AudioDecodeError as e:
+            log_event(f"Whisper: не удалось декодировать голосовое, отправляем как есть: {repr(e)}")
+            return None
+        if not self.preprocess:
+            return pcm
 
-            with httpx.Client(timeout=self.timeout) as client:
-                resp = client.post(url, headers=headers, data=data, files=files)
-                resp.raise_for_status()
-                payload = resp.json()
+        trimmed, speech_s = await asyncio.to_thread(trim_silence, pcm, self.silence_rms)
+        if speech_s < self.min_speech_s:
+            return b""
+        log_event(
+            f"Whisper: предобработка {pcm_seconds(pcm):.1f} с -> {pcm_seconds(trimmed):.1f} с "
+            f"(речи {speech_s:.1f} с)."
+        )
+        return trimmed
 
-        text = (payload.get("text") or "").strip()
-        return TranscribeResult(text=text)
+    async def _transcribe_pcm(self, pcm: bytes, priority: int, usage: CallUsage) -> str:
+        if self.chunk_threshold_s and pcm_seconds(pcm) > self.chunk_threshold_s:
+            chunks = await asyncio.to_thread(split_pcm, pcm, SAMPLE_RATE, self.chunk_target_s, self.chunk_max_s)
+            if len(chunks) > 1:
+                log_event(
+                    f"Whisper: голосовое {pcm_seconds(pcm):.0f} с разбито по паузам на {len(chunks)} куск(а/ов)."
+                )
+                return await self._transcribe_chunks(chunks, priority, usage)
+
+        audio, filename, content_type = await encode_for_upload(pcm)
+        return await self._transcribe_one(audio, filename, content_type, priority, usage)
+
+    async def _transcribe_chunks(self, chunks: list[bytes], priority: int, usage: CallUsage) -> str:
+        semaphore = asyncio.Semaphore(self.chunk_parallelism)
+
+        async def _one(chunk: bytes) -> str:
+            async with semaphore:
+                audio, filename, content_type = await encode_for_upload(chunk)
+                return await self._transcribe_one(audio, filename, content_type, priority, usage)
+
+        # TaskGroup: если один кусок упал — остальные отменяются, ошибка уходит вызывающему.
+        async with asyncio.TaskGroup() as tg:
+            tasks = [tg.create_task(_one(chunk)) for chunk in chunks]
+        return " ".join(text for text in (task.result() for task in tasks) if text)
+
+    async def _transcribe_one(
+        self,
+        audio: bytes,
+        filename: str,
+        content_type: str,
+        priority: int,
+        usage: CallUsage,
+    ) -> str:
+        slot = self.scheduler.slot(priority) if self.scheduler is not None else contextlib.nullcontext()
+        async with slot:
+            payload = await self.providers.call(
+                lambda provider: self._post(provider, audio, usage, filename, content_type),
+                scheduler=self.scheduler,
+            )
+        return (payload.get("text") or "").strip()
+
+    async def _post(
+        self,
+        provider: Provider,
+        audio: bytes,
+        usage: Optional[CallUsage] = None,
+        filename: str = "voice.ogg",
+        content_type: str = "audio/ogg",
+    ) -> dict:
+        url = f"{provider.base_url}/audio/transcriptions"
+        headers = {"Authorization": f"Bearer {provider.api_key}"}
+
+        # multipart/form-data
+        files = {"file": (filename, audio, content_type)}
+        data = {"model": provider.whisper_model}
+
+        if usage is not None:
+            usage.attempts += 1
+        async with httpx.AsyncClient(timeout=self.timeout) as client:
+            resp = await client.post(url, headers=headers, data=data, files=files)
+            resp.raise_for_status()
+            return resp.json()
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Awaitable, Callable
+
+from app.event_log import log_event
+
+VoiceJob = Callable[[], Awaitable[None]]
+
+
+class VoiceQueueFullError(RuntimeError):
+    """
+    В очереди голосовых уже max_depth задач — новое голосовое не принимается.
+    """
+
+
+class VoiceQueue:
+    """
+    Очередь обработки голосовых: скачивание, распознавание, LLM и запись в Sheets
+    выполняют не больше workers задач одновременно, остальные ждут в очереди длиной до max_depth.
+
+    Так поток голосовых не съедает память и место под временные файлы и не отнимает
+    event loop у текстовых сообщений, которые обрабатываются сразу в хендлерах.
+    """
+
+    def __init__(self, workers: int = 2, max_depth: int = 20):
+        self.workers = max(1, workers)
+        self.max_depth = max(1, max_depth)
+        self._queue: asyncio.Queue[VoiceJob] = asyncio.Queue(maxsize=self.max_depth)
+        self._busy = 0
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    @property
+    def busy(self) -> int:
+        return self._busy
+
+    def full(self) -> bool:
+        return self._queue.full()
+
+    def waiting(self) -> int:
+        """
+        Сколько задач новому голосовому придётся подождать (0 — возьмут сразу).
+        """
+        return max(0, self.depth + self._busy - self.workers + 1)
+
+    def submit(self, job: VoiceJob) -> None:
+        """
+        Ставит задачу в очередь. При переполнении бросает VoiceQueueFullError.
+        """
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            log_event(f"Очередь голосовых переполнена ({self.max_depth}), голосовое отклонено.")
+            raise VoiceQueueFullError(f"voice queue is full ({self.max_depth})") from None
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            self._busy += 1
+            try:
+                await job()
+            except Exception as e:
+                log_event(f"Очередь голосовых: ошибка обработки: {repr(e)}")
+            finally:
+                self._busy -= 1
+                self._queue.task_done()
+
+    async def run(self) -> None:
+        log_event(f"Очередь голосовых запущена: обработчиков {self.workers}, длина очереди до {self.max_depth}.")
+        async with asyncio.TaskGroup() as tg:
+            for _ in range(self.workers):
+                tg.create_task(self._worker())
+
+    async def join(self) -> None:
+        await self._queue.join()
@@ -4,7 +4,7 @@ from dataclasses import dataclass
 import uuid
 from typing import Optional
 
-from app.sheets.client import SheetsClient
+from app.sheets.client import SheetsClient, sheet_range
 
 
 @dataclass(frozen=True)
@@ -31,9 +31,30 @@ class CategoryRepo:
         self.client = client
         self.spreadsheet_id = spreadsheet_id
         self.sheet_name = sheet_name
+        self._last_active: list[Category] = []
+
+    def list_active_or_cached(self) -> list[Category]:
+        """
+        Как list_active, но при недоступности Google Sheets возвращает
+        последний успешно прочитанный список (или пустой).
+        """
+        try:
+            return self.list_active()
+        except Exception:
+            return list(self._last_active)
+
+    def a1_range(self, a1: str) -> str:
+        return sheet_range(self.sheet_name, a1)
 
     def list_active(self) -> list[Category]:
         rows = self.client.get_values(self.spreadsheet_id, self.sheet_name, "A:E")
+        return self.parse_active(rows)
+
+    def parse_active(self, rows: list[list]) -> list[Category]:
+        """
+        Разбор значений A:E (с заголовком) в отсортированный список активных категорий.
+        Запоминает результат для list_active_or_cached / get_cached_name.
+        """
         if not rows or len(rows) < 2:
             return []
 
@@ -70,8 +91,19 @@ class CategoryRepo:
 
         # section -> order -> name
         result.sort(key=lambda c: (c.section, c.order, c.name))
+        self._last_active = result
         return result
 
+    def get_cached_name(self, category_id: str) -> Optional[str]:
+        """
+        Имя категории из последнего прочитанного списка (клавиатура строилась по нему),
+        без запроса к Sheets; если там нет — как get_name_by_id.
+        """
+        for category in self._last_active:
+            if category.category_id == category_id:
+                return category.name
+        return self.get_name_by_id(category_id)
+
     def get_name_by_id(self, category_id: str) -> Optional[str]:
         rows = self.client.get_values(self.spreadsheet_id, self.sheet_name, "A:B")
         if not rows or len(rows) < 2:
@@ -137,7 +169,7 @@ class CategoryRepo:
             return False
         self.client.batch_update_values(
             self.spreadsheet_id,
-            [(f"{self.sheet_name}!B{row_idx}", [[new_name.strip()]])],
+            [(self.a1_range(f"B{row_idx}"), [[new_name.strip()]])],
         )
         return True
 
@@ -147,7 +179,7 @@ class CategoryRepo:
             return False
         self.client.batch_update_values(
             self.spreadsheet_id,
-            [(f"{self.sheet_name}!E{row_idx}", [["FALSE"]])],
+            [(self.a1_range(f"E{row_idx}"), [["FALSE"]])],
         )
         return True
 
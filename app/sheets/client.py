@@ -1,22 +1,61 @@
-from typing import Any, List, Tuple
+import re
+import threading
+from typing import Any, List, Sequence, Tuple
 
 from googleapiclient.discovery import build
 from google.oauth2.credentials import Credentials
 
 
+# Значения без форматирования (числа — числами, без разделителей разрядов),
+# но даты/время — строкой, как в ячейке, а не серийным номером.
+VALUE_RENDER = "UNFORMATTED_VALUE"
+DATE_TIME_RENDER = "FORMATTED_STRING"
+
+_PLAIN_SHEET_NAME_RE = re.compile(r"^\w+$")
+
+
+def sheet_range(sheet_name: str, a1_range: str) -> str:
+    """
+    A1-диапазон с именем листа: "Журнал!A:N", "'Журнал 2026'!A:N" (имя с пробелом — в кавычках).
+    """
+    if _PLAIN_SHEET_NAME_RE.match(sheet_name):
+        return f"{sheet_name}!{a1_range}"
+    quoted = sheet_name.replace("'", "''")
+    return f"'{quoted}'!{a1_range}"
+
+
 class SheetsClient:
     """
     Мини-клиент для работы с Google Sheets.
 
     На MVP нам нужны операции:
     - append_row: добавить строку в конец листа
+    - append_rows: добавить несколько строк одним запросом
+    - update_values: записать строки в точно заданный диапазон (без поиска конца таблицы)
     - get_values: прочитать диапазон
     - get_column_values: прочитать один столбец
+    - batch_get_values: прочитать несколько диапазонов (в т.ч. с разных листов) одним запросом
     - batch_update_values: обновить несколько ячеек/диапазонов одним запросом
+    - list_sheets / get_sheet_properties / append_dimension: листы, размер сетки и добавление пустых строк
+    - ensure_sheet: создать лист с заголовком, если его нет
     """
 
     def __init__(self, creds: Credentials):
-        self._service = build("sheets", "v4", credentials=creds)
+        self._creds = creds
+        # googleapiclient ходит в сеть через httplib2, а он не потокобезопасен. Клиент вызывается
+        # и из обработчиков (поток event loop), и из asyncio.to_thread (реплеер, разбор pending,
+        # загрузка фильтра дублей) — поэтому у каждого потока свой объект сервиса.
+        self._local = threading.local()
+        # (spreadsheet_id, sheet_name) -> sheetId: не меняется, пока лист не пересоздали
+        self._sheet_ids: dict = {}
+
+    @property
+    def _service(self):
+        service = getattr(self._local, "service", None)
+        if service is None:
+            service = build("sheets", "v4", credentials=self._creds)
+            self._local.service = service
+        return service
 
     def append_row(
         self,
@@ -27,8 +66,21 @@ class SheetsClient:
         """
         Добавляет строку в конец листа.
         """
-        range_name = f"{sheet_name}!A:Z"
-        body = {"values": [row_values]}
+        return self.append_rows(spreadsheet_id, sheet_name, [row_values])
+
+    def append_rows(
+        self,
+        spreadsheet_id: str,
+        sheet_name: str,
+        rows: List[List[Any]],
+        value_input_option: str = "USER_ENTERED",
+    ) -> dict:
+        """
+        Добавляет несколько строк в конец листа одним запросом.
+        Конец таблицы Sheets ищет сам по A:Z — это тем дольше, чем больше лист.
+        """
+        range_name = sheet_range(sheet_name, "A:Z")
+        body = {"values": rows}
 
         result = (
             self._service.spreadsheets()
@@ -36,7 +88,7 @@ class SheetsClient:
             .append(
                 spreadsheetId=spreadsheet_id,
                 range=range_name,
-                valueInputOption="USER_ENTERED",
+                valueInputOption=value_input_option,
                 insertDataOption="INSERT_ROWS",
                 body=body,
             )
@@ -44,20 +96,84 @@ class SheetsClient:
         )
         return result
 
+    def update_values(
+        self,
+        spreadsheet_id: str,
+        range_name: str,
+        rows: List[List[Any]],
+        value_input_option: str = "RAW",
+    ) -> dict:
+        """
+        Записывает строки ровно в range_name (например "Журнал!A15:N17").
+        RAW: значения кладутся как есть — числа числами, строки строками, без разбора Sheets.
+        Ответ содержит updatedRange/updatedRows; строки за пределами сетки листа записать нельзя.
+        """
+        result = (
+            self._service.spreadsheets()
+            .values()
+            .update(
+                spreadsheetId=spreadsheet_id,
+                range=range_name,
+                valueInputOption=value_input_option,
+                body={"values": rows},
+            )
+            .execute()
+        )
+        return result
+
     def get_values(self, spreadsheet_id: str, sheet_name: str, a1_range: str) -> List[List[Any]]:
         """
         Читает значения из указанного диапазона.
         Пример: a1_range="A:L"
         """
-        range_name = f"{sheet_name}!{a1_range}"
+        range_name = sheet_range(sheet_name, a1_range)
         result = (
             self._service.spreadsheets()
             .values()
-            .get(spreadsheetId=spreadsheet_id, range=range_name)
+            .get(
+                spreadsheetId=spreadsheet_id,
+                range=range_name,
+                valueRenderOption=VALUE_RENDER,
+                dateTimeRenderOption=DATE_TIME_RENDER,
+                fields="values",
+            )
             .execute()
         )
         return result.get("values", [])
 
+    def batch_get_values(
+        self,
+        spreadsheet_id: str,
+        ranges: Sequence[str],
+        major_dimension: str = "ROWS",
+    ) -> List[List[List[Any]]]:
+        """
+        Читает несколько диапазонов одним запросом (values.batchGet).
+        ranges: полные A1-диапазоны с именем листа, например ["Журнал!G2:G", "Категории!A:E"].
+        major_dimension="COLUMNS" — каждый диапазон возвращается по столбцам.
+        Возвращает значения в том же порядке, что и ranges (пустой диапазон -> []).
+        """
+        if not ranges:
+            return []
+        result = (
+            self._service.spreadsheets()
+            .values()
+            .batchGet(
+                spreadsheetId=spreadsheet_id,
+                ranges=list(ranges),
+                majorDimension=major_dimension,
+                valueRenderOption=VALUE_RENDER,
+                dateTimeRenderOption=DATE_TIME_RENDER,
+                fields="valueRanges(values)",
+            )
+            .execute()
+        )
+        value_ranges = result.get("valueRanges", [])
+        return [
+            value_ranges[i].get("values", []) if i < len(value_ranges) else []
+            for i in range(len(ranges))
+        ]
+
     def get_column_values(self, spreadsheet_id: str, sheet_name: str, column_letter: str) -> List[Any]:
         """
         Читает значения одного столбца целиком.
@@ -68,16 +184,23 @@ class SheetsClient:
         # values это список строк, где каждая строка - список из 0 или 1 элемента
         return [row[0] if row else "" for row in values]
 
-    def batch_update_values(self, spreadsheet_id: str, updates: List[Tuple[str, List[List[Any]]]]) -> dict:
+    def batch_update_values(
+        self,
+        spreadsheet_id: str,
+        updates: List[Tuple[str, List[List[Any]]]],
+        value_input_option: str = "USER_ENTERED",
+    ) -> dict:
         """
         Пакетное обновление нескольких диапазонов.
 
         updates: список кортежей:
         - range_name: например "Журнал!C10"
         - values: например [[ "Продукты" ]]
+        value_input_option: USER_ENTERED разбирает строки как ввод в ячейку ("2026-02-09" станет датой),
+        RAW кладёт значения как есть. Журнал пишется только RAW (см. JOURNAL_VALUE_INPUT).
         """
         data = [{"range": r, "values": v} for r, v in updates]
-        body = {"valueInputOption": "USER_ENTERED", "data": data}
+        body = {"valueInputOption": value_input_option, "data": data}
 
         result = (
             self._service.spreadsheets()
@@ -86,3 +209,77 @@ class SheetsClient:
             .execute()
         )
         return result
+
+    def list_sheets(self, spreadsheet_id: str) -> List[dict]:
+        """
+        Листы таблицы: [{"title": "Журнал", "sheetId": 0, "rowCount": 1000}, ...].
+        """
+        result = (
+            self._service.spreadsheets()
+            .get(
+                spreadsheetId=spreadsheet_id,
+                fields="sheets(properties(sheetId,title,gridProperties(rowCount)))",
+            )
+            .execute()
+        )
+        sheets = []
+        for sheet in result.get("sheets", []):
+            props = sheet.get("properties", {})
+            self._sheet_ids[(spreadsheet_id, props.get("title"))] = props.get("sheetId")
+            sheets.append(
+                {
+                    "title": props.get("title"),
+                    "sheetId": props.get("sheetId"),
+                    "rowCount": int(props.get("gridProperties", {}).get("rowCount", 0)),
+                }
+            )
+        return sheets
+
+    def get_sheet_properties(self, spreadsheet_id: str, sheet_name: str) -> dict:
+        """
+        sheetId и размер сетки листа: {"title": ..., "sheetId": 0, "rowCount": 1000}.
+        """
+        for sheet in self.list_sheets(spreadsheet_id):
+            if sheet["title"] == sheet_name:
+                return sheet
+        raise ValueError(f"Лист '{sheet_name}' не найден в таблице")
+
+    def ensure_sheet(self, spreadsheet_id: str, sheet_name: str, header: List[Any]) -> dict:
+        """
+        Создаёт лист с заголовком header в первой строке, если его ещё нет.
+        Возвращает свойства листа (как get_sheet_properties).
+        """
+        for sheet in self.list_sheets(spreadsheet_id):
+            if sheet["title"] == sheet_name:
+                return sheet
+
+        body = {"requests": [{"addSheet": {"properties": {"title": sheet_name}}}]}
+        result = self._service.spreadsheets().batchUpdate(spreadsheetId=spreadsheet_id, body=body).execute()
+        props = result["replies"][0]["addSheet"]["properties"]
+        self._sheet_ids[(spreadsheet_id, sheet_name)] = props.get("sheetId")
+        self.update_values(spreadsheet_id, sheet_range(sheet_name, "A1"), [list(header)])
+        return {
+            "title": sheet_name,
+            "sheetId": props.get("sheetId"),
+            "rowCount": int(props.get("gridProperties", {}).get("rowCount", 0)),
+        }
+
+    def append_dimension(self, spreadsheet_id: str, sheet_name: str, rows: int) -> dict:
+        """
+        Добавляет rows пустых строк в конец сетки листа.
+        """
+        key = (spreadsheet_id, sheet_name)
+        if key not in self._sheet_ids:
+            self.get_sheet_properties(spreadsheet_id, sheet_name)
+        body = {
+            "requests": [
+                {
+                    "appendDimension": {
+                        "sheetId": self._sheet_ids[key],
+                        "dimension": "ROWS",
+                        "length": int(rows),
+                    }
+                }
+            ]
+        }
+        return self._service.spreadsheets().batchUpdate(spreadsheetId=spreadsheet_id, body=body).execute()
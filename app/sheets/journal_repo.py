@@ -1,196 +1,708 @@
 from __future__ import annotations
 
-from typing import Optional
+import re
+import threading
+from datetime import datetime
+from functools import lru_cache
+from typing import Iterable, Iterator, Optional, Sequence
 
-from app.models.operation import Operation
-from app.sheets.client import SheetsClient
+from app.event_log import log_event
+from app.models.operation import Operation, make_op_id
+from app.sheets.category_repo import Category, CategoryRepo
+from app.sheets.client import SheetsClient, sheet_range
+from app.sheets.sheet_layout import (
+    JOURNAL_COLUMNS,
+    JOURNAL_DECODER,
+    PARTITION_MONTH,
+    PARTITION_NONE,
+    PARTITION_YEAR,
+    STATUS_CANCELED,
+    STATUS_OK,
+    STATUS_PENDING,
+    JournalRow,
+    RowDecoder,
+    column_letter,
+    is_partition_sheet,
+    partition_sheet_name,
+)
+
+# "Журнал!A15:M17" / "'Журнал'!A15:M15" -> номера первой и последней строки
+_UPDATED_RANGE_RE = re.compile(r"![A-Z]+(\d+)(?::[A-Z]+(\d+))?$")
+
+OP_ID_COLUMN = column_letter("op_id")
+
+# Все записи в журнал — RAW: даты (created_at, op_date, month_key) хранятся текстом ISO
+# ("2026-02-09", "2026-02"), суммы и id — числами, needs_review — флажком. USER_ENTERED превратил бы
+# дату из /edit в настоящую дату, и в столбцах B/K оказались бы вперемешку текст и даты.
+JOURNAL_VALUE_INPUT = "RAW"
+
+# На сколько строк расширять сетку листа, когда следующая запись в неё не помещается
+GRID_GROWTH_ROWS = 500
+
+# Сколько строк читать за один запрос при постраничном обходе журнала
+PAGE_ROWS = 500
+
+# Проекции для горячих чтений: каждая читает только свои столбцы
+_EXAMPLES_COLUMNS = ("comment_raw", "tg_user_id", "status", "category_id")
+_PENDING_LOOKUP_COLUMNS = ("tg_user_id", "status")
+_LAST_ROWS_COLUMNS = ("op_date", "category", "amount", "tg_user_id", "status", "op_id")
+# A:I и op_id — всё, что нужно индексу pending
+_PENDING_ROWS_COLUMNS = tuple(JOURNAL_COLUMNS[: JOURNAL_COLUMNS.index("status") + 1]) + ("op_id",)
+# G, H и N — op_id строки (у записей до колонки N он выводится из G/H)
+_OP_ID_COLUMNS = ("tg_user_id", "tg_message_id", "op_id")
+# G:N — кому принадлежит строка и в каком она статусе (проверка перед записью по номеру строки)
+_IDENTITY_COLUMNS = tuple(JOURNAL_COLUMNS[JOURNAL_COLUMNS.index("tg_user_id"):])
+
+
+@lru_cache(maxsize=None)
+def _decoder_for(columns: tuple[str, ...]) -> RowDecoder:
+    return RowDecoder(columns)
 
 
 class JournalRepo:
     """
     Репозиторий для работы с листом "Журнал".
+
+    При partition="year"/"month" журнал разбит на листы "Журнал 2026" / "Журнал 2026-02"
+    (по created_at записываемых строк). Запись и все горячие чтения идут в активную — последнюю —
+    партицию (sheet_name); при переходе к новому периоду лист создаётся сам, а partition_epoch
+    растёт — номера строк, запомненные без листа, после этого недействительны.
+    Чтение всей истории (list_labelled_examples) обходит все партиции.
+    Pending-строки ищутся ещё и в предыдущей партиции: запись, сделанная в конце периода, остаётся
+    открытой и после перехода, поэтому методы pending принимают sheet_name (по умолчанию активная).
     - append_operation: добавляет строку
-    - is_duplicate: проверяет, записывали ли уже tg_message_id
-    - find_last_pending_row: находит последнюю pending строку по tg_user_id
+    - append_operations: добавляет пачку строк одним запросом (в известный следующий диапазон)
+    - is_duplicate / find_existing_op_ids: записывали ли уже операцию (по op_id; активная и предыдущая партиции)
+    - list_op_ids: op_id начиная с заданной строки (для фильтра дублей)
+    - find_op_row: номер строки операции по op_id (индекс в памяти + проверка одной ячейки)
+    - iter_rows / iter_rows_reverse: постраничный обход строк (от старых к новым / от новых к старым)
+    - list_labelled_examples: примеры comment_raw -> category_id для локального классификатора
+    - find_last_pending_row: находит последнюю pending строку по tg_user_id (лист и номер строки)
+    - pending_partitions: листы, где ищутся pending строки (активная партиция и предыдущая)
+    - list_pending_rows: все pending строки этих листов (для первичного заполнения индекса pending)
     - update_pending_category: проставляет категорию у найденной pending строки
+    - pending_rows_matching: какие строки всё ещё pending и принадлежат своим операциям
+    - resolve_pending_rows: проставляет категории сразу нескольким pending строкам (после проверки)
+    - resolve_pending_op: проставляет категорию pending-операции по op_id (номер строки — только подсказка)
     - get_pending_summary: достает данные строки для подтверждения пользователю
     """
 
-    def __init__(self, client: SheetsClient, spreadsheet_id: str, sheet_name: str):
+    def __init__(
+        self,
+        client: SheetsClient,
+        spreadsheet_id: str,
+        sheet_name: str,
+        partition: str = PARTITION_NONE,
+        verify_next_rows: bool = False,
+    ):
         self.client = client
         self.spreadsheet_id = spreadsheet_id
-        self.sheet_name = sheet_name
+        self.base_sheet_name = sheet_name
+        self.partition = partition if partition in (PARTITION_YEAR, PARTITION_MONTH) else PARTITION_NONE
+        # Активная партиция; None — ещё не выбрана (выберется при первом обращении)
+        self._active_sheet: Optional[str] = sheet_name if self.partition == PARTITION_NONE else None
+        self.partition_epoch = 0
+        # Перед записью по счётчику читать строки вокруг диапазона (лишний запрос на каждую запись;
+        # нужен, если в журнал добавляют строки руками)
+        self.verify_next_rows = verify_next_rows
+        # op_id -> номер строки; номера проверяются перед использованием (лист могли отсортировать)
+        self._op_rows: dict[str, int] = {}
+        # Номер следующей свободной строки (None — неизвестен, узнаем через обычный append)
+        self._next_row: Optional[int] = None
+        self._grid_rows: Optional[int] = None
+        # Репозиторий вызывают из обработчиков и из потоков asyncio.to_thread одновременно:
+        # активная партиция, счётчики строк и кэш op_id меняются только под этим замком.
+        # RLock — запись держит его целиком, а внутри может переключить партицию.
+        self._lock = threading.RLock()
+
+    @property
+    def sheet_name(self) -> str:
+        """
+        Лист, в который пишем и из которого читаем горячие данные.
+        """
+        if self._active_sheet is None:
+            with self._lock:
+                if self._active_sheet is None:
+                    partitions = self.list_partitions()
+                    if partitions:
+                        self._active_sheet = partitions[-1]
+                    else:
+                        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                        self._switch_partition(partition_sheet_name(self.base_sheet_name, self.partition, now))
+        return self._active_sheet
+
+    def a1_range(self, a1: str, sheet_name: Optional[str] = None) -> str:
+        return sheet_range(sheet_name or self.sheet_name, a1)
+
+    def list_partitions(self) -> list[str]:
+        """
+        Листы журнала от старых к новым (без разбиения — один базовый лист).
+        """
+        if self.partition == PARTITION_NONE:
+            return [self.base_sheet_name]
+        titles = [sheet["title"] for sheet in self.client.list_sheets(self.spreadsheet_id)]
+        return sorted(t for t in titles if is_partition_sheet(self.base_sheet_name, self.partition, t))
+
+    def _switch_partition(self, sheet_name: str) -> None:
+        """
+        Делает sheet_name активной партицией (создаёт лист с заголовком при необходимости)
+        и сбрасывает всё, что привязано к номерам строк прежнего листа.
+        """
+        self.client.ensure_sheet(self.spreadsheet_id, sheet_name, JOURNAL_COLUMNS)
+        with self._lock:
+            previous = self._active_sheet
+            self._op_rows = {}
+            self._next_row = None
+            self._grid_rows = None
+            self._active_sheet = sheet_name
+            if previous is not None:
+                self.partition_epoch += 1
+                log_event(f"Журнал: новая партиция '{sheet_name}' (предыдущая '{previous}').")
+
+    def _route(self, ops: list[Operation]) -> None:
+        """
+        Переключает запись на партицию периода самой новой операции пачки.
+        Партиции только растут: запоздавшие операции прошлого периода пишутся в текущую.
+        """
+        if self.partition == PARTITION_NONE or not ops:
+            return
+        newest = max(str(op.created_at) for op in ops)
+        target = partition_sheet_name(self.base_sheet_name, self.partition, newest)
+        if target > self.sheet_name:
+            self._switch_partition(target)
+
+    @staticmethod
+    def _operation_to_row(op: Operation) -> list:
+        return [
+            op.created_at,      # A
+            op.op_date,         # B
+            op.category,        # C
+            op.amount,          # D
+            op.comment_raw,     # E
+            op.source,          # F
+            op.tg_user_id,      # G
+            op.tg_message_id,   # H
+            op.status,          # I
+            op.needs_review == "TRUE",  # J: RAW не превращает строку "TRUE" во флажок
+            op.month_key,       # K
+            op.error or "",     # L
+            op.category_id,     # M
+            op.op_id,           # N
+        ]
 
     def append_operation(self, op: Operation) -> dict:
         """
         Добавляет операцию в конец таблицы.
         """
-        row = [
-        op.created_at,      # A
-        op.op_date,         # B
-        op.category,        # C
-        op.amount,          # D
-        op.comment_raw,     # E
-        op.source,          # F
-        op.tg_user_id,      # G
-        op.tg_message_id,   # H
-        op.status,          # I
-        op.needs_review,    # J
-        op.month_key,       # K
-        op.error or "",     # L
-        op.category_id,     # M
+        return self.append_operations([op])
+
+    def append_operations(self, ops: list[Operation]) -> dict:
+        """
+        Добавляет несколько операций одним запросом (используется outbox-реплеером).
+        Пишет RAW прямо в следующие строки по счётчику, без поиска конца таблицы на A:Z;
+        обычный append — только пока счётчик неизвестен (в том числе после ответа с чужим диапазоном)
+        или, с verify_next_rows, целевые строки оказались заняты.
+        Ответ в форме append ({"updates": {"updatedRange": ...}}) в обоих случаях.
+        """
+        rows = [self._operation_to_row(op) for op in ops]
+        with self._lock:
+            self._route(ops)
+            result = self._write_next_rows(rows) if self._next_row is not None else None
+            if result is None:
+                result = self.client.append_rows(
+                    self.spreadsheet_id, self.sheet_name, rows, value_input_option=JOURNAL_VALUE_INPUT
+                )
+                row_range = self.appended_row_range(result)
+                self._next_row = row_range[1] + 1 if row_range else None
+        self._remember_appended(ops, result)
+        return result
+
+    def _write_next_rows(self, rows: list[list]) -> Optional[dict]:
+        """
+        Пишет rows в строки _next_row.. по счётчику и сдвигает счётчик. None — нужен обычный append.
+        С verify_next_rows перед записью одним чтением проверяется, что строка перед диапазоном занята,
+        а сам диапазон пуст (иначе строки добавили или удалили мимо бота); без него счётчику доверяем.
+        """
+        first = self._next_row
+        last = first + len(rows) - 1
+
+        if self._grid_rows is None:
+            self._grid_rows = self.client.get_sheet_properties(self.spreadsheet_id, self.sheet_name)["rowCount"]
+        if last > self._grid_rows:
+            grow = max(GRID_GROWTH_ROWS, last - self._grid_rows)
+            self.client.append_dimension(self.spreadsheet_id, self.sheet_name, grow)
+            self._grid_rows += grow
+
+        if self.verify_next_rows:
+            around = self.client.get_values(
+                self.spreadsheet_id, self.sheet_name, f"A{first - 1}:{OP_ID_COLUMN}{last}"
+            )
+            previous_filled = bool(around) and any(v != "" for v in around[0])
+            target_empty = all(not any(v != "" for v in row) for row in around[1:])
+            if not previous_filled or not target_empty:
+                log_event(
+                    f"Журнал: строки {first}-{last} не совпали с ожидаемым концом таблицы, "
+                    f"добавляем через append."
+                )
+                self._next_row = None
+                return None
+
+        updated = self.client.update_values(
+            self.spreadsheet_id,
+            self.a1_range(f"A{first}:{OP_ID_COLUMN}{last}"),
+            rows,
+            value_input_option=JOURNAL_VALUE_INPUT,
+        )
+        result = {"updates": updated}
+        if self.appended_row_range(result) == (first, last):
+            self._next_row = last + 1
+            return result
+
+        log_event(
+            f"Журнал: запись в A{first}:{OP_ID_COLUMN}{last} вернула {updated.get('updatedRange')!r}, "
+            f"счётчик строк сброшен, строки ищем по op_id."
+        )
+        self._next_row = None
+        return self._locate_written_rows([row[-1] for row in rows], updated)
+
+    def _locate_written_rows(self, op_ids: list[str], updated: dict) -> dict:
+        """
+        Находит строки только что записанных op_ids одним чтением столбца op_id и обновляет кэш _op_rows.
+        Возвращает ответ в форме append с настоящим диапазоном; если строки не нашлись подряд —
+        без updatedRange, чтобы индекс pending и фильтр дублей не запомнили чужие номера строк.
+        """
+        values = self.client.get_column_values(self.spreadsheet_id, self.sheet_name, OP_ID_COLUMN)
+        self._op_rows = {str(v): i for i, v in enumerate(values, start=1) if i > 1 and v != ""}
+        found = [self._op_rows.get(str(op_id)) for op_id in op_ids]
+        if None in found or found != list(range(found[0], found[0] + len(found))):
+            log_event(f"Журнал: записанные строки не нашлись подряд по op_id: {found}.")
+            return {"updates": {key: value for key, value in updated.items() if key != "updatedRange"}}
+        updated_range = self.a1_range(f"A{found[0]}:{OP_ID_COLUMN}{found[-1]}")
+        return {"updates": {**updated, "updatedRange": updated_range}}
+
+    def _remember_appended(self, ops: list[Operation], result: dict) -> None:
+        row_range = self.appended_row_range(result)
+        if row_range is None or row_range[1] - row_range[0] + 1 != len(ops):
+            return
+        self._remember_op_rows((op.op_id, row_range[0] + offset) for offset, op in enumerate(ops))
+
+    def _remember_op_rows(self, pairs: Iterable[tuple[str, int]]) -> None:
+        with self._lock:
+            for op_id, row_index in pairs:
+                if op_id:
+                    self._op_rows[str(op_id)] = int(row_index)
+
+    def find_op_row(self, op_id: str, sheet_name: Optional[str] = None) -> Optional[int]:
+        """
+        Текущий номер строки операции. Известный номер проверяется чтением одной ячейки op_id;
+        если строка уехала (сортировка, удаление строк руками) — перечитывается только столбец op_id.
+        sheet_name — прежняя партиция: номера её строк не запоминаются, столбец op_id читается сразу.
+        """
+        op_id = str(op_id or "")
+        if not op_id:
+            return None
+        if sheet_name is not None and sheet_name != self.sheet_name:
+            values = self.client.get_column_values(self.spreadsheet_id, sheet_name, OP_ID_COLUMN)
+            return next((i for i, v in enumerate(values, start=1) if i > 1 and str(v) == op_id), None)
+        with self._lock:
+            row_index = self._op_rows.get(op_id)
+
+        if row_index is not None:
+            cell = self.client.get_values(
+                self.spreadsheet_id,
+                self.sheet_name,
+                f"{OP_ID_COLUMN}{row_index}:{OP_ID_COLUMN}{row_index}",
+            )
+            if cell and cell[0] and str(cell[0][0]) == op_id:
+                return row_index
+
+        values = self.client.get_column_values(self.spreadsheet_id, self.sheet_name, OP_ID_COLUMN)
+        fresh = {str(v): i for i, v in enumerate(values, start=1) if i > 1 and v != ""}
+        with self._lock:
+            self._op_rows = fresh
+        return fresh.get(op_id)
+
+    @staticmethod
+    def appended_row_range(result: dict) -> Optional[tuple[int, int]]:
+        """
+        Номера первой и последней строки, добавленных append_operations (по updates.updatedRange).
+        """
+        updated_range = (result or {}).get("updates", {}).get("updatedRange", "")
+        m = _UPDATED_RANGE_RE.search(updated_range)
+        if not m:
+            return None
+        first = int(m.group(1))
+        last = int(m.group(2)) if m.group(2) else first
+        return first, last
+
+    @staticmethod
+    def appended_sheet_name(result: dict) -> Optional[str]:
+        """
+        Лист, в который попали строки append_operations (по updates.updatedRange).
+        """
+        updated_range = (result or {}).get("updates", {}).get("updatedRange", "")
+        if "!" not in updated_range:
+            return None
+        sheet_name = updated_range.rsplit("!", 1)[0]
+        if sheet_name.startswith("'") and sheet_name.endswith("'"):
+            sheet_name = sheet_name[1:-1].replace("''", "'")
+        return sheet_name
+
+    def is_duplicate(self, op_id: str) -> bool:
+        """
+        Проверяет, есть ли уже операция op_id в журнале (активная и предыдущая партиции).
+        """
+        return bool(self.find_existing_op_ids({str(op_id)}))
+
+    def find_existing_op_ids(self, op_ids: set[str]) -> set[str]:
+        """
+        Возвращает подмножество op_ids, которые уже есть в журнале.
+        Один batchGet (столбцы G, H и N) на лист; у старых строк без колонки N op_id выводится из G/H.
+        Сначала читается активная партиция, предыдущая — только ради ненайденных: outbox, повторяющий
+        пачку после перехода на новый лист, не должен дописать второй раз строки, уже лежащие в прежнем.
+        """
+        if not op_ids:
+            return set()
+        existing: set[str] = set()
+        for sheet_name in reversed(self.pending_partitions()):
+            found, _ = self.list_op_ids(sheet_name=sheet_name)
+            existing.update(op_id for op_id in found if op_id in op_ids)
+            if existing == op_ids:
+                break
+        return existing
+
+    def list_op_ids(self, start_row: int = 2, sheet_name: Optional[str] = None) -> tuple[list[str], int]:
+        """
+        op_id строк начиная со start_row (столбцы G, H и N; для фильтра дублей).
+        sheet_name — партиция (по умолчанию активная).
+        Возвращает (op_ids, номер последней прочитанной строки); строки без op_id пропускаются.
+        """
+        start_row = max(2, int(start_row))
+        rows = self._read_rows(_decoder_for(_OP_ID_COLUMNS), start_row, sheet_name)
+        op_ids = [op_id for op_id in map(self.row_op_id, rows) if op_id]
+        return op_ids, start_row + len(rows) - 1
+
+    def _read_rows(
+        self,
+        decoder: RowDecoder,
+        start_row: int = 2,
+        sheet_name: Optional[str] = None,
+        end_row: Optional[int] = None,
+    ) -> list[JournalRow]:
+        """
+        Читает только столбцы проекции decoder одним batchGet (по столбцам) и разбирает строки
+        start_row..end_row (без end_row — до конца листа). sheet_name — партиция (по умолчанию активная).
+        """
+        end = end_row if end_row is not None else ""
+        sheet_name = sheet_name or self.sheet_name
+        ranges = [self.a1_range(f"{c}{start_row}:{c}{end}", sheet_name) for c in decoder.letters]
+        columns = [
+            values[0] if values else []
+            for values in self.client.batch_get_values(self.spreadsheet_id, ranges, major_dimension="COLUMNS")
+        ]
+        height = max((len(col) for col in columns), default=0)
+        return [
+            decoder.decode(start_row + i, [col[i] if i < len(col) else "" for col in columns], sheet_name)
+            for i in range(height)
         ]
-        return self.client.append_row(self.spreadsheet_id, self.sheet_name, row)
 
-    def is_duplicate(self, tg_message_id: int) -> bool:
+    def iter_rows(
+        self,
+        start_row: int = 2,
+        page_size: int = PAGE_ROWS,
+        columns: Optional[Sequence[str]] = None,
+        sheet_name: Optional[str] = None,
+    ) -> Iterator[JournalRow]:
         """
-        Проверяет, есть ли уже такая tg_message_id в листе.
-        (MVP-реализация: читаем весь столбец tg_message_id и ищем совпадение)
+        Строки журнала от start_row вниз, страницами по page_size строк (один batchGet на страницу).
+        columns — имена столбцов из JOURNAL_COLUMNS (по умолчанию все); в памяти держится одна страница.
+        Обход заканчивается на первой полностью пустой странице.
         """
-        # H = tg_message_id
-        values = self.client.get_column_values(self.spreadsheet_id, self.sheet_name, "H")
+        decoder = _decoder_for(tuple(columns or JOURNAL_COLUMNS))
+        first = max(2, int(start_row))
+        while True:
+            page = self._read_rows(decoder, first, sheet_name, end_row=first + page_size - 1)
+            if not page:
+                return
+            yield from page
+            first += page_size
 
-        for v in values[1:]:  # пропускаем заголовок
-            try:
-                if int(v) == int(tg_message_id):
-                    return True
-            except Exception:
-                continue
-        return False
+    def iter_rows_reverse(
+        self,
+        page_size: int = PAGE_ROWS,
+        columns: Optional[Sequence[str]] = None,
+        sheet_name: Optional[str] = None,
+    ) -> Iterator[JournalRow]:
+        """
+        Строки журнала от новых к старым, страницами по page_size строк.
+        Если остановиться после нужных строк, читаются только последние страницы листа.
+        """
+        decoder = _decoder_for(tuple(columns or JOURNAL_COLUMNS))
+        last = self._last_row_hint(sheet_name)
+        while last >= 2:
+            first = max(2, last - page_size + 1)
+            yield from reversed(self._read_rows(decoder, first, sheet_name, end_row=last))
+            last = first - 1
 
-    def find_last_pending_row(self, tg_user_id: int) -> Optional[int]:
+    def _last_row_hint(self, sheet_name: Optional[str] = None) -> int:
+        """
+        Номер строки, с которой начинать обход с конца: по счётчику записи, если он известен,
+        иначе — размер сетки листа (хвост из пустых строк читается быстро).
         """
-        Ищет последнюю строку (номер строки в Google Sheets), где:
+        if sheet_name is None or sheet_name == self.sheet_name:
+            with self._lock:
+                if self._next_row is not None:
+                    return self._next_row - 1
+                if self._grid_rows is None:
+                    properties = self.client.get_sheet_properties(self.spreadsheet_id, self.sheet_name)
+                    self._grid_rows = properties["rowCount"]
+                return self._grid_rows
+        return self.client.get_sheet_properties(self.spreadsheet_id, sheet_name)["rowCount"]
+
+    def list_labelled_examples(self) -> list[tuple[int, str, str]]:
+        """
+        Примеры для локального классификатора категорий:
+        [(tg_user_id, comment_raw, category_id), ...] по строкам со status == "ok" и заполненным category_id.
+        Обходит все партиции журнала, от старых к новым, постранично.
+        """
+        return [
+            (row.tg_user_id, row.comment_raw, row.category_id)
+            for sheet_name in self.list_partitions()
+            for row in self.iter_rows(columns=_EXAMPLES_COLUMNS, sheet_name=sheet_name)
+            if row.status == STATUS_OK and row.tg_user_id and row.comment_raw and row.category_id
+        ]
+
+    def find_last_pending_row(self, tg_user_id: int) -> Optional[tuple[str, int]]:
+        """
+        Ищет последнюю строку, где:
         - tg_user_id (колонка G) совпадает
         - status (колонка I) == "pending"
-        Возвращает номер строки (например 15) или None.
+        Возвращает (лист, номер строки), например ("Журнал", 15), или None.
+        Идёт с конца активной партиции и останавливается на первой подходящей строке;
+        предыдущая партиция читается, только если в активной ничего не нашлось.
         """
-        rows = self.client.get_values(self.spreadsheet_id, self.sheet_name, "A:M")
-        last_row_index: Optional[int] = None
-
-        for i, row in enumerate(rows[1:], start=2):  # начинаем со строки 2
-            try:
-                row_user = int(row[6]) if len(row) > 6 and row[6] != "" else None  # G
-                row_status = row[8] if len(row) > 8 else ""  # I
-            except Exception:
-                continue
+        user = int(tg_user_id)
+        for sheet_name in reversed(self.pending_partitions()):
+            for row in self.iter_rows_reverse(columns=_PENDING_LOOKUP_COLUMNS, sheet_name=sheet_name):
+                if row.tg_user_id == user and row.status == STATUS_PENDING:
+                    return sheet_name, row.row_index
+        return None
 
-            if row_user == int(tg_user_id) and row_status == "pending":
-                last_row_index = i
+    def pending_partitions(self) -> list[str]:
+        """
+        Листы, где могут лежать открытые pending-строки: предыдущая партиция и активная.
+        Запись, сделанная в конце периода, остаётся pending и после перехода на новый лист;
+        более старые партиции не читаются, чтобы загрузка индекса не росла с историей.
+        Те же листы проверяются на дубли (find_existing_op_ids): повтор из outbox бывает только недавним.
+        """
+        active = self.sheet_name
+        if self.partition == PARTITION_NONE:
+            return [active]
+        older = [sheet_name for sheet_name in self.list_partitions() if sheet_name < active]
+        return older[-1:] + [active]
 
-        return last_row_index
+    def list_pending_rows(self) -> list[JournalRow]:
+        """
+        Все строки со status == "pending" (столбцы A:I и op_id) из pending_partitions, постранично.
+        У каждой строки заполнен sheet_name.
+        """
+        return [
+            row
+            for sheet_name in self.pending_partitions()
+            for row in self.iter_rows(columns=_PENDING_ROWS_COLUMNS, sheet_name=sheet_name)
+            if row.status == STATUS_PENDING
+        ]
 
     def update_pending_category(self, row_index: int, category: str, category_id: str) -> dict:
         """
         Обновляет category (C), category_id (M), status (I), needs_review (J).
         """
         updates = [
-            (f"{self.sheet_name}!C{row_index}", [[category]]),
-            (f"{self.sheet_name}!M{row_index}", [[category_id]]),
-            (f"{self.sheet_name}!I{row_index}", [["ok"]]),
-            (f"{self.sheet_name}!J{row_index}", [["FALSE"]]),
+            (self.a1_range(f"C{row_index}"), [[category]]),
+            (self.a1_range(f"M{row_index}"), [[category_id]]),
+            (self.a1_range(f"I{row_index}"), [["ok"]]),
+            (self.a1_range(f"J{row_index}"), [[False]]),
         ]
-        return self.client.batch_update_values(self.spreadsheet_id, updates)
+        return self.client.batch_update_values(self.spreadsheet_id, updates, value_input_option=JOURNAL_VALUE_INPUT)
 
-    def get_row(self, row_index: int) -> list[str]:
+    @staticmethod
+    def row_op_id(row: JournalRow) -> str:
         """
-        Возвращает значения строки A:M как список (может быть короче 12, если справа пусто).
+        op_id строки; у записей, сделанных до колонки N, он выводится из G/H так же, как при записи.
         """
+        if row.op_id:
+            return row.op_id
+        if row.tg_user_id and row.tg_message_id:
+            return make_op_id(row.tg_user_id, row.tg_message_id)
+        return ""
+
+    def pending_rows_matching(
+        self, expected: Sequence[tuple[int, str]], sheet_name: Optional[str] = None
+    ) -> set[int]:
+        """
+        Номера строк из [(row_index, op_id), ...], где по-прежнему лежит та же операция в статусе pending.
+        Все строки проверяются одним batchGet по G:N: лист могли отсортировать, строки — удалить,
+        а запись — разобрать или отменить, пока номер строки лежал в памяти.
+        sheet_name — партиция строк (по умолчанию активная).
+        """
+        if not expected:
+            return set()
+        decoder = _decoder_for(_IDENTITY_COLUMNS)
+        first, last = decoder.letters[0], decoder.letters[-1]
+        values = self.client.batch_get_values(
+            self.spreadsheet_id, [self.a1_range(f"{first}{r}:{last}{r}", sheet_name) for r, _ in expected]
+        )
+        matching: set[int] = set()
+        for (row_index, op_id), rows in zip(expected, values):
+            if not rows or not rows[0]:
+                continue
+            row = decoder.decode(row_index, rows[0])
+            if row.status == STATUS_PENDING and op_id and self.row_op_id(row) == op_id:
+                matching.add(row_index)
+        return matching
+
+    def resolve_pending_rows(
+        self, resolved: list[tuple[int, str, str, str]], sheet_name: Optional[str] = None
+    ) -> list[int]:
+        """
+        Проставляет категории нескольким pending строкам листа sheet_name (по умолчанию активного):
+        одна проверка (pending_rows_matching) и одна запись на всю пачку.
+        resolved: [(row_index, op_id, category, category_id), ...]
+        Строки, где операции уже нет или она не pending, пропускаются. Возвращает номера записанных строк.
+        """
+        matching = self.pending_rows_matching(
+            [(row_index, op_id) for row_index, op_id, _, _ in resolved], sheet_name
+        )
+        written: list[int] = []
+        updates = []
+        for row_index, _, category, category_id in resolved:
+            if row_index not in matching:
+                continue
+            written.append(row_index)
+            updates.extend(
+                [
+                    (self.a1_range(f"C{row_index}", sheet_name), [[category]]),
+                    (self.a1_range(f"I{row_index}:J{row_index}", sheet_name), [["ok", False]]),
+                    (self.a1_range(f"M{row_index}", sheet_name), [[category_id]]),
+                ]
+            )
+        if updates:
+            self.client.batch_update_values(self.spreadsheet_id, updates, value_input_option=JOURNAL_VALUE_INPUT)
+        return written
+
+    def resolve_pending_op(
+        self,
+        op_id: str,
+        category: str,
+        category_id: str,
+        row_hint: Optional[int] = None,
+        sheet_name: Optional[str] = None,
+    ) -> Optional[int]:
+        """
+        Проставляет категорию pending-операции op_id на листе sheet_name (по умолчанию активном).
+        row_hint (номер из индекса pending) проверяется той же пачкой, что и запись; если строка уехала —
+        номер ищется через find_op_row. Возвращает записанную строку или None (операции нет или она не pending).
+        """
+        if row_hint is not None and self.resolve_pending_rows([(row_hint, op_id, category, category_id)], sheet_name):
+            return row_hint
+        row_index = self.find_op_row(op_id, sheet_name)
+        if row_index is None or row_index == row_hint:
+            return None
+        if self.resolve_pending_rows([(row_index, op_id, category, category_id)], sheet_name):
+            return row_index
+        return None
+
+    def get_row(self, row_index: int, sheet_name: Optional[str] = None) -> Optional[JournalRow]:
+        """
+        Разобранная строка A:N или None, если строка пустая. sheet_name — партиция (по умолчанию активная).
+        """
+        sheet_name = sheet_name or self.sheet_name
         rows = self.client.get_values(
             self.spreadsheet_id,
-            self.sheet_name,
-            f"A{row_index}:M{row_index}",
+            sheet_name,
+            f"A{row_index}:{OP_ID_COLUMN}{row_index}",
         )
-        if not rows:
-            return []
-        return [str(x) for x in rows[0]]
+        if not rows or not rows[0]:
+            return None
+        return JOURNAL_DECODER.decode(row_index, rows[0], sheet_name)
 
-    def get_pending_summary(self, row_index: int) -> dict:
+    def get_pending_summary(self, row_index: int, sheet_name: Optional[str] = None) -> dict:
         """
         Достает из строки данные для подтверждения пользователю.
         """
-        row = self.get_row(row_index)
-
-        op_date = row[1] if len(row) > 1 else ""
-        amount = row[3] if len(row) > 3 else ""
-        comment_raw = row[4] if len(row) > 4 else ""
+        row = self.get_row(row_index, sheet_name)
+        if row is None:
+            return {"op_date": "", "amount": "", "comment_raw": ""}
+        return {"op_date": row.op_date, "amount": row.amount, "comment_raw": row.comment_raw}
 
-        return {"op_date": op_date, "amount": amount, "comment_raw": comment_raw}
-    
-    def list_last_rows_for_user(self, tg_user_id: int, limit: int = 10) -> list[tuple[int, str]]:
+    def list_last_rows_for_user(self, tg_user_id: int, limit: int = 10) -> list[tuple[int, str, str]]:
         """
         Возвращает список последних записей пользователя:
-        [(row_index, "09.02.2026 · Продукты · 3000"), ...]
-        Берем только status == "ok" (canceled игнорим).
-        """
-        rows = self.client.get_values(self.spreadsheet_id, self.sheet_name, "A:M")
-        if not rows or len(rows) < 2:
-            return []
-
-        result: list[tuple[int, str]] = []
-
-        # Идем с конца вверх, чтобы быстро собрать последние limit
-        for i in range(len(rows) - 1, 0, -1):  # пропускаем заголовок (0)
-            row_index = i + 1  # т.к. rows[1] это строка 2
-            row = rows[i]
-
-            # индексы по контракту:
-            # B op_date = 1, C category = 2, D amount = 3, G tg_user_id = 6, I status = 8
-            try:
-                row_user = int(row[6]) if len(row) > 6 and row[6] != "" else None
-                status = row[8] if len(row) > 8 else ""
-            except Exception:
-                continue
+        [(row_index, "09.02.2026 · Продукты · 3000", op_id), ...]
+        Берем только status == "ok" (canceled игнорим). op_id пустой у строк, записанных до колонки N.
+        Читаются только столбцы B, C, D, G, I, N и только последние страницы листа.
+        """
+        user = int(tg_user_id)
+        result: list[tuple[int, str, str]] = []
 
-            if row_user != int(tg_user_id):
-                continue
-            if status == "canceled":
+        # Идем с конца вверх и останавливаемся, как только собрали limit
+        for row in self.iter_rows_reverse(columns=_LAST_ROWS_COLUMNS):
+            if row.tg_user_id != user or row.status == STATUS_CANCELED:
                 continue
-
-            op_date = row[1] if len(row) > 1 else ""
-            category = row[2] if len(row) > 2 else ""
-            amount = row[3] if len(row) > 3 else ""
-
-            label = f"{op_date} · {category} · {amount}"
-            result.append((row_index, label))
-
+            result.append((row.row_index, f"{row.op_date} · {row.category} · {row.amount}", row.op_id))
             if len(result) >= limit:
                 break
 
+        self._remember_op_rows((op_id, row_index) for row_index, _, op_id in result)
         return result
 
+    def get_row_and_categories(
+        self, row_index: int, category_repo: CategoryRepo
+    ) -> tuple[Optional[JournalRow], list[Category]]:
+        """
+        Строка журнала (A:N) и активные категории одним batchGet (листы в одной таблице).
+        """
+        if category_repo.spreadsheet_id != self.spreadsheet_id:
+            return self.get_row(row_index), category_repo.list_active()
+        row_values, category_rows = self.client.batch_get_values(
+            self.spreadsheet_id,
+            [self.a1_range(f"A{row_index}:{OP_ID_COLUMN}{row_index}"), category_repo.a1_range("A:E")],
+        )
+        row = JOURNAL_DECODER.decode(row_index, row_values[0]) if row_values and row_values[0] else None
+        return row, category_repo.parse_active(category_rows)
+
     def update_amount(self, row_index: int, amount: int) -> dict:
         """
         Обновляет amount (колонка D).
         """
         updates = [
-            (f"{self.sheet_name}!D{row_index}", [[str(amount)]]),
+            (self.a1_range(f"D{row_index}"), [[int(amount)]]),
         ]
-        return self.client.batch_update_values(self.spreadsheet_id, updates)
+        return self.client.batch_update_values(self.spreadsheet_id, updates, value_input_option=JOURNAL_VALUE_INPUT)
     
     def update_date_and_month_key(self, row_index: int, op_date: str, month_key: str) -> dict:
-        # B = op_date, K = month_key
+        # B = op_date, K = month_key; RAW — текстом ISO, как и при добавлении строки
         updates = [
-            (f"{self.sheet_name}!B{row_index}", [[op_date]]),
-            (f"{self.sheet_name}!K{row_index}", [[month_key]]),
+            (self.a1_range(f"B{row_index}"), [[op_date]]),
+            (self.a1_range(f"K{row_index}"), [[month_key]]),
         ]
-        return self.client.batch_update_values(self.spreadsheet_id, updates)
+        return self.client.batch_update_values(self.spreadsheet_id, updates, value_input_option=JOURNAL_VALUE_INPUT)
 
     def cancel_row(self, row_index: int) -> dict:
         # I = status, L = error
         updates = [
-            (f"{self.sheet_name}!I{row_index}", [["canceled"]]),
-            (f"{self.sheet_name}!L{row_index}", [["user_canceled"]]),
+            (self.a1_range(f"I{row_index}"), [["canceled"]]),
+            (self.a1_range(f"L{row_index}"), [["user_canceled"]]),
         ]
-        return self.client.batch_update_values(self.spreadsheet_id, updates)
+        return self.client.batch_update_values(self.spreadsheet_id, updates, value_input_option=JOURNAL_VALUE_INPUT)
 
     def update_category(self, row_index: int, category: str, category_id: str) -> dict:
         """
         Обновляет category (C) и category_id (M) у конкретной строки.
         """
         updates = [
-            (f"{self.sheet_name}!C{row_index}", [[category]]),
-            (f"{self.sheet_name}!M{row_index}", [[category_id]]),
+            (self.a1_range(f"C{row_index}"), [[category]]),
+            (self.a1_range(f"M{row_index}"), [[category_id]]),
         ]
-        return self.client.batch_update_values(self.spreadsheet_id, updates)
+        return self.client.batch_update_values(self.spreadsheet_id, updates, value_input_option=JOURNAL_VALUE_INPUT)
 
@@ -4,8 +4,15 @@
 Важно:
 - Мы НЕ завязываемся на номера колонок в коде, но фиксируем порядок.
 - Порядок колонок должен совпадать с заголовками в Google Sheets.
+- Строки листа разбираются только через RowDecoder -> JournalRow (без row[6], row[8] в репозиториях).
+- Журнал может быть разбит на листы-партиции по периоду записи: "Журнал 2026", "Журнал 2026-02".
 """
 
+from __future__ import annotations
+
+import re
+from typing import Any, Sequence
+
 JOURNAL_COLUMNS = [
     "created_at",
     "op_date",
@@ -19,4 +26,155 @@ JOURNAL_COLUMNS = [
     "needs_review",
     "month_key",
     "error",
+    "category_id",
+    "op_id",
 ]
+
+
+def column_letter(name: str) -> str:
+    """
+    Буква колонки "Журнала" по имени из JOURNAL_COLUMNS: column_letter("op_id") -> "N".
+    """
+    index = JOURNAL_COLUMNS.index(name) + 1
+    letters = ""
+    while index:
+        index, rem = divmod(index - 1, 26)
+        letters = chr(ord("A") + rem) + letters
+    return letters
+
+
+# Разбиение журнала на листы: none — один лист, year/month — по году/месяцу created_at
+PARTITION_NONE = "none"
+PARTITION_YEAR = "year"
+PARTITION_MONTH = "month"
+_PARTITION_SUFFIX = {PARTITION_YEAR: (4, r"\d{4}"), PARTITION_MONTH: (7, r"\d{4}-\d{2}")}
+
+
+def partition_sheet_name(base_name: str, mode: str, created_at: str) -> str:
+    """
+    Лист-партиция для строки с created_at "YYYY-MM-DD HH:MM:SS":
+    ("Журнал", "year", ...) -> "Журнал 2026", ("Журнал", "month", ...) -> "Журнал 2026-02".
+    Имена одной схемы сортируются по времени как строки.
+    """
+    if mode not in _PARTITION_SUFFIX:
+        return base_name
+    length, _ = _PARTITION_SUFFIX[mode]
+    return f"{base_name} {str(created_at)[:length]}"
+
+
+def is_partition_sheet(base_name: str, mode: str, title: str) -> bool:
+    if mode not in _PARTITION_SUFFIX:
+        return title == base_name
+    _, pattern = _PARTITION_SUFFIX[mode]
+    return re.fullmatch(rf"{re.escape(base_name)} {pattern}", title) is not None
+
+
+COLUMN_INDEX = {name: i for i, name in enumerate(JOURNAL_COLUMNS)}
+
+# status и source хранятся в JournalRow кодами: сравнение int дешевле строк и не плодит объекты
+STATUS_OK = 0
+STATUS_PENDING = 1
+STATUS_CANCELED = 2
+STATUS_UNKNOWN = 3
+STATUS_CODES = {"ok": STATUS_OK, "pending": STATUS_PENDING, "canceled": STATUS_CANCELED}
+
+SOURCE_TEXT = 0
+SOURCE_VOICE = 1
+SOURCE_OTHER = 2
+SOURCE_CODES = {"text": SOURCE_TEXT, "voice": SOURCE_VOICE}
+
+
+def to_int(value: Any) -> int:
+    if type(value) is int:
+        return value
+    try:
+        return int(float(str(value).replace(" ", "").replace(",", ".")))
+    except (TypeError, ValueError):
+        return 0
+
+
+class JournalRow:
+    """
+    Разобранная строка "Журнала". Поля, которых не было в прочитанных столбцах, остаются пустыми/нулевыми.
+    """
+
+    __slots__ = (
+        "row_index",
+        "sheet_name",
+        "created_at",
+        "op_date",
+        "category",
+        "amount",
+        "comment_raw",
+        "source",
+        "tg_user_id",
+        "tg_message_id",
+        "status",
+        "category_id",
+        "op_id",
+    )
+
+    def __init__(self, row_index: int = 0, sheet_name: str = ""):
+        self.row_index = row_index
+        self.sheet_name = sheet_name  # лист (партиция), из которого прочитана строка
+        self.created_at = ""
+        self.op_date = ""
+        self.category = ""
+        self.amount = 0
+        self.comment_raw = ""
+        self.source = SOURCE_OTHER
+        self.tg_user_id = 0
+        self.tg_message_id = 0
+        self.status = STATUS_UNKNOWN
+        self.category_id = ""
+        self.op_id = ""
+
+    def __repr__(self) -> str:
+        return f"JournalRow(#{self.row_index}, {self.op_date}, {self.category}, {self.amount}, user={self.tg_user_id})"
+
+
+# Поле JournalRow -> (колонка, преобразование)
+_FIELDS: dict[str, tuple[str, Any]] = {
+    "created_at": ("created_at", str),
+    "op_date": ("op_date", str),
+    "category": ("category", str),
+    "amount": ("amount", to_int),
+    "comment_raw": ("comment_raw", lambda v: str(v).strip()),
+    "source": ("source", lambda v: SOURCE_CODES.get(v, SOURCE_OTHER)),
+    "tg_user_id": ("tg_user_id", to_int),
+    "tg_message_id": ("tg_message_id", to_int),
+    "status": ("status", lambda v: STATUS_CODES.get(v, STATUS_UNKNOWN)),
+    "category_id": ("category_id", lambda v: str(v).strip()),
+    "op_id": ("op_id", str),
+}
+
+
+class RowDecoder:
+    """
+    Разбирает сырые строки Sheets в JournalRow для заданного набора столбцов
+    (весь лист или проекция вроде ("tg_user_id", "status")). Позиции считаются один раз.
+    """
+
+    def __init__(self, columns: Sequence[str] = JOURNAL_COLUMNS):
+        self.columns = tuple(columns)
+        self.letters = "".join(column_letter(name) for name in self.columns)
+        position = {name: i for i, name in enumerate(self.columns)}
+        self._plan = [
+            (field, position[column], convert)
+            for field, (column, convert) in _FIELDS.items()
+            if column in position
+        ]
+
+    def decode(self, row_index: int, values: Sequence[Any], sheet_name: str = "") -> JournalRow:
+        row = JournalRow(row_index, sheet_name)
+        size = len(values)
+        for field, pos, convert in self._plan:
+            if pos < size and values[pos] != "":
+                setattr(row, field, convert(values[pos]))
+        return row
+
+    def decode_all(self, rows: Sequence[Sequence[Any]], first_row: int = 2) -> list[JournalRow]:
+        return [self.decode(i, values) for i, values in enumerate(rows, start=first_row)]
+
+
+JOURNAL_DECODER = RowDecoder()
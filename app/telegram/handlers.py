@@ -1,5 +1,6 @@
 import os
 import uuid
+import json
 import asyncio
 
 from datetime import datetime, timedelta
@@ -10,6 +11,7 @@ from aiogram.filters import CommandStart, Command
 from aiogram.filters import StateFilter
 from aiogram.fsm.context import FSMContext
 from aiogram.types import (
+    BufferedInputFile,
     Message,
     CallbackQuery,
     InlineKeyboardMarkup,
@@ -17,14 +19,26 @@ from aiogram.types import (
 )
 
 from app.event_log import log_event
-from app.llm.client import LLMClient
+from app.llm.client import LLMClient, LLMUnavailableError
+from app.llm.scheduler import PRIORITY_TEXT, PRIORITY_VOICE
+from app.llm.usage import UsageStore
+from app.models.operation import Operation, make_op_id, parse_op_id
+from app.services.alias_service import AliasStore
+from app.services.category_classifier import CategoryClassifierRegistry
+from app.services.dedup_service import MessageDedup
+from app.services.example_index import ExampleIndex
+from app.services.pending_index import PendingIndex
 from app.services.ingest_service import (
+    build_local_operation,
     build_pending_operation_from_text,
     build_operation_from_text_with_gpt,
 )
-from app.services.transcribe_service import WhisperTranscriber
+from app.services.outbox_service import OperationOutbox, OutboxReplayer
+from app.services.transcribe_service import Transcriber
+from app.services.voice_queue import VoiceQueue, VoiceQueueFullError
 from app.sheets.journal_repo import JournalRepo
 from app.sheets.category_repo import Category, CategoryRepo
+from app.sheets.sheet_layout import STATUS_PENDING, JournalRow
 from app.telegram.keyboards import build_categories_keyboard
 from app.telegram.states import EditJournalStates, FeedbackStates, CategoryEditStates
 from app.feedback import append_feedback_entry
@@ -36,13 +50,26 @@ router = Router()
 # Helpers for /edit UI
 # ----------------------------
 
-def build_edit_rows_keyboard(rows: list[tuple[int, str]]) -> InlineKeyboardMarkup:
+def build_edit_rows_keyboard(rows: list[tuple[int, str, str]]) -> InlineKeyboardMarkup:
     buttons = []
-    for row_index, label in rows:
-        buttons.append([InlineKeyboardButton(text=label, callback_data=f"edit:row:{row_index}")])
+    for row_index, label, op_id in rows:
+        # По op_id строка находится и после сортировки листа; номер строки — для старых записей без op_id.
+        callback_data = f"edit:op:{op_id}" if op_id else f"edit:row:{row_index}"
+        buttons.append([InlineKeyboardButton(text=label, callback_data=callback_data)])
     return InlineKeyboardMarkup(inline_keyboard=buttons)
 
 
+def resolve_edit_row(journal_repo: JournalRepo, data: dict) -> Optional[int]:
+    """
+    Строка записи, выбранной в /edit. Если у записи есть op_id, номер строки перепроверяется
+    перед каждым изменением (строки могли переставить руками в Google Sheets).
+    """
+    op_id = data.get("op_id")
+    if op_id:
+        return journal_repo.find_op_row(op_id)
+    return data.get("row_index")
+
+
 def build_edit_actions_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(
         inline_keyboard=[
@@ -169,6 +196,160 @@ def resolve_category_from_list(raw_category: str, categories: list[Category]) ->
     return "", candidate
 
 
+def is_duplicate_message(
+    op_id: str,
+    journal_repo: JournalRepo,
+    outbox: OperationOutbox,
+    dedup: Optional[MessageDedup] = None,
+) -> bool:
+    """
+    Проверяет операцию op_id (пользователь + сообщение): message_id в разных чатах совпадают.
+    Сначала смотрим в локальный outbox, потом в фильтр дублей (в Sheets он идёт только
+    на «возможно есть»), а без фильтра — в журнал.
+    Недоступность Sheets не должна ронять приём операции:
+    реплеер всё равно отсечёт дубль по op_id.
+    """
+    if outbox.contains(op_id):
+        return True
+    try:
+        if dedup is not None:
+            return dedup.seen(op_id)
+        return journal_repo.is_duplicate(op_id)
+    except Exception as e:
+        log_event(f"Не удалось проверить дубль в Sheets, полагаемся на outbox: {repr(e)}")
+        return False
+
+
+def persist_operation(op: Operation, outbox: OperationOutbox, outbox_replayer: OutboxReplayer) -> bool:
+    """
+    Фиксирует операцию в outbox и будит реплеер.
+    В Google Sheets она попадёт в фоне, ответ пользователю не ждёт Sheets.
+    False — операция с тем же ключом уже в outbox и ничего не записано: отвечать «Записал» нельзя.
+    """
+    recorded = outbox.record(op)
+    outbox_replayer.notify()
+    return recorded
+
+
+async def build_operation_for_message(
+    text: str,
+    tg_user_id: int,
+    tg_message_id: int,
+    source: str,
+    categories: list[Category],
+    llm: Optional[LLMClient],
+    category_classifier: Optional[CategoryClassifierRegistry],
+    alias_store: Optional[AliasStore],
+    example_index: Optional[ExampleIndex],
+) -> Operation:
+    """
+    Собирает операцию из текста: алиасы пользователя -> локальный классификатор -> LLM -> pending.
+    В промпт LLM подставляются похожие прошлые операции пользователя (example_index).
+    Ошибки LLM не пробрасываются — в худшем случае получаем pending.
+    """
+    names_by_id = {c.category_id: c.name for c in categories}
+
+    alias_category_id = alias_store.match(tg_user_id, text) if alias_store is not None else None
+    if alias_category_id not in names_by_id:
+        alias_category_id = None
+    if alias_category_id:
+        op = build_local_operation(
+            text=text,
+            tg_user_id=tg_user_id,
+            tg_message_id=tg_message_id,
+            category_id=alias_category_id,
+            category_name=names_by_id[alias_category_id],
+            source=source,
+        )
+        if op is not None:
+            log_event(
+                f"Категория для сообщения пользователя {tg_user_id} найдена по алиасу: "
+                f"{op.category}, LLM не вызывался."
+            )
+            return op
+
+    if category_classifier is not None:
+        prediction = category_classifier.predict(tg_user_id, text)
+        if prediction is not None and prediction.category_id in names_by_id:
+            op = build_local_operation(
+                text=text,
+                tg_user_id=tg_user_id,
+                tg_message_id=tg_message_id,
+                category_id=prediction.category_id,
+                category_name=names_by_id[prediction.category_id],
+                source=source,
+            )
+            if op is not None:
+                log_event(
+                    f"Категория для сообщения пользователя {tg_user_id} определена локально: "
+                    f"{op.category} ({prediction.confidence:.2f}), LLM не вызывался."
+                )
+                return op
+
+    try:
+        if llm is None:
+            raise RuntimeError("LLM disabled or not configured")
+
+        op = await build_operation_from_text_with_gpt(
+            llm=llm,
+            text=text,
+            tg_user_id=tg_user_id,
+            tg_message_id=tg_message_id,
+            source=source,
+            categories=categories,
+            examples=example_index.similar(tg_user_id, text) if example_index is not None else (),
+            priority=PRIORITY_VOICE if source == "voice" else PRIORITY_TEXT,
+        )
+
+    except Exception as e:
+        if isinstance(e, LLMUnavailableError):
+            log_event(f"LLM недоступен ({e}). Сообщение пользователя {tg_user_id} сразу ушло в pending.")
+        elif isinstance(e, RuntimeError) and "LLM disabled" in str(e):
+            log_event(f"LLM выключен. Сообщение пользователя {tg_user_id} ушло в pending.")
+        else:
+            log_event(
+                f"Ошибка LLM для сообщения ({source}) пользователя {tg_user_id}. "
+                f"Использован pending-режим: {repr(e)}"
+            )
+
+        op = build_pending_operation_from_text(
+            text=text,
+            tg_user_id=tg_user_id,
+            tg_message_id=tg_message_id,
+            source=source,
+        )
+
+    if op.status == "ok" and not op.category_id:
+        resolved_id, resolved_name = resolve_category_from_list(op.category, categories)
+        if resolved_id:
+            op.category_id = resolved_id
+            op.category = resolved_name
+        else:
+            op.status = "pending"
+            op.needs_review = "TRUE"
+            op.category = ""
+            op.category_id = ""
+
+    # Учимся только на категориях от LLM (и на выборе пользователя в обработчиках кнопок),
+    # но не на собственных подсказках алиасов/классификатора — иначе ошибки закрепляют сами себя.
+    learn_from_llm = op.status == "ok"
+
+    if op.status == "pending" and alias_category_id and op.amount:
+        # Сумму разобрал LLM (или регекс), а категорию пользователь уже однажды выбрал сам.
+        op.status = "ok"
+        op.needs_review = "FALSE"
+        op.category_id = alias_category_id
+        op.category = names_by_id[alias_category_id]
+        log_event(f"Категория для сообщения пользователя {tg_user_id} взята из алиасов: {op.category}.")
+
+    if learn_from_llm and category_classifier is not None:
+        category_classifier.learn(tg_user_id, text, op.category_id)
+    if learn_from_llm and example_index is not None:
+        example_index.learn(tg_user_id, text, op.category_id)
+
+    return op
+
+
 async def show_category_list(bot, chat_id: int, message_id: int, categories: list[Category]) -> None:
     markup = build_category_list_keyboard(categories)
     await edit_category_menu_text(bot, chat_id, message_id, build_category_list_text(), markup)
@@ -243,22 +424,21 @@ async def edit_render_actions(
     journal_repo: JournalRepo,
     state: FSMContext,
     row_index: int,
+    row: Optional[JournalRow] = None,
 ) -> None:
     """
     Рисует карточку записи + кнопки действий через edit_message.
     Работает как из callback, так и из text-handler.
+    row — уже известные значения строки (тогда журнал не перечитывается).
     """
-    row = journal_repo.get_row(row_index)
-    if not row:
+    if row is None:
+        row = journal_repo.get_row(row_index)
+    if row is None:
         # fallback: просто очистим состояние
         await state.clear()
         return
 
-    op_date = row[1] if len(row) > 1 else ""
-    category = row[2] if len(row) > 2 else ""
-    amount = row[3] if len(row) > 3 else ""
-
-    text = format_edit_card(op_date, category, amount)
+    text = format_edit_card(row.op_date, row.category, row.amount)
 
     data = await state.get_data()
     menu_message_id = data.get("menu_message_id")
@@ -737,6 +917,30 @@ async def feedback_capture(message: Message, state: FSMContext) -> None:
 
     await state.clear()
 
+@router.message(Command("usage"))
+async def usage_command(
+    message: Message,
+    usage_store: UsageStore,
+    bot_owner_ids: frozenset[int],
+) -> None:
+    """
+    /usage — сводка расхода LLM/Whisper за 7 дней, /usage json — выгрузка агрегатов за 30 дней файлом.
+    Владельцы бота видят всех пользователей, остальные (если BOT_OWNER_IDS не задан) — только себя.
+    """
+    tg_user_id = message.from_user.id if message.from_user else 0
+    scope = None if tg_user_id in bot_owner_ids else tg_user_id
+    args = (message.text or "").split()[1:]
+    log_event(f"Пользователь {tg_user_id} запросил расход LLM (/usage {' '.join(args)}).")
+
+    if args and args[0].lower() == "json":
+        rows = usage_store.dump(days=30, tg_user_id=scope)
+        payload = json.dumps(rows, ensure_ascii=False, indent=2).encode("utf-8")
+        await message.answer_document(BufferedInputFile(payload, filename="usage.json"))
+        return
+
+    await message.answer(usage_store.summary_text(days=7, tg_user_id=scope))
+
+
 # ----------------------------
 # /edit flow
 # ----------------------------
@@ -745,9 +949,12 @@ async def feedback_capture(message: Message, state: FSMContext) -> None:
 async def edit_menu_entry(
     message: Message,
     journal_repo: JournalRepo,
+    outbox_replayer: OutboxReplayer,
     state: FSMContext,
 ) -> None:
     tg_user_id = message.from_user.id if message.from_user else 0
+    # Свежие операции могут ещё лежать в outbox — досылаем их перед чтением журнала.
+    await outbox_replayer.flush()
     rows = journal_repo.list_last_rows_for_user(tg_user_id=tg_user_id, limit=10)
     log_event(f"Пользователь {tg_user_id} открыл /edit. Найдено записей: {len(rows)}.")
 
@@ -766,14 +973,22 @@ async def edit_menu_entry(
     )
 
 
-@router.callback_query(F.data.startswith("edit:row:"))
+@router.callback_query(F.data.startswith("edit:row:") | F.data.startswith("edit:op:"))
 async def edit_select_row(
     callback: CallbackQuery,
     journal_repo: JournalRepo,
     state: FSMContext,
 ) -> None:
     data = callback.data or ""
-    row_index = int(data.split(":")[-1])
+    op_id = ""
+    if data.startswith("edit:op:"):
+        op_id = data.split("edit:op:", 1)[1]
+        row_index = journal_repo.find_op_row(op_id)
+        if row_index is None:
+            await callback.answer("Запись не найдена в журнале", show_alert=True)
+            return
+    else:
+        row_index = int(data.split(":")[-1])
     tg_user_id = callback.from_user.id if callback.from_user else 0
     log_event(f"Пользователь {tg_user_id} выбрал запись #{row_index} для редактирования.")
 
@@ -782,6 +997,7 @@ async def edit_select_row(
         menu_message_id=callback.message.message_id,
         menu_chat_id=callback.message.chat.id,
         row_index=row_index,
+        op_id=op_id,
     )
 
     await edit_render_actions(callback, journal_repo, state, row_index=row_index)
@@ -842,7 +1058,7 @@ async def edit_waiting_amount(
     state: FSMContext,
 ) -> None:
     data = await state.get_data()
-    row_index = data.get("row_index")
+    row_index = resolve_edit_row(journal_repo, data)
 
     if not row_index:
         await state.clear()
@@ -876,7 +1092,7 @@ async def edit_waiting_date(
     state: FSMContext,
 ) -> None:
     data = await state.get_data()
-    row_index = data.get("row_index")
+    row_index = resolve_edit_row(journal_repo, data)
 
     if not row_index:
         await state.clear()
@@ -930,27 +1146,42 @@ async def edit_category_pick(
     journal_repo: JournalRepo,
     category_repo: CategoryRepo,
     state: FSMContext,
+    category_classifier: Optional[CategoryClassifierRegistry],
+    alias_store: Optional[AliasStore],
+    example_index: Optional[ExampleIndex],
 ) -> None:
     category_id = (callback.data or "").split("editcat:", 1)[1].strip()
 
-    category_name = category_repo.get_name_by_id(category_id)
-    if not category_name:
-        await callback.answer("Неизвестная категория", show_alert=True)
-        return
-
     data = await state.get_data()
-    row_index = data.get("row_index")
+    row_index = resolve_edit_row(journal_repo, data)
     if not row_index:
         await callback.answer()
         await state.clear()
         return
 
+    # Строка и справочник категорий — одним запросом
+    previous, categories = journal_repo.get_row_and_categories(row_index, category_repo)
+    category_name = next((c.name for c in categories if c.category_id == category_id), None)
+    if not category_name:
+        await callback.answer("Неизвестная категория", show_alert=True)
+        return
+
     journal_repo.update_category(row_index=row_index, category=category_name, category_id=category_id)
     tg_user_id = callback.from_user.id if callback.from_user else 0
+    comment_raw = previous.comment_raw if previous is not None else ""
+    old_category_id = previous.category_id if previous is not None else ""
+    if category_classifier is not None and comment_raw:
+        category_classifier.relabel(tg_user_id, comment_raw, old_category_id, category_id)
+    if alias_store is not None and comment_raw:
+        alias_store.relabel(tg_user_id, comment_raw, old_category_id, category_id)
+    if example_index is not None and comment_raw:
+        example_index.learn(tg_user_id, comment_raw, category_id)
     log_event(f"Пользователь {tg_user_id} обновил категорию у записи #{row_index}: {category_name}.")
 
     await edit_flash_message(callback, state, f"✅ Категория обновлена: <b>{category_name}</b>")
-    await edit_render_actions(callback, journal_repo, state, row_index=row_index)
+    if previous is not None:
+        previous.category, previous.category_id = category_name, category_id
+    await edit_render_actions(callback, journal_repo, state, row_index=row_index, row=previous)
     await callback.answer("Готово ✅")
 
 
@@ -959,9 +1190,10 @@ async def edit_confirm_cancel(
     callback: CallbackQuery,
     journal_repo: JournalRepo,
     state: FSMContext,
+    pending_index: PendingIndex,
 ) -> None:
     data = await state.get_data()
-    row_index = data.get("row_index")
+    row_index = resolve_edit_row(journal_repo, data)
 
     if not row_index:
         await callback.answer()
@@ -969,6 +1201,11 @@ async def edit_confirm_cancel(
         return
 
     journal_repo.cancel_row(row_index=row_index)
+    if data.get("op_id"):
+        pending_index.discard_op(data["op_id"])
+    else:
+        # Запись без op_id: какой строке индекса она соответствует, надёжно не сказать — перечитаем индекс
+        pending_index.invalidate()
     tg_user_id = callback.from_user.id if callback.from_user else 0
     log_event(f"Пользователь {tg_user_id} отменил запись #{row_index} через /edit.")
 
@@ -985,7 +1222,7 @@ async def edit_back_to_actions(
     state: FSMContext,
 ) -> None:
     data = await state.get_data()
-    row_index = data.get("row_index")
+    row_index = resolve_edit_row(journal_repo, data)
 
     if not row_index:
         await callback.answer()
@@ -1023,8 +1260,14 @@ async def any_text_handler(
     message: Message,
     journal_repo: JournalRepo,
     category_repo: CategoryRepo,
+    outbox: OperationOutbox,
+    outbox_replayer: OutboxReplayer,
     state: FSMContext,
     llm: Optional[LLMClient],
+    category_classifier: Optional[CategoryClassifierRegistry],
+    alias_store: Optional[AliasStore],
+    example_index: Optional[ExampleIndex],
+    dedup: Optional[MessageDedup] = None,
 ) -> None:
     # Если пользователь в режиме /edit - не принимаем как новую операцию
     if await state.get_state() is not None:
@@ -1038,55 +1281,29 @@ async def any_text_handler(
     tg_message_id = message.message_id
     log_event(f"Получено текстовое сообщение от пользователя {tg_user_id}: '{text}'.")
 
-    if journal_repo.is_duplicate(tg_message_id):
+    if is_duplicate_message(make_op_id(tg_user_id, tg_message_id), journal_repo, outbox, dedup):
         await message.answer("Это сообщение уже записано. Дубль пропущен ✅")
         log_event(f"Сообщение пользователя {tg_user_id} пропущено как дубль.")
         return
 
-    # пробуем GPT, но без риска упасть
-    categories = category_repo.list_active()
-    category_names = [c.name for c in categories]
-
-    try:
-        if llm is None:
-            raise RuntimeError("LLM disabled or not configured")
-
-        op = build_operation_from_text_with_gpt(
-            llm=llm,
-            text=text,
-            tg_user_id=tg_user_id,
-            tg_message_id=tg_message_id,
-            source="text",
-            category_names=category_names,
-        )
-
-    except Exception as e:
-        if isinstance(e, RuntimeError) and "LLM disabled" in str(e):
-            log_event(f"LLM выключен. Сообщение пользователя {tg_user_id} ушло в pending.")
-        else:
-            log_event(
-                f"Ошибка LLM для пользователя {tg_user_id}. Использован pending-режим: {repr(e)}"
-            )
-
-        op = build_pending_operation_from_text(
-            text=text,
-            tg_user_id=tg_user_id,
-            tg_message_id=tg_message_id,
-            source="text",
-        )
-
-    if op.status == "ok":
-        resolved_id, resolved_name = resolve_category_from_list(op.category, categories)
-        if resolved_id:
-            op.category_id = resolved_id
-            op.category = resolved_name
-        else:
-            op.status = "pending"
-            op.needs_review = "TRUE"
-            op.category = ""
-            op.category_id = ""
+    categories = category_repo.list_active_or_cached()
+    op = await build_operation_for_message(
+        text=text,
+        tg_user_id=tg_user_id,
+        tg_message_id=tg_message_id,
+        source="text",
+        categories=categories,
+        llm=llm,
+        category_classifier=category_classifier,
+        alias_store=alias_store,
+        example_index=example_index,
+    )
 
-    journal_repo.append_operation(op)
+    if not persist_operation(op, outbox, outbox_replayer):
+        # Операция с этим сообщением уже лежит в outbox (например, Telegram прислал update повторно)
+        await message.answer("Это сообщение уже записано. Дубль пропущен ✅")
+        log_event(f"Операция пользователя {tg_user_id} уже есть в outbox — дубль не записан.")
+        return
 
     if op.status == "pending":
         log_event(
@@ -1094,7 +1311,7 @@ async def any_text_handler(
         )
         await message.answer(
             "Уточните категорию:",
-            reply_markup=build_categories_keyboard(categories),
+            reply_markup=build_categories_keyboard(categories, ref=op.op_id),
         )
         return
 
@@ -1108,23 +1325,120 @@ async def any_text_handler(
 # Main ingest: voice
 # ----------------------------
 
+class _VoiceReply:
+    """
+    Ответ на голосовое: первое сообщение правит плейсхолдер «распознаю…» (если он есть),
+    следующие — отправляются обычным ответом.
+    """
+
+    def __init__(self, message: Message, placeholder: Optional[Message] = None):
+        self.message = message
+        self.placeholder = placeholder
+
+    async def __call__(self, text: str, reply_markup=None) -> None:
+        placeholder, self.placeholder = self.placeholder, None
+        if placeholder is not None:
+            try:
+                await placeholder.edit_text(text, reply_markup=reply_markup)
+                return
+            except Exception as e:
+                log_event(f"Не удалось обновить сообщение «распознаю…»: {repr(e)}")
+        await self.message.answer(text, reply_markup=reply_markup)
+
+
 @router.message(F.voice)
 async def any_voice_handler(
     message: Message,
     journal_repo: JournalRepo,
     category_repo: CategoryRepo,
+    outbox: OperationOutbox,
+    outbox_replayer: OutboxReplayer,
     llm: Optional[LLMClient],
-    transcriber: Optional[WhisperTranscriber],
+    transcriber: Optional[Transcriber],
+    category_classifier: Optional[CategoryClassifierRegistry],
+    alias_store: Optional[AliasStore],
+    example_index: Optional[ExampleIndex],
+    voice_queue: Optional[VoiceQueue] = None,
+    dedup: Optional[MessageDedup] = None,
 ) -> None:
     tg_user_id = message.from_user.id if message.from_user else 0
     tg_message_id = message.message_id
     log_event(f"Получено голосовое сообщение от пользователя {tg_user_id}.")
 
-    if journal_repo.is_duplicate(tg_message_id):
+    if is_duplicate_message(make_op_id(tg_user_id, tg_message_id), journal_repo, outbox, dedup):
         await message.answer("Это голосовое сообщение уже записано. Дубль пропущен ✅")
         log_event(f"Голосовое сообщение пользователя {tg_user_id} пропущено как дубль.")
         return
 
+    if transcriber is None:
+        await message.answer(
+            "Распознавание голоса недоступно. "
+            "Отправьте сумму текстом или запишите голосовое еще раз."
+        )
+        log_event("Распознавание голоса недоступно: модуль transcriber не инициализирован.")
+        return
+
+    async def process(reply: _VoiceReply) -> None:
+        await process_voice_message(
+            message,
+            reply,
+            category_repo=category_repo,
+            outbox=outbox,
+            outbox_replayer=outbox_replayer,
+            llm=llm,
+            transcriber=transcriber,
+            category_classifier=category_classifier,
+            alias_store=alias_store,
+            example_index=example_index,
+        )
+
+    if voice_queue is None:
+        await process(_VoiceReply(message))
+        return
+
+    busy_text = (
+        "Сейчас слишком много голосовых в обработке 🙏 "
+        "Отправьте сумму текстом или запишите голосовое чуть позже."
+    )
+    if voice_queue.full():
+        await message.answer(busy_text)
+        return
+
+    # Плейсхолдер отправляем до постановки в очередь, чтобы обработчик всегда правил именно его.
+    waiting = voice_queue.waiting()
+    reply = _VoiceReply(message)
+    try:
+        reply.placeholder = await message.answer(
+            "🎙 Распознаю…" if waiting == 0 else f"🎙 Распознаю… (в очереди: {waiting})"
+        )
+    except Exception as e:
+        log_event(f"Не удалось отправить сообщение «распознаю…»: {repr(e)}")
+
+    try:
+        voice_queue.submit(lambda: process(reply))
+    except VoiceQueueFullError:
+        await reply(busy_text)
+
+
+async def process_voice_message(
+    message: Message,
+    reply: _VoiceReply,
+    category_repo: CategoryRepo,
+    outbox: OperationOutbox,
+    outbox_replayer: OutboxReplayer,
+    llm: Optional[LLMClient],
+    transcriber: Transcriber,
+    category_classifier: Optional[CategoryClassifierRegistry],
+    alias_store: Optional[AliasStore],
+    example_index: Optional[ExampleIndex],
+) -> None:
+    """
+    Скачивание, распознавание, разбор и запись одного голосового.
+    Вызывается из очереди голосовых (VoiceQueue) или напрямую, если очередь не настроена.
+    """
+    tg_user_id = message.from_user.id if message.from_user else 0
+    tg_message_id = message.message_id
+
     tmp_dir = "app/tmp"
     os.makedirs(tmp_dir, exist_ok=True)
     filename = f"{uuid.uuid4()}.ogg"
@@ -1135,61 +1449,47 @@ async def any_voice_handler(
         file = await bot.get_file(message.voice.file_id)
         await bot.download_file(file.file_path, destination=file_path)
 
-        if transcriber is None:
-            await message.answer(
-                "Распознавание голоса недоступно. "
-                "Отправьте сумму текстом или запишите голосовое еще раз."
-            )
-            log_event("Распознавание голоса недоступно: модуль transcriber не инициализирован.")
-            return
-
         try:
-            tr = transcriber.transcribe_ogg(file_path)
+            tr = await transcriber.transcribe_ogg(
+                file_path,
+                tg_user_id=tg_user_id,
+                audio_seconds=float(message.voice.duration or 0),
+            )
             text = tr.text.strip()
             log_text = text if len(text) <= 200 else f"{text[:200]}..."
             log_event(f"Распознан голосовой текст от {tg_user_id}: {log_text}")
         except Exception as e:
             log_event(f"Ошибка распознавания голоса у пользователя {tg_user_id}: {repr(e)}")
-            await message.answer(
+            await reply(
                 "Не удалось распознать голос. "
                 "Отправьте сумму текстом или запишите голосовое еще раз."
             )
             return
 
+        if tr.silent:
+            await reply("Похоже, в голосовом только тишина. Запишите его ещё раз или отправьте текстом.")
+            return
+
         if not text:
-            await message.answer(
+            await reply(
                 "Не удалось распознать голос. "
                 "Отправьте сумму текстом или запишите голосовое еще раз."
             )
             log_event(f"Голос пользователя {tg_user_id} не удалось распознать в текст.")
             return
 
-        categories = category_repo.list_active()
-        category_names = [c.name for c in categories]
-
-        try:
-            if llm is None:
-                raise RuntimeError("LLM disabled or not configured")
-
-            op = build_operation_from_text_with_gpt(
-                llm=llm,
-                text=text,
-                tg_user_id=tg_user_id,
-                tg_message_id=tg_message_id,
-                source="voice",
-                category_names=category_names,
-            )
-        except Exception as e:
-            log_event(
-                f"Ошибка LLM для голосового сообщения пользователя {tg_user_id}. "
-                f"Использован pending-режим: {repr(e)}"
-            )
-            op = build_pending_operation_from_text(
-                text=text,
-                tg_user_id=tg_user_id,
-                tg_message_id=tg_message_id,
-                source="voice",
-            )
+        categories = category_repo.list_active_or_cached()
+        op = await build_operation_for_message(
+            text=text,
+            tg_user_id=tg_user_id,
+            tg_message_id=tg_message_id,
+            source="voice",
+            categories=categories,
+            llm=llm,
+            category_classifier=category_classifier,
+            alias_store=alias_store,
+            example_index=example_index,
+        )
 
         try:
             amount = int(op.amount or 0)
@@ -1197,7 +1497,7 @@ async def any_voice_handler(
             amount = 0
 
         if amount == 0:
-            await message.answer(
+            await reply(
                 f"Распознал: \"{text}\", но не нашел сумму.\n"
                 f"Отправьте сумму текстом или запишите голосовое еще раз."
             )
@@ -1206,31 +1506,27 @@ async def any_voice_handler(
             )
             return
 
-        if op.status == "ok":
-            resolved_id, resolved_name = resolve_category_from_list(op.category, categories)
-            if resolved_id:
-                op.category_id = resolved_id
-                op.category = resolved_name
-            else:
-                op.status = "pending"
-                op.needs_review = "TRUE"
-                op.category = ""
-                op.category_id = ""
-
-        journal_repo.append_operation(op)
+        if not persist_operation(op, outbox, outbox_replayer):
+            await reply("Это голосовое уже записано. Дубль пропущен ✅")
+            log_event(f"Голосовая операция пользователя {tg_user_id} уже есть в outbox — дубль не записан.")
+            return
 
         if op.status == "pending":
             log_event(f"Голосовая операция пользователя {tg_user_id} сохранена как pending.")
-            await message.answer(
+            await reply(
                 f"Распознал: \"{text}\".\nУточните категорию:",
-                reply_markup=build_categories_keyboard(categories),
+                reply_markup=build_categories_keyboard(categories, ref=op.op_id),
             )
             return
 
         log_event(
             f"Голосовая операция пользователя {tg_user_id} сохранена: {op.op_date}, {op.category}, {op.amount} ₽."
         )
-        await message.answer(f"Записал ✅ {op.op_date} · {op.category} · {op.amount} ₽")
+        await reply(f"Записал ✅ {op.op_date} · {op.category} · {op.amount} ₽")
+
+    except Exception as e:
+        log_event(f"Ошибка обработки голосового пользователя {tg_user_id}: {repr(e)}")
+        await reply("Не получилось обработать голосовое. Отправьте сумму текстом или запишите его ещё раз.")
 
     finally:
         try:
@@ -1244,37 +1540,109 @@ async def any_voice_handler(
 # Pending category picker (cat:)
 # ----------------------------
 
+def parse_category_callback(data: str, tg_user_id: int) -> tuple[Optional[str], str]:
+    """
+    "cat:<op_id>:<category_id>" -> (op_id, category_id).
+    Кнопки "cat:<tg_message_id>:<category_id>" (до op_id) -> (op_id нажавшего пользователя, category_id):
+    tg_message_id уникален только в пределах чата, поэтому без пользователя операцию не определить.
+    Старые кнопки "cat:<category_id>" -> (None, category_id).
+    """
+    payload = data.split("cat:", 1)[1].strip() if "cat:" in data else ""
+    ref, sep, category_id = payload.partition(":")
+    if sep and parse_op_id(ref) is not None:
+        return ref, category_id.strip()
+    if sep and ref.isdigit():
+        return make_op_id(tg_user_id, int(ref)), category_id.strip()
+    return None, payload
+
+
 @router.callback_query(F.data.startswith("cat:"))
 async def category_callback_handler(
     callback: CallbackQuery,
     journal_repo: JournalRepo,
     category_repo: CategoryRepo,
+    outbox_replayer: OutboxReplayer,
+    category_classifier: Optional[CategoryClassifierRegistry],
+    alias_store: Optional[AliasStore],
+    example_index: Optional[ExampleIndex],
+    pending_index: PendingIndex,
 ) -> None:
-    data = callback.data or ""
-    category_id = data.split("cat:", 1)[1].strip()
+    tg_user_id = callback.from_user.id if callback.from_user else 0
+    op_id, category_id = parse_category_callback(callback.data or "", tg_user_id)
 
-    category_name = category_repo.get_name_by_id(category_id)
+    category_name = category_repo.get_cached_name(category_id)
     if not category_name:
         await callback.answer("Неизвестная категория", show_alert=True)
         return
 
-    tg_user_id = callback.from_user.id if callback.from_user else 0
+    if op_id is not None:
+        # Кнопка знает свою операцию: ещё в outbox — правим её там, уже в Sheets — пишем в её строку.
+        op = await outbox_replayer.resolve_pending(op_id, category_name, category_id)
+        if op is not None:
+            summary = {"op_date": op.op_date, "amount": op.amount, "comment_raw": op.comment_raw}
+            where = f"операции {op_id} (ещё в outbox)"
+        else:
+            if not pending_index.loaded:
+                pending_index.load(journal_repo.list_pending_rows())
+            row = pending_index.row_for_op(op_id)
+            # Номер строки из индекса — только подсказка: перед записью строка сверяется по op_id.
+            # Лист — из индекса: запись прошлого периода лежит в прежней партиции.
+            sheet_name = (row.sheet_name or None) if row is not None else None
+            row_index = journal_repo.resolve_pending_op(
+                op_id,
+                category_name,
+                category_id,
+                row_hint=row.row_index if row is not None else None,
+                sheet_name=sheet_name,
+            )
+            if row_index is None:
+                pending_index.discard_op(op_id)
+                await callback.answer("Эта запись уже разобрана", show_alert=True)
+                return
+            if row is not None and row.row_index == row_index:
+                pending_index.discard_op(op_id)
+                summary = {"op_date": row.op_date, "amount": row.amount, "comment_raw": row.comment_raw}
+            else:
+                # Индекс разошёлся с листом (строки переставили) — перечитаем его при следующем обращении
+                pending_index.invalidate()
+                summary = journal_repo.get_pending_summary(row_index=row_index, sheet_name=sheet_name)
+            where = f"записи #{row_index}"
+    else:
+        # Кнопки, отправленные до появления ссылки на операцию: ищем последнюю pending-строку пользователя.
+        await outbox_replayer.flush()
+        found = None
+        if pending_index.loaded:
+            last = pending_index.last_row_for_user(tg_user_id)
+            found = (last.sheet_name, last.row_index) if last is not None else None
+        if found is None:
+            found = journal_repo.find_last_pending_row(tg_user_id=tg_user_id)
+        if not found:
+            await callback.answer()
+            await callback.message.answer("Не нашел запись для уточнения. Попробуйте отправить сообщение заново.")
+            return
 
-    row_index = journal_repo.find_last_pending_row(tg_user_id=tg_user_id)
-    if not row_index:
-        await callback.answer()
-        await callback.message.answer("Не нашел запись для уточнения. Попробуйте отправить сообщение заново.")
-        return
+        sheet_name, row_index = found[0] or None, found[1]
+        row = journal_repo.get_row(row_index, sheet_name=sheet_name)
+        op_id = JournalRepo.row_op_id(row) if row is not None and row.status == STATUS_PENDING else ""
+        if not op_id or journal_repo.resolve_pending_op(
+            op_id, category_name, category_id, row_hint=row_index, sheet_name=sheet_name
+        ) is None:
+            await callback.answer()
+            await callback.message.answer("Не нашел запись для уточнения. Попробуйте отправить сообщение заново.")
+            return
 
-    summary = journal_repo.get_pending_summary(row_index=row_index)
-    op_date = summary.get("op_date", "")
-    amount = summary.get("amount", "")
+        pending_index.discard_op(op_id)
+        summary = {"op_date": row.op_date, "amount": row.amount, "comment_raw": row.comment_raw}
+        where = f"записи #{row_index}"
 
-    journal_repo.update_pending_category(row_index=row_index, category=category_name, category_id=category_id)
-    log_event(
-        f"Пользователь {tg_user_id} подтвердил pending-категорию: {category_name} "
-        f"для записи #{row_index}."
-    )
+    comment_raw = summary.get("comment_raw")
+    if category_classifier is not None and comment_raw:
+        category_classifier.learn(tg_user_id, comment_raw, category_id)
+    if alias_store is not None and comment_raw:
+        alias_store.learn(tg_user_id, comment_raw, category_id)
+    if example_index is not None and comment_raw:
+        example_index.learn(tg_user_id, comment_raw, category_id)
+    log_event(f"Пользователь {tg_user_id} подтвердил pending-категорию: {category_name} для {where}.")
 
     await callback.answer()
 
@@ -1284,4 +1652,6 @@ async def category_callback_handler(
     except Exception:
         pass
 
-    await callback.message.answer(f"Записал ✅ {op_date} · {category_name} · {amount} ₽")
+    await callback.message.answer(
+        f"Записал ✅ {summary.get('op_date', '')} · {category_name} · {summary.get('amount', '')} ₽"
+    )
@@ -1,20 +1,32 @@
+from typing import Optional
+
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 
 from app.sheets.category_repo import Category
 
+# Telegram ограничивает callback_data 64 байтами
+CALLBACK_DATA_LIMIT = 64
+
 
-def build_categories_keyboard(categories: list[Category], prefix: str = "cat:") -> InlineKeyboardMarkup:
+def build_categories_keyboard(
+    categories: list[Category],
+    prefix: str = "cat:",
+    ref: Optional[str] = None,
+) -> InlineKeyboardMarkup:
     """
     Inline-кнопки категорий.
-    callback_data хранит category_id.
+    callback_data хранит category_id, а с ref — ещё и ссылку на операцию: "cat:<ref>:<category_id>"
+    (ref = op_id pending-операции: по нему находятся именно её запись в outbox и строка в журнале).
     prefix:
       - "cat:" для pending
       - "editcat:" для /edit
     """
-    buttons = [
-        InlineKeyboardButton(text=c.name, callback_data=f"{prefix}{c.category_id}")
-        for c in categories
-    ]
+    buttons = []
+    for c in categories:
+        data = f"{prefix}{ref}:{c.category_id}" if ref is not None else f"{prefix}{c.category_id}"
+        if len(data.encode()) > CALLBACK_DATA_LIMIT:
+            data = f"{prefix}{c.category_id}"
+        buttons.append(InlineKeyboardButton(text=c.name, callback_data=data))
 
     rows = []
     for i in range(0, len(buttons), 2):
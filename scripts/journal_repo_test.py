@@ -1,4 +1,5 @@
 from datetime import datetime
+from itertools import islice
 
 from app.config import get_settings
 from app.models.operation import Operation
@@ -16,6 +17,7 @@ def main() -> None:
         client,
         settings.google_sheets_spreadsheet_id,
         settings.google_sheets_journal_sheet_name,
+        partition=settings.journal_partition,
     )
 
     now = datetime.now()
@@ -43,17 +45,25 @@ def main() -> None:
     repo.append_operation(op)
 
     # 2) Найдем последнюю pending строку
-    row_index = repo.find_last_pending_row(tg_user_id=123)
-    print("Last pending row index:", row_index)
+    found = repo.find_last_pending_row(tg_user_id=123)
+    print("Last pending row (sheet, index):", found)
 
-    if row_index:
-        # 3) Обновим категорию как будто нажали кнопку
+    if found:
+        # 3) Обновим категорию как будто нажали кнопку (строка сверяется по op_id перед записью)
         print("Updating category on pending row...")
-        repo.update_pending_category(row_index=row_index, category="Продукты")
-        print("✅ Updated")
+        sheet_name, row_index = found
+        written = repo.resolve_pending_op(
+            op.op_id, "Продукты", "must_products", row_hint=row_index, sheet_name=sheet_name
+        )
+        print("✅ Updated" if written else "❌ Pending row changed before update")
     else:
         print("❌ Pending row not found")
 
+    # 4) Последние строки журнала: читается только хвост листа
+    print("Newest rows:")
+    for row in islice(repo.iter_rows_reverse(page_size=50), 3):
+        print(f"  #{row.row_index} {row.op_date} · {row.category} · {row.amount} ({row.op_id})")
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,121 @@
+import argparse
+from collections import defaultdict
+from datetime import datetime
+from typing import Optional
+
+from app.config import get_settings
+from app.sheets.client import SheetsClient
+from app.sheets.journal_repo import JOURNAL_VALUE_INPUT
+from app.sheets.oauth_client import get_credentials
+from app.sheets.sheet_layout import (
+    JOURNAL_COLUMNS,
+    PARTITION_MONTH,
+    PARTITION_YEAR,
+    column_letter,
+    partition_sheet_name,
+)
+
+CHUNK_ROWS = 500
+PAGE_ROWS = 1000
+
+# Старые строки писались через USER_ENTERED, и Sheets мог отдать дату в формате локали таблицы
+_STAMP_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d", "%d.%m.%Y %H:%M:%S", "%d.%m.%Y %H:%M", "%d.%m.%Y")
+
+
+def _parse_stamp(value) -> Optional[datetime]:
+    text = str(value or "").strip()
+    for fmt in _STAMP_FORMATS:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def main() -> None:
+    """
+    Разовая миграция: раскладывает строки единого листа "Журнал" по листам-партициям
+    ("Журнал 2026" или "Журнал 2026-02") по created_at, строки без created_at — по op_date.
+    Даты переписываются в ISO-виде, как их пишет бот (RAW, см. JOURNAL_VALUE_INPUT в journal_repo).
+    Исходный лист не меняется; партиция, в которой уже есть данные, пропускается (повторный запуск безопасен).
+    После миграции задайте JOURNAL_PARTITION в .env и перезапустите бота.
+    """
+    parser = argparse.ArgumentParser(description="Split the journal sheet into period partitions")
+    parser.add_argument("--mode", choices=[PARTITION_YEAR, PARTITION_MONTH], default=None)
+    parser.add_argument("--dry-run", action="store_true", help="only print how rows would be split")
+    args = parser.parse_args()
+
+    settings = get_settings()
+    if not settings.google_oauth_client_path:
+        raise ValueError("GOOGLE_OAUTH_CLIENT_PATH is not set in .env")
+    if not settings.google_sheets_spreadsheet_id:
+        raise ValueError("GOOGLE_SHEETS_SPREADSHEET_ID is not set in .env")
+
+    mode = args.mode or settings.journal_partition
+    if mode not in (PARTITION_YEAR, PARTITION_MONTH):
+        raise ValueError("Pass --mode year|month or set JOURNAL_PARTITION in .env")
+
+    creds = get_credentials(settings.google_oauth_client_path)
+    client = SheetsClient(creds)
+    spreadsheet_id = settings.google_sheets_spreadsheet_id
+    base_name = settings.google_sheets_journal_sheet_name
+
+    last_letter = column_letter(JOURNAL_COLUMNS[-1])
+    buffers: dict[str, list[list]] = defaultdict(list)
+    counts: dict[str, int] = defaultdict(int)
+    started: set[str] = set()
+    skip: set[str] = set()
+    total = skipped = 0
+
+    def flush(sheet_name: str) -> None:
+        part_rows, buffers[sheet_name] = buffers[sheet_name], []
+        if args.dry_run or sheet_name in skip or not part_rows:
+            return
+        if sheet_name not in started:
+            started.add(sheet_name)
+            client.ensure_sheet(spreadsheet_id, sheet_name, JOURNAL_COLUMNS)
+            if len(client.get_values(spreadsheet_id, sheet_name, "A1:A3")) > 1:
+                print(f"- {sheet_name}: already has data, skipped")
+                skip.add(sheet_name)
+                return
+        client.append_rows(spreadsheet_id, sheet_name, part_rows, value_input_option=JOURNAL_VALUE_INPUT)
+
+    # Исходный лист читается страницами: в памяти не больше страницы и неполных пачек по партициям
+    first = 2
+    while True:
+        rows = client.get_values(spreadsheet_id, base_name, f"A{first}:{last_letter}{first + PAGE_ROWS - 1}")
+        if not rows:
+            break
+        for row in rows:
+            total += 1
+            padded = (list(row) + [""] * len(JOURNAL_COLUMNS))[: len(JOURNAL_COLUMNS)]
+            created_at, op_date = _parse_stamp(padded[0]), _parse_stamp(padded[1])
+            stamp = created_at or op_date
+            if stamp is None:
+                skipped += 1
+                continue
+            if created_at is not None:
+                padded[0] = created_at.strftime("%Y-%m-%d %H:%M:%S")
+            if op_date is not None:
+                padded[1] = op_date.strftime("%Y-%m-%d")
+            sheet_name = partition_sheet_name(base_name, mode, stamp.strftime("%Y-%m-%d %H:%M:%S"))
+            buffers[sheet_name].append(padded)
+            counts[sheet_name] += 1
+            if len(buffers[sheet_name]) >= CHUNK_ROWS:
+                flush(sheet_name)
+        first += PAGE_ROWS
+
+    for sheet_name in sorted(buffers):
+        flush(sheet_name)
+
+    print(f"Rows in '{base_name}': {total}, without created_at/op_date (skipped): {skipped}")
+    for sheet_name in sorted(counts):
+        status = "skipped" if sheet_name in skip else ("dry run" if args.dry_run else "✅ written")
+        print(f"- {sheet_name}: {counts[sheet_name]} rows ({status})")
+
+    if not args.dry_run:
+        print(f"Done. Set JOURNAL_PARTITION={mode}; the original sheet '{base_name}' is kept as a backup.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Общие фейки для тестов журнала: Google Sheets в памяти и фабрика операций.
+"""
+
+import re
+
+from app.models.operation import Operation
+from app.sheets.client import sheet_range
+from app.sheets.sheet_layout import JOURNAL_COLUMNS
+
+JOURNAL = "Журнал"
+
+_A1_RE = re.compile(r"([A-Z]+)(\d*)(?::([A-Z]+)(\d*))?")
+
+
+def make_op(
+    tg_message_id: int,
+    created_at: str = "2026-02-09 10:00:00",
+    status: str = "ok",
+    tg_user_id: int = 1,
+) -> Operation:
+    return Operation(
+        created_at=created_at,
+        op_date=created_at[:10],
+        category="Продукты",
+        amount=3000,
+        comment_raw="продукты 3000",
+        source="text",
+        tg_user_id=tg_user_id,
+        tg_message_id=tg_message_id,
+        status=status,
+        needs_review="FALSE",
+        month_key=created_at[:7],
+        category_id="must_products",
+    )
+
+
+def split_range(range_name: str) -> tuple[str, str]:
+    """
+    "'Журнал 2026'!G2:G" -> ("Журнал 2026", "G2:G").
+    """
+    sheet, a1 = range_name.rsplit("!", 1)
+    return sheet.strip("'"), a1
+
+
+def _column_index(letters: str) -> int:
+    index = 0
+    for ch in letters:
+        index = index * 26 + ord(ch) - ord("A") + 1
+    return index - 1
+
+
+class FakeSheetsClient:
+    """
+    Таблица в памяти с интерфейсом SheetsClient. Лист — список строк сетки, пустая строка — [].
+    calls — краткий журнал вызовов, requests — диапазоны каждого запроса на чтение,
+    input_options — valueInputOption каждой записи.
+    """
+
+    def __init__(self, sheets: dict[str, list[list]] | None = None, grid_rows: int = 0):
+        self.sheets = sheets if sheets is not None else {JOURNAL: [list(JOURNAL_COLUMNS)]}
+        self.calls: list[str] = []
+        self.requests: list[list[str]] = []
+        self.created: list[str] = []
+        self.input_options: list[str] = []
+        for name in self.sheets:
+            self.resize(name, grid_rows)
+
+    def resize(self, sheet_name: str, rows: int) -> None:
+        """Добивает сетку листа пустыми строками до rows (как пустой хвост листа в Sheets)."""
+        grid = self.sheets[sheet_name]
+        grid.extend([] for _ in range(rows - len(grid)))
+
+    def _last_filled(self, sheet_name: str) -> int:
+        return max((i for i, row in enumerate(self.sheets[sheet_name], start=1) if row), default=0)
+
+    def _bounds(self, a1: str) -> tuple[int, int, int, int | None]:
+        c1, r1, c2, r2 = _A1_RE.fullmatch(a1).groups()
+        return _column_index(c1), int(r1 or 1), _column_index(c2 or c1), int(r2) if r2 else None
+
+    def _read(self, sheet_name: str, a1: str, by_columns: bool = False) -> list[list]:
+        c1, r1, c2, r2 = self._bounds(a1)
+        rows = self.sheets[sheet_name][r1 - 1:r2]
+        block = [[row[c] if c < len(row) else "" for c in range(c1, c2 + 1)] for row in rows]
+        # Sheets не возвращает пустой хвост диапазона
+        while block and all(v == "" for v in block[-1]):
+            block.pop()
+        if by_columns:
+            return [list(col) for col in zip(*block)]
+        return block
+
+    def _write(self, range_name: str, rows: list[list]) -> tuple[str, int, int]:
+        sheet_name, a1 = split_range(range_name)
+        grid = self.sheets[sheet_name]
+        c1, first, _, last = self._bounds(a1)
+        last = last or first + len(rows) - 1
+        if last > len(grid):
+            raise ValueError("exceeds grid limits")
+        for offset, values in enumerate(rows):
+            row = grid[first + offset - 1]
+            row.extend("" for _ in range(c1 + len(values) - len(row)))
+            row[c1:c1 + len(values)] = list(values)
+        return sheet_name, first, last
+
+    def append_rows(self, spreadsheet_id, sheet_name, rows, value_input_option="USER_ENTERED"):
+        self.calls.append("append")
+        self.input_options.append(value_input_option)
+        grid = self.sheets[sheet_name]
+        first = self._last_filled(sheet_name) + 1
+        for offset, row in enumerate(rows):
+            if first + offset > len(grid):
+                grid.append([])
+            grid[first + offset - 1] = list(row)
+        return {"updates": {"updatedRange": sheet_range(sheet_name, f"A{first}:N{first + len(rows) - 1}")}}
+
+    def update_values(self, spreadsheet_id, range_name, rows, value_input_option="RAW"):
+        self.calls.append(f"update {range_name}")
+        self.input_options.append(value_input_option)
+        sheet_name, first, last = self._write(range_name, rows)
+        return {"updatedRange": sheet_range(sheet_name, f"A{first}:N{last}"), "updatedRows": len(rows)}
+
+    def batch_update_values(self, spreadsheet_id, updates, value_input_option="USER_ENTERED"):
+        self.calls.append("batch_update " + ", ".join(r for r, _ in updates))
+        self.input_options.append(value_input_option)
+        for range_name, rows in updates:
+            self._write(range_name, rows)
+        return {"totalUpdatedRanges": len(updates)}
+
+    def get_values(self, spreadsheet_id, sheet_name, a1_range):
+        self.calls.append(f"get {a1_range}")
+        self.requests.append([f"{sheet_name}!{a1_range}"])
+        return self._read(sheet_name, a1_range)
+
+    def get_column_values(self, spreadsheet_id, sheet_name, column_letter):
+        self.calls.append(f"column {column_letter}")
+        self.requests.append([f"{sheet_name}!{column_letter}:{column_letter}"])
+        return [row[0] for row in self._read(sheet_name, f"{column_letter}1:{column_letter}")]
+
+    def batch_get_values(self, spreadsheet_id, ranges, major_dimension="ROWS"):
+        self.calls.append("batch_get " + ", ".join(ranges))
+        self.requests.append(list(ranges))
+        return [self._read(*split_range(r), by_columns=major_dimension == "COLUMNS") for r in ranges]
+
+    def list_sheets(self, spreadsheet_id):
+        return [
+            {"title": title, "sheetId": i, "rowCount": len(grid)}
+            for i, (title, grid) in enumerate(self.sheets.items())
+        ]
+
+    def get_sheet_properties(self, spreadsheet_id, sheet_name):
+        self.calls.append("properties")
+        return {"title": sheet_name, "sheetId": list(self.sheets).index(sheet_name), "rowCount": len(self.sheets[sheet_name])}
+
+    def ensure_sheet(self, spreadsheet_id, sheet_name, header):
+        if sheet_name not in self.sheets:
+            self.sheets[sheet_name] = [list(header)]
+            self.created.append(sheet_name)
+        return self.get_sheet_properties(spreadsheet_id, sheet_name)
+
+    def append_dimension(self, spreadsheet_id, sheet_name, rows):
+        self.calls.append(f"grow {rows}")
+        self.resize(sheet_name, len(self.sheets[sheet_name]) + rows)
@@ -0,0 +1,103 @@
+import os
+import tempfile
+import unittest
+
+from app.services.alias_service import AhoCorasickMatcher, AliasStore, alias_phrase, extract_aliases
+
+
+class AhoCorasickMatcherTest(unittest.TestCase):
+    def test_finds_overlapping_patterns(self) -> None:
+        matcher = AhoCorasickMatcher(["he", "she", "hers"])
+        self.assertEqual(sorted(matcher.find_all("ushers")), ["he", "hers", "she"])
+
+    def test_patterns_added_after_search(self) -> None:
+        matcher = AhoCorasickMatcher(["кофе"])
+        self.assertEqual(matcher.find_all("такси и кофе"), ["кофе"])
+
+        matcher.add("такс")
+        self.assertEqual(sorted(matcher.find_all("такси и кофе")), ["кофе", "такс"])
+
+
+class AliasStoreTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "aliases.sqlite3")
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_extract_aliases_skips_numbers_and_stop_words(self) -> None:
+        self.assertEqual(extract_aliases("Пятёрочка 1500 вчера"), ["пятероч"])
+
+    def test_learned_alias_matches_other_word_forms(self) -> None:
+        store = AliasStore(self.path)
+        store.learn(1, "пятёрочка 1500", "must_products")
+
+        self.assertEqual(store.match(1, "в пятерочке 800"), "must_products")
+        self.assertIsNone(store.match(2, "в пятерочке 800"))
+        self.assertIsNone(store.match(1, "такси 300"))
+
+    def test_relabel_and_persistence(self) -> None:
+        store = AliasStore(self.path)
+        store.learn(1, "кофе 200", "must_products")
+        store.relabel(1, "кофе 200", "must_products", "want_cafe")
+        store.learn(1, "кофе 180", "want_cafe")
+        self.assertEqual(store.match(1, "кофе 250"), "want_cafe")
+
+        reopened = AliasStore(self.path)
+        self.assertEqual(reopened.match(1, "кофе 250"), "want_cafe")
+
+    def test_conflicting_aliases_give_no_answer(self) -> None:
+        store = AliasStore(self.path)
+        for _ in range(2):
+            store.learn(1, "кофе 200", "want_cafe")
+            store.learn(1, "пятёрочка 900", "must_products")
+
+        self.assertIsNone(store.match(1, "кофе в пятёрочке 300"))
+
+    def test_alias_phrase_ignores_word_order_and_forms(self) -> None:
+        self.assertEqual(alias_phrase("Пятёрочка 1500 вчера"), alias_phrase("в пятерочке 700"))
+        self.assertEqual(alias_phrase("такси до работы"), alias_phrase("работы такси"))
+        self.assertNotEqual(alias_phrase("такси до работы"), alias_phrase("обед на работе"))
+
+    def test_single_pick_does_not_route_other_phrases(self) -> None:
+        store = AliasStore(self.path)
+        store.learn(1, "такси до работы", "must_transport")
+
+        self.assertEqual(store.match(1, "такси до работы 450"), "must_transport")
+        self.assertIsNone(store.match(1, "обед на работе 600"))
+        self.assertIsNone(store.match(1, "такси в аэропорт 1200"))
+
+    def test_stem_confirmed_by_several_phrases(self) -> None:
+        store = AliasStore(self.path)
+        store.learn(1, "такси до работы", "must_transport")
+        store.learn(1, "такси в центр", "must_transport")
+
+        self.assertEqual(store.match(1, "такси в аэропорт 1200"), "must_transport")
+        self.assertIsNone(store.match(1, "обед на работе 600"))
+
+        store.learn(1, "кофе с такси-водителем", "want_cafe")
+        self.assertIsNone(store.match(1, "такси в аэропорт 1200"))
+
+    def test_generic_words_never_become_aliases(self) -> None:
+        self.assertEqual(extract_aliases("подарок маме 3000"), [])
+        self.assertEqual(extract_aliases("цветы маме"), ["цвет"])
+
+        store = AliasStore(self.path)
+        store.learn(1, "подарок маме 3000", "opt_gifts")
+        store.learn(1, "цветы маме", "opt_gifts")
+
+        self.assertEqual(store.match(1, "цветы 1500"), "opt_gifts")
+        self.assertIsNone(store.match(1, "такси к маме 500"))
+        self.assertIsNone(store.match(1, "подарок коллеге 1000"))
+
+    def test_alias_used_for_two_categories_is_ignored(self) -> None:
+        store = AliasStore(self.path)
+        store.learn(1, "озон 900", "must_products")
+        store.learn(1, "озон 2500", "want_clothes")
+
+        self.assertIsNone(store.match(1, "озон 400"))
+
+
+if __name__ == "__main__":
+    unittest.main()
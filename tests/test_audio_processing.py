@@ -0,0 +1,94 @@
+import asyncio
+import math
+import unittest
+from array import array
+from unittest import mock
+
+from app.services.audio_processing import (
+    FRAME_S,
+    SAMPLE_RATE,
+    find_chunks,
+    frame_energies,
+    pcm_seconds,
+    split_pcm,
+    trim_silence,
+)
+from app.services.transcribe_service import WhisperTranscriber
+
+
+def _tone(seconds: float) -> array:
+    return array("h", (int(8000 * math.sin(2 * math.pi * 440 * i / SAMPLE_RATE)) for i in range(int(seconds * SAMPLE_RATE))))
+
+
+def _silence(seconds: float) -> array:
+    return array("h", [0] * int(seconds * SAMPLE_RATE))
+
+
+class AudioChunkingTest(unittest.TestCase):
+    def test_splits_at_pauses(self) -> None:
+        pcm = _tone(20) + _silence(1) + _tone(20) + _silence(1) + _tone(20)
+        chunks = find_chunks(frame_energies(pcm.tobytes()), target_s=15, max_s=25)
+
+        self.assertEqual(len(chunks), 3)
+        for _, end in chunks[:-1]:
+            cut_s = end * FRAME_S
+            self.assertTrue(20 <= cut_s <= 21 or 41 <= cut_s <= 42, cut_s)
+        self.assertEqual(chunks[-1][1], len(frame_energies(pcm.tobytes())))
+
+    def test_forced_cut_without_pauses_keeps_all_audio(self) -> None:
+        pcm = _tone(12).tobytes()
+        pieces = split_pcm(pcm, target_s=4, max_s=5)
+
+        self.assertGreaterEqual(len(pieces), 3)
+        self.assertEqual(b"".join(pieces), pcm)
+
+    def test_trim_silence_and_empty_note(self) -> None:
+        pcm = (_silence(2) + _tone(1) + _silence(3)).tobytes()
+        trimmed, speech_s = trim_silence(pcm, threshold_rms=300)
+
+        self.assertAlmostEqual(speech_s, 1.0, delta=0.05)
+        self.assertAlmostEqual(pcm_seconds(trimmed), 1.4, delta=0.05)
+        self.assertEqual(trim_silence(_silence(3).tobytes(), threshold_rms=300), (b"", 0.0))
+
+
+class ChunkedTranscriptionTest(unittest.TestCase):
+    def test_chunks_are_stitched_in_order(self) -> None:
+        transcriber = WhisperTranscriber(providers=None, chunk_parallelism=2)
+        running = {"now": 0, "max": 0}
+
+        async def fake_encode(pcm):
+            return pcm, "voice.ogg", "audio/ogg"
+
+        async def fake_one(audio, filename, content_type, priority, usage):
+            running["now"] += 1
+            running["max"] = max(running["max"], running["now"])
+            await asyncio.sleep(0.01 * (3 - int(audio)))
+            running["now"] -= 1
+            return f"часть{audio.decode()}"
+
+        transcriber._transcribe_one = fake_one
+        with mock.patch("app.services.transcribe_service.encode_for_upload", fake_encode):
+            text = asyncio.run(transcriber._transcribe_chunks([b"0", b"1", b"2"], 1, None))
+
+        self.assertEqual(text, "часть0 часть1 часть2")
+        self.assertEqual(running["max"], 2)
+
+    def test_silent_note_is_not_uploaded(self) -> None:
+        transcriber = WhisperTranscriber(providers=None, preprocess=True)
+
+        async def fake_decode(file_path, audio_seconds):
+            return b""
+
+        async def fail_upload(*args, **kwargs):
+            raise AssertionError("Whisper must not be called for silence")
+
+        transcriber._decode = fake_decode
+        transcriber._transcribe_one = fail_upload
+        result = asyncio.run(transcriber.transcribe_ogg("voice.ogg", audio_seconds=5))
+
+        self.assertTrue(result.silent)
+        self.assertEqual(result.text, "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import unittest
+
+from app.services.pending_index import PendingIndex
+from app.sheets.journal_repo import JournalRepo
+from app.sheets.sheet_layout import JOURNAL_COLUMNS
+from app.telegram.handlers import category_callback_handler, parse_category_callback
+
+from journal_fakes import JOURNAL, FakeSheetsClient
+
+
+def _row(user: int, mid: int, comment: str, amount: str) -> list:
+    return [
+        "2026-02-09 10:00:00", "2026-02-09", "", amount, comment, "text", str(user), str(mid),
+        "pending", True, "2026-02", "", "", f"op{user}-{mid}",
+    ]
+
+
+class _FakeMessage:
+    def __init__(self):
+        self.answers = []
+        self.deleted = False
+
+    async def answer(self, text, reply_markup=None):
+        self.answers.append(text)
+
+    async def delete(self):
+        self.deleted = True
+
+
+class _FakeCallback:
+    def __init__(self, data: str):
+        self.data = data
+        self.message = _FakeMessage()
+        self.from_user = type("FakeUser", (), {"id": 1})()
+        self.answer_calls = []
+
+    async def answer(self, text=None, show_alert=False):
+        self.answer_calls.append(text)
+
+
+class _FakeCategoryRepo:
+    def get_cached_name(self, category_id):
+        return {"cafe": "Кафе"}.get(category_id)
+
+
+class _FakeReplayer:
+    async def resolve_pending(self, op_id, category, category_id):
+        return None  # операция уже в Sheets
+
+
+class CategoryCallbackTests(unittest.IsolatedAsyncioTestCase):
+    def test_parse_callback_data(self):
+        self.assertEqual(parse_category_callback("cat:op7-42:cafe", 1), ("op7-42", "cafe"))
+        self.assertEqual(parse_category_callback("cat:42:cafe", 1), ("op1-42", "cafe"))
+        self.assertEqual(parse_category_callback("cat:cafe", 1), (None, "cafe"))
+
+    def setUp(self):
+        # Строка 2 — сообщение 41 пользователя 2 в его чате: номер тот же, операция чужая
+        self.client = FakeSheetsClient(
+            {JOURNAL: [list(JOURNAL_COLUMNS), _row(2, 41, "ужин", "900"), _row(1, 41, "кофе", "300"), _row(1, 42, "обед", "500")]}
+        )
+        self.journal = JournalRepo(self.client, "sheet-id", JOURNAL)
+        self.pending_index = PendingIndex()
+        self.pending_index.load(self.journal.list_pending_rows())
+
+    async def _press(self, data: str) -> _FakeCallback:
+        callback = _FakeCallback(data)
+        await category_callback_handler(
+            callback,
+            journal_repo=self.journal,
+            category_repo=_FakeCategoryRepo(),
+            outbox_replayer=_FakeReplayer(),
+            category_classifier=None,
+            alias_store=None,
+            example_index=None,
+            pending_index=self.pending_index,
+        )
+        return callback
+
+    async def test_updates_row_of_pressed_operation(self):
+        self.client.calls.clear()
+        callback = await self._press("cat:op1-41:cafe")
+
+        sheet = self.client.sheets[JOURNAL]
+        self.assertEqual([(r[7], r[8], r[2]) for r in sheet[1:]], [("41", "pending", ""), ("41", "ok", "Кафе"), ("42", "pending", "")])
+        self.assertEqual(sum(call.startswith("batch_update") for call in self.client.calls), 1)
+        self.assertNotIn((JOURNAL, 3), self.pending_index)
+        self.assertIn((JOURNAL, 2), self.pending_index)
+        self.assertIn((JOURNAL, 4), self.pending_index)
+        self.assertEqual(callback.message.answers, ["Записал ✅ 2026-02-09 · Кафе · 300 ₽"])
+
+    async def test_moved_row_is_found_by_op_id(self):
+        sheet = self.client.sheets[JOURNAL]
+        # Лист отсортировали руками после загрузки индекса: в строке 3 теперь «обед»
+        sheet[1:] = [sheet[1], sheet[3], sheet[2]]
+
+        callback = await self._press("cat:op1-41:cafe")
+
+        self.assertEqual([(r[4], r[8], r[2]) for r in sheet[1:]], [("ужин", "pending", ""), ("обед", "pending", ""), ("кофе", "ok", "Кафе")])
+        self.assertFalse(self.pending_index.loaded)
+        self.assertEqual(callback.message.answers, ["Записал ✅ 2026-02-09 · Кафе · 300 ₽"])
+
+    async def test_resolved_operation_is_not_written_again(self):
+        await self._press("cat:op1-41:cafe")
+        self.client.sheets[JOURNAL][2][2] = "Продукты"
+
+        callback = await self._press("cat:op1-41:cafe")
+
+        self.assertEqual(self.client.sheets[JOURNAL][2][2], "Продукты")
+        self.assertEqual(callback.answer_calls, ["Эта запись уже разобрана"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import unittest
+from datetime import datetime
+
+from app.services.category_classifier import CategoryClassifierRegistry
+from app.services.ingest_service import parse_simple_amount_and_date
+from app.sheets.category_repo import Category
+from app.telegram.handlers import build_operation_for_message
+
+
+def _examples(tg_user_id: int = 1):
+    rows = []
+    for i in range(10):
+        rows.append((tg_user_id, f"такси до работы {100 + i}", "must_transport"))
+        rows.append((tg_user_id, f"продукты в пятёрочке {500 + i}", "must_products"))
+    return rows
+
+
+class CategoryClassifierRegistryTest(unittest.TestCase):
+    def test_confident_prediction_after_training(self) -> None:
+        registry = CategoryClassifierRegistry(min_confidence=0.9, min_examples=20)
+        registry.fit(_examples())
+
+        prediction = registry.predict(1, "такси 350")
+
+        self.assertIsNotNone(prediction)
+        self.assertEqual(prediction.category_id, "must_transport")
+
+    def test_no_prediction_without_enough_examples(self) -> None:
+        registry = CategoryClassifierRegistry(min_confidence=0.9, min_examples=20)
+        registry.fit(_examples()[:10])
+
+        self.assertIsNone(registry.predict(1, "такси 350"))
+        self.assertIsNone(registry.predict(2, "такси 350"))
+
+    def test_relabel_moves_example_between_classes(self) -> None:
+        registry = CategoryClassifierRegistry(min_confidence=0.0, min_examples=1, min_class_examples=1)
+        registry.learn(1, "кофе", "want_cafe")
+        registry.relabel(1, "кофе", "want_cafe", "must_products")
+
+        self.assertEqual(registry.predict(1, "кофе").category_id, "must_products")
+
+
+class ParseSimpleAmountAndDateTest(unittest.TestCase):
+    def test_simple_messages(self) -> None:
+        now = datetime(2026, 2, 9, 12, 0)
+
+        amount, op_date = parse_simple_amount_and_date("такси 2к вчера", now)
+        self.assertEqual(amount, 2000)
+        self.assertEqual(op_date.date(), datetime(2026, 2, 8).date())
+
+        self.assertIsNone(parse_simple_amount_and_date("такси 300 и кофе 200", now))
+        self.assertIsNone(parse_simple_amount_and_date("такси 300 в пятницу", now))
+        self.assertIsNone(parse_simple_amount_and_date("такси 300 12.02", now))
+
+    def test_currency_and_thousands_suffixes_keep_whole_number(self) -> None:
+        now = datetime(2026, 2, 9, 12, 0)
+        cases = {
+            "такси 500р": 500,
+            "кофе 300руб": 300,
+            "кофе 300 рублей": 300,
+            "обед 450₽": 450,
+            "такси 3 тысячи": 3000,
+            "ремонт 5 000": 5000,
+        }
+        for text, expected in cases.items():
+            with self.subTest(text=text):
+                self.assertEqual(parse_simple_amount_and_date(text, now)[0], expected)
+
+        self.assertIsNone(parse_simple_amount_and_date("сыр 300г", now))
+        self.assertIsNone(parse_simple_amount_and_date("батарейки 2шт 400", now))
+
+
+class _FakeClassifier:
+    def __init__(self, category_id: str):
+        self.category_id = category_id
+        self.learned: list[tuple[int, str, str]] = []
+
+    def predict(self, tg_user_id, text):
+        return type("Prediction", (), {"category_id": self.category_id, "confidence": 0.99})()
+
+    def learn(self, tg_user_id, text, category_id):
+        self.learned.append((tg_user_id, text, category_id))
+
+
+class LocalPredictionLearningTest(unittest.IsolatedAsyncioTestCase):
+    async def test_own_prediction_is_not_learned(self) -> None:
+        classifier = _FakeClassifier("taxi")
+        op = await build_operation_for_message(
+            text="такси 500",
+            tg_user_id=1,
+            tg_message_id=10,
+            source="text",
+            categories=[Category("taxi", "Такси", "want", 10, True)],
+            llm=None,
+            category_classifier=classifier,
+            alias_store=None,
+            example_index=None,
+        )
+
+        self.assertEqual((op.status, op.category_id, op.amount), ("ok", "taxi", 500))
+        self.assertEqual(classifier.learned, [])
+
+    async def test_alias_fallback_is_not_learned(self) -> None:
+        classifier = _FakeClassifier("unknown")  # прогноз не из списка категорий
+        alias_store = type("Aliases", (), {"match": lambda self, user, text: "taxi"})()
+        op = await build_operation_for_message(
+            text="такси 300г 2 раза",  # простой разбор не справится -> pending, потом алиас
+            tg_user_id=1,
+            tg_message_id=11,
+            source="text",
+            categories=[Category("taxi", "Такси", "want", 10, True)],
+            llm=None,
+            category_classifier=classifier,
+            alias_store=alias_store,
+            example_index=None,
+        )
+
+        self.assertEqual((op.status, op.category_id), ("ok", "taxi"))
+        self.assertEqual(classifier.learned, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
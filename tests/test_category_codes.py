@@ -0,0 +1,76 @@
+import unittest
+from unittest import mock
+
+from app.data.category_templates import DEFAULT_TEMPLATE
+from app.services import gpt_parse_service
+from app.services.gpt_parse_service import SYSTEM_PROMPT_TEMPLATE, CategoryCodes
+from app.sheets.category_repo import Category
+
+
+def _categories() -> list[Category]:
+    return [
+        Category(category_id="must_products", name="Продукты", section="must", order=1, is_active=True),
+        Category(category_id="user_1a2b3c4d", name="Подарки", section="want", order=2, is_active=True),
+        Category(category_id="must_products", name="Дубль", section="must", order=3, is_active=True),
+    ]
+
+
+class CategoryCodesTests(unittest.TestCase):
+    def test_prompt_uses_short_codes_only(self):
+        codes = CategoryCodes(_categories())
+        products, gifts = codes.code_for("must_products"), codes.code_for("user_1a2b3c4d")
+
+        self.assertEqual(codes.prompt_section(), f"{products}=Продукты\n{gifts}=Подарки")
+        self.assertEqual(len(products), 4)
+        self.assertNotIn("user_", codes.prompt_section())
+
+    def test_resolve_maps_short_code_back(self):
+        codes = CategoryCodes(_categories())
+        gifts = codes.code_for("user_1a2b3c4d")
+
+        self.assertEqual(codes.resolve(gifts), ("user_1a2b3c4d", "Подарки"))
+        self.assertEqual(codes.resolve(f" {codes.code_for('must_products').upper()} "), ("must_products", "Продукты"))
+
+    def test_codes_do_not_depend_on_list_position(self):
+        before = CategoryCodes(_categories())
+        extra = Category(category_id="want_cafe", name="Кафе", section="want", order=0, is_active=True)
+        after = CategoryCodes([extra, *reversed(_categories()[:2])])
+
+        self.assertEqual(after.code_for("must_products"), before.code_for("must_products"))
+        self.assertEqual(after.code_for("user_1a2b3c4d"), before.code_for("user_1a2b3c4d"))
+        self.assertEqual(len(after.by_code), 3)
+
+    def test_hash_collision_gets_longer_code(self):
+        with mock.patch.object(gpt_parse_service, "_code_digits", lambda category_id: "abc" + category_id[-1]):
+            codes = CategoryCodes(
+                [
+                    Category(category_id="b_2", name="Б", section="want", order=1, is_active=True),
+                    Category(category_id="a_1", name="А", section="want", order=2, is_active=True),
+                ]
+            )
+
+        # Короткий код достаётся первой по category_id, от порядка в списке это не зависит
+        self.assertEqual((codes.code_for("a_1"), codes.code_for("b_2")), ("cabc", "cabc2"))
+
+    def test_resolve_accepts_category_id_or_name_and_rejects_unknown(self):
+        codes = CategoryCodes(_categories())
+
+        self.assertEqual(codes.resolve("must_products"), ("must_products", "Продукты"))
+        self.assertEqual(codes.resolve("подарки"), ("user_1a2b3c4d", "Подарки"))
+        self.assertEqual(codes.resolve("czzzz"), ("", ""))
+        self.assertEqual(codes.resolve(""), ("", ""))
+
+    def test_default_prompt_is_shorter_than_with_category_ids(self):
+        codes = CategoryCodes(None)
+        with_ids = "\n".join(f"{row['category_id']}={row['name']}" for row in DEFAULT_TEMPLATE)
+
+        section = codes.prompt_section()
+        prompt = SYSTEM_PROMPT_TEMPLATE.format(categories_section=section)
+
+        self.assertEqual(len(codes.by_code), len(DEFAULT_TEMPLATE))
+        self.assertLess(len(section), len(with_ids))
+        self.assertLess(len(prompt), 900)
+
+
+if __name__ == "__main__":
+    unittest.main()
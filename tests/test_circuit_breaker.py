@@ -0,0 +1,62 @@
+import unittest
+
+from app.llm.circuit_breaker import CircuitBreaker
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class CircuitBreakerTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = _Clock()
+        self.breaker = CircuitBreaker(
+            name="test",
+            failure_threshold=2,
+            slow_call_s=5.0,
+            open_s=30.0,
+            clock=self.clock,
+        )
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.record_failure("boom")
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.breaker.record_failure("boom")
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_slow_success_counts_as_failure(self):
+        self.breaker.record_success(6.0)
+        self.breaker.record_success(7.0)
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+
+    def test_half_open_allows_single_probe_and_recovers(self):
+        self.breaker.record_failure("boom")
+        self.breaker.record_failure("boom")
+        self.clock.now = 31.0
+
+        self.assertTrue(self.breaker.allow_request())
+        self.assertEqual(self.breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertFalse(self.breaker.allow_request())
+
+        self.breaker.record_success(0.5)
+        self.assertEqual(self.breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(self.breaker.allow_request())
+
+    def test_failed_probe_reopens(self):
+        self.breaker.record_failure("boom")
+        self.breaker.record_failure("boom")
+        self.clock.now = 31.0
+        self.assertTrue(self.breaker.allow_request())
+
+        self.breaker.record_failure("still down")
+        self.assertEqual(self.breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(self.breaker.allow_request())
+
+
+if __name__ == "__main__":
+    unittest.main()
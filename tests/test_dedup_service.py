@@ -0,0 +1,115 @@
+import os
+import tempfile
+import unittest
+
+from app.models.operation import make_op_id
+from app.services.dedup_service import BloomFilter, MessageDedup
+
+
+def _ids(*message_ids: int, tg_user_id: int = 1) -> list[str]:
+    return [make_op_id(tg_user_id, mid) for mid in message_ids]
+
+
+class _FakeJournal:
+    def __init__(self, ids: list[str]):
+        self.ids = ids
+        self.sheet_name = "Журнал"
+        self.reads: list[int] = []
+        self.duplicate_checks: list[str] = []
+
+    def list_op_ids(self, start_row: int = 2) -> tuple[list[str], int]:
+        self.reads.append(start_row)
+        tail = self.ids[start_row - 2:]
+        return list(tail), start_row + len(tail) - 1
+
+    def is_duplicate(self, op_id: str) -> bool:
+        self.duplicate_checks.append(op_id)
+        return op_id in self.ids
+
+
+class BloomFilterTest(unittest.TestCase):
+    def test_no_false_negatives_and_few_false_positives(self) -> None:
+        bloom = BloomFilter(capacity=2000, error_rate=0.01)
+        for i in range(2000):
+            bloom.add(f"op1-{i}")
+
+        self.assertTrue(all(f"op1-{i}" in bloom for i in range(2000)))
+        false_positives = sum(1 for i in range(100_000, 110_000) if f"op1-{i}" in bloom)
+        self.assertLess(false_positives, 300)
+
+
+class MessageDedupTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "dedup.bloom")
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def _dedup(self, journal: _FakeJournal) -> MessageDedup:
+        return MessageDedup(journal, path=self.path, window=10, capacity=1000, error_rate=0.001)
+
+    def test_sheets_consulted_only_on_maybe(self) -> None:
+        journal = _FakeJournal(_ids(101, 102, 103))
+        dedup = self._dedup(journal)
+        dedup.load()
+
+        self.assertFalse(dedup.seen(make_op_id(1, 999)))
+        self.assertEqual(journal.duplicate_checks, [])
+        self.assertTrue(dedup.seen(make_op_id(1, 102)))
+        self.assertEqual(journal.duplicate_checks, _ids(102))
+
+        dedup.add(_ids(104), (5, 5))
+        self.assertTrue(dedup.seen(make_op_id(1, 104)))
+        self.assertEqual(journal.duplicate_checks, _ids(102))
+        self.assertEqual(dedup.maybe_seen(_ids(103, 104, 500)), set(_ids(103, 104)))
+
+    def test_saved_filter_reads_only_new_rows(self) -> None:
+        journal = _FakeJournal(_ids(101, 102, 103))
+        dedup = self._dedup(journal)
+        dedup.load()
+        dedup.add(_ids(104), (5, 5))
+        dedup.save()
+
+        journal.ids.extend(_ids(105, 106))  # записаны после сохранения (например, другим процессом)
+        restored = self._dedup(journal)
+        restored.load()
+
+        self.assertEqual(journal.reads, [2, 6])
+        self.assertEqual(restored.maybe_seen(_ids(101, 104, 106, 777)), set(_ids(101, 104, 106)))
+
+    def test_new_partition_rereads_its_rows_but_keeps_history(self) -> None:
+        journal = _FakeJournal(_ids(101, 102, 103))
+        dedup = self._dedup(journal)
+        dedup.load()
+        dedup.save()
+
+        journal.sheet_name = "Журнал 2027"
+        journal.ids = _ids(201)
+        restored = self._dedup(journal)
+        restored.load()
+
+        self.assertEqual(journal.reads, [2, 2])
+        self.assertEqual(restored.maybe_seen(_ids(101, 201, 777)), set(_ids(101, 201)))
+
+    def test_same_message_id_of_another_user_is_not_a_duplicate(self) -> None:
+        journal = _FakeJournal(_ids(101))
+        dedup = self._dedup(journal)
+        dedup.load()
+        dedup.add(_ids(102))
+
+        self.assertFalse(dedup.seen(make_op_id(2, 101)))
+        self.assertFalse(dedup.seen(make_op_id(2, 102)))
+        self.assertTrue(dedup.seen(make_op_id(1, 102)))
+
+    def test_not_ready_falls_back_to_sheets(self) -> None:
+        journal = _FakeJournal(_ids(101))
+        dedup = self._dedup(journal)
+
+        self.assertTrue(dedup.seen(make_op_id(1, 101)))
+        self.assertFalse(dedup.seen(make_op_id(1, 5)))
+        self.assertEqual(journal.duplicate_checks, _ids(101, 5))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+
+from app.services.example_index import ExampleIndex, SimilarExample
+from app.services.gpt_parse_service import CategoryCodes, _examples_section
+from app.sheets.category_repo import Category
+
+
+class ExampleIndexTest(unittest.TestCase):
+    def test_returns_most_similar_examples_of_the_user(self) -> None:
+        index = ExampleIndex(k=2, min_similarity=0.2)
+        index.fit(
+            [
+                (1, "такси до работы 300", "must_transport"),
+                (1, "кофе в шоколаднице 250", "want_cafe"),
+                (1, "продукты пятёрочка 1500", "must_products"),
+                (2, "такси домой 500", "want_fun"),
+            ]
+        )
+
+        similar = index.similar(1, "такси до дома 400")
+
+        self.assertEqual(similar[0].category_id, "must_transport")
+        self.assertTrue(all(ex.category_id != "want_fun" for ex in similar))
+        self.assertEqual(index.similar(3, "такси"), [])
+
+    def test_learn_overrides_category_for_same_comment(self) -> None:
+        index = ExampleIndex(k=1, min_similarity=0.1)
+        index.learn(1, "кофе 200", "must_products")
+        index.learn(1, "Кофе 250", "want_cafe")
+
+        self.assertEqual(index.examples, 1)
+        self.assertEqual(index.similar(1, "кофе")[0].category_id, "want_cafe")
+
+    def test_prompt_section_skips_unknown_codes(self) -> None:
+        codes = CategoryCodes([Category(category_id="want_cafe", name="Кафе", section="want", order=1, is_active=True)])
+        section = _examples_section(
+            [SimilarExample("кофе 200", "want_cafe", 0.9), SimilarExample("старое", "removed", 0.8)],
+            codes,
+        )
+
+        self.assertIn(f"кофе 200 -> {codes.code_for('want_cafe')}", section)
+        self.assertNotIn("removed", section)
+
+
+if __name__ == "__main__":
+    unittest.main()
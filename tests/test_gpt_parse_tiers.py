@@ -0,0 +1,124 @@
+import asyncio
+import time
+import unittest
+from datetime import datetime
+
+from app.llm.client import LLMClient, LLMUnavailableError
+from app.services.gpt_parse_service import (
+    ESCALATE_NEEDS_REVIEW,
+    CategoryCodes,
+    ESCALATE_UNKNOWN_CATEGORY,
+    ESCALATE_ZERO_AMOUNT,
+    _escalation_reasons,
+    parse_operation_with_gpt,
+)
+from app.sheets.category_repo import Category
+
+CATEGORIES = [Category(category_id="must_taxi", name="Такси", section="must", order=1, is_active=True)]
+TAXI = CategoryCodes(CATEGORIES).code_for("must_taxi")
+ALL_RULES = frozenset({ESCALATE_NEEDS_REVIEW, ESCALATE_UNKNOWN_CATEGORY, ESCALATE_ZERO_AMOUNT})
+
+
+class _FakeLLM:
+    """Отвечает заранее заданными JSON по уровням и запоминает (уровень, deadline) вызовов."""
+
+    def __init__(self, answers: dict[str, dict], fast_delay_s: float = 0.0, budget_s: float = 1.0):
+        self.answers = answers
+        self.fast_delay_s = fast_delay_s
+        self.budget_s = budget_s
+        self.escalate_on = ALL_RULES
+        self.calls: list[tuple[str, float]] = []
+
+    def has_fast_tier(self) -> bool:
+        return LLMClient.TIER_FAST in self.answers
+
+    def new_deadline(self) -> float:
+        return time.monotonic() + self.budget_s
+
+    async def chat_json(self, system, user, tier, schema, priority, tg_user_id, deadline=None):
+        self.calls.append((tier, deadline))
+        if tier == LLMClient.TIER_FAST:
+            await asyncio.sleep(self.fast_delay_s)
+        return dict(self.answers[tier])
+
+
+def _parsed(category_id="must_taxi", amount=500, needs_review=False) -> dict:
+    return {"category_id": category_id, "amount": amount, "needs_review": needs_review}
+
+
+class EscalationReasonsTests(unittest.TestCase):
+    def test_confident_answer_is_not_escalated(self):
+        self.assertEqual(_escalation_reasons(_parsed(), ALL_RULES), [])
+
+    def test_each_rule_fires_only_when_enabled(self):
+        parsed = _parsed(category_id="", amount=0, needs_review=True)
+
+        self.assertEqual(
+            _escalation_reasons(parsed, ALL_RULES),
+            [ESCALATE_NEEDS_REVIEW, ESCALATE_UNKNOWN_CATEGORY, ESCALATE_ZERO_AMOUNT],
+        )
+        self.assertEqual(_escalation_reasons(parsed, frozenset({ESCALATE_ZERO_AMOUNT})), [ESCALATE_ZERO_AMOUNT])
+        self.assertEqual(_escalation_reasons(parsed, frozenset()), [])
+
+
+class TierRoutingTests(unittest.IsolatedAsyncioTestCase):
+    async def _parse(self, llm: _FakeLLM) -> dict:
+        return await parse_operation_with_gpt(llm, "такси 500", datetime(2026, 3, 1), CATEGORIES)
+
+    async def test_confident_fast_answer_skips_strong_tier(self):
+        llm = _FakeLLM({LLMClient.TIER_FAST: {"amount": 500, "category": TAXI, "needs_review": False}})
+
+        result = await self._parse(llm)
+
+        self.assertEqual(result["category_id"], "must_taxi")
+        self.assertEqual([tier for tier, _ in llm.calls], [LLMClient.TIER_FAST])
+
+    async def test_escalation_shares_one_deadline(self):
+        llm = _FakeLLM(
+            {
+                LLMClient.TIER_FAST: {"amount": 500, "category": "нечто", "needs_review": False},
+                LLMClient.TIER_STRONG: {"amount": 500, "category": TAXI, "needs_review": False},
+            },
+            fast_delay_s=0.02,
+        )
+
+        result = await self._parse(llm)
+
+        self.assertEqual(result["category"], "Такси")
+        (fast_tier, fast_deadline), (strong_tier, strong_deadline) = llm.calls
+        self.assertEqual((fast_tier, strong_tier), (LLMClient.TIER_FAST, LLMClient.TIER_STRONG))
+        self.assertIsNotNone(fast_deadline)
+        self.assertEqual(fast_deadline, strong_deadline)
+
+    async def test_without_fast_tier_goes_straight_to_strong(self):
+        llm = _FakeLLM({LLMClient.TIER_STRONG: {"amount": 500, "category": TAXI, "needs_review": False}})
+
+        await self._parse(llm)
+
+        self.assertEqual([tier for tier, _ in llm.calls], [LLMClient.TIER_STRONG])
+
+
+class _SlowPool:
+    def __init__(self):
+        self.tiers: list[str] = []
+
+    async def call(self, fn, tokens=0, tier=LLMClient.TIER_STRONG, scheduler=None):
+        self.tiers.append(tier)
+        await asyncio.sleep(1.0)
+
+
+class ChatJsonDeadlineTests(unittest.IsolatedAsyncioTestCase):
+    async def test_call_gets_only_time_left_until_deadline(self):
+        pool = _SlowPool()
+        llm = LLMClient(pool, budget_s=5.0)
+
+        started = time.monotonic()
+        with self.assertRaises(LLMUnavailableError):
+            await llm.chat_json("s", "u", tier=LLMClient.TIER_FAST, deadline=time.monotonic() + 0.05)
+
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(pool.tiers, [LLMClient.TIER_FAST])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+
+from app.sheets.journal_repo import JournalRepo
+
+from journal_fakes import FakeSheetsClient, make_op
+
+
+class ExplicitRangeAppendTests(unittest.TestCase):
+    def test_appends_to_known_next_rows(self):
+        client = FakeSheetsClient(grid_rows=4)
+        repo = JournalRepo(client, "sheet-id", "Журнал")
+
+        repo.append_operation(make_op(1))  # счётчик ещё неизвестен — обычный append
+        result = repo.append_operations([make_op(2), make_op(3)])
+
+        self.assertEqual(JournalRepo.appended_row_range(result), (3, 4))
+        self.assertEqual(
+            client.calls,
+            ["append", "properties", "update Журнал!A3:N4"],
+        )
+        self.assertEqual([row[7] for row in client.sheets["Журнал"][1:4]], [1, 2, 3])
+        self.assertIs(client.sheets["Журнал"][2][9], False)  # needs_review — флажок, а не строка
+
+    def test_edits_keep_the_types_of_appended_rows(self):
+        client = FakeSheetsClient(grid_rows=4)
+        repo = JournalRepo(client, "sheet-id", "Журнал")
+        repo.append_operations([make_op(1), make_op(2, status="pending")])
+
+        repo.update_date_and_month_key(row_index=2, op_date="2026-02-01", month_key="2026-02")
+        repo.update_amount(row_index=2, amount=2500)
+        repo.update_pending_category(row_index=3, category="Продукты", category_id="must_products")
+
+        sheet = client.sheets["Журнал"]
+        # Даты из /edit — тем же текстом ISO, что и при добавлении, а не датами USER_ENTERED
+        self.assertEqual((sheet[1][1], sheet[1][10], sheet[2][1]), ("2026-02-01", "2026-02", "2026-02-09"))
+        self.assertEqual(sheet[1][3], 2500)
+        self.assertIs(sheet[2][9], False)
+        self.assertEqual(set(client.input_options), {"RAW"})
+
+    def test_grows_grid_when_next_rows_do_not_fit(self):
+        client = FakeSheetsClient(grid_rows=3)
+        repo = JournalRepo(client, "sheet-id", "Журнал")
+        repo.append_operations([make_op(1), make_op(2)])
+        client.calls.clear()
+
+        repo.append_operation(make_op(3))
+
+        self.assertEqual(client.calls[:2], ["properties", "grow 500"])
+        self.assertEqual(client.calls[-1], "update Журнал!A4:N4")
+
+    def test_falls_back_to_append_on_conflict(self):
+        client = FakeSheetsClient(grid_rows=10)
+        repo = JournalRepo(client, "sheet-id", "Журнал", verify_next_rows=True)
+        repo.append_operation(make_op(1))
+        client.sheets["Журнал"][2] = ["добавлено руками"]
+        client.calls.clear()
+
+        result = repo.append_operation(make_op(2))
+
+        self.assertEqual(JournalRepo.appended_row_range(result), (4, 4))
+        self.assertEqual(client.calls[-1], "append")
+        self.assertEqual(client.sheets["Журнал"][2], ["добавлено руками"])
+
+        client.calls.clear()
+        repo.append_operation(make_op(3))
+        self.assertEqual(client.calls, ["get A4:N5", "update Журнал!A5:N5"])
+
+
+    def test_unexpected_updated_range_resets_counter_and_finds_rows_by_op_id(self):
+        client = _ShiftingSheetsClient(grid_rows=10)
+        repo = JournalRepo(client, "sheet-id", "Журнал")
+        repo.append_operation(make_op(1))
+        client.shift = 1  # строки легли на одну ниже, чем просили
+        client.calls.clear()
+
+        result = repo.append_operations([make_op(2), make_op(3)])
+
+        self.assertEqual(JournalRepo.appended_row_range(result), (4, 5))
+        self.assertEqual(client.calls, ["properties", "update Журнал!A3:N4", "column N"])
+        self.assertEqual(repo.find_op_row("op1-3"), 5)
+
+        client.shift = 0
+        client.calls.clear()
+        repo.append_operation(make_op(4))
+        self.assertEqual(client.calls[:1], ["append"])
+
+
+class _ShiftingSheetsClient(FakeSheetsClient):
+    """values.update пишет строки на shift ниже запрошенного диапазона и так и отвечает."""
+
+    shift = 0
+
+    def update_values(self, spreadsheet_id, range_name, rows, value_input_option="RAW"):
+        sheet_name, a1 = range_name.rsplit("!", 1)
+        first, last = (int(part[1:]) + self.shift for part in a1.split(":"))
+        self.calls.append(f"update {range_name}")
+        self.input_options.append(value_input_option)
+        self._write(f"{sheet_name}!A{first}:N{last}", rows)
+        return {"updatedRange": f"{sheet_name}!A{first}:N{last}", "updatedRows": len(rows)}
+
+
+if __name__ == "__main__":
+    unittest.main()
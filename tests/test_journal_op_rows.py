@@ -0,0 +1,33 @@
+import unittest
+
+from app.sheets.journal_repo import JournalRepo
+from app.sheets.sheet_layout import column_letter
+
+from journal_fakes import FakeSheetsClient, make_op
+
+
+class OpRowIndexTests(unittest.TestCase):
+    def test_op_id_column_is_n(self):
+        self.assertEqual(column_letter("op_id"), "N")
+        self.assertEqual(make_op(5).op_id, "op1-5")
+
+    def test_finds_row_after_manual_reorder(self):
+        client = FakeSheetsClient()
+        repo = JournalRepo(client, "sheet-id", "Журнал")
+        repo.append_operations([make_op(1), make_op(2), make_op(3)])
+
+        self.assertEqual(repo.find_op_row("op1-2"), 3)
+        self.assertEqual(client.requests, [["Журнал!N3:N3"]])
+
+        # Кто-то отсортировал лист руками
+        journal = client.sheets["Журнал"]
+        journal[1:] = list(reversed(journal[1:]))
+        client.requests.clear()
+        self.assertEqual(repo.find_op_row("op1-1"), 4)
+        self.assertEqual(client.requests, [["Журнал!N2:N2"], ["Журнал!N:N"]])
+        self.assertEqual(repo.find_op_row("op1-3"), 2)
+        self.assertIsNone(repo.find_op_row("op1-99"))
+
+
+if __name__ == "__main__":
+    unittest.main()
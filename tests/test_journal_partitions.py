@@ -0,0 +1,95 @@
+import unittest
+
+from app.sheets.journal_repo import JournalRepo
+from app.sheets.sheet_layout import JOURNAL_COLUMNS, partition_sheet_name
+
+from journal_fakes import FakeSheetsClient, make_op, split_range
+
+
+class JournalPartitionTests(unittest.TestCase):
+    def test_partition_names(self):
+        self.assertEqual(partition_sheet_name("Журнал", "year", "2026-02-09 10:00:00"), "Журнал 2026")
+        self.assertEqual(partition_sheet_name("Журнал", "month", "2026-02-09 10:00:00"), "Журнал 2026-02")
+        self.assertEqual(partition_sheet_name("Журнал", "none", "2026-02-09 10:00:00"), "Журнал")
+
+    def test_reads_latest_partition_and_rolls_over_on_append(self):
+        client = FakeSheetsClient(
+            {
+                "Журнал": [JOURNAL_COLUMNS],
+                "Журнал 2025": [JOURNAL_COLUMNS],
+                "Журнал 2026": [JOURNAL_COLUMNS],
+                "Категории": [["category_id"]],
+            }
+        )
+        repo = JournalRepo(client, "sheet-id", "Журнал", partition="year")
+        self.assertEqual(repo.list_partitions(), ["Журнал 2025", "Журнал 2026"])
+        self.assertEqual(repo.sheet_name, "Журнал 2026")
+
+        # Запоздавшая операция прошлого года пишется в текущую партицию
+        result = repo.append_operation(make_op(1, "2025-12-31 23:59:00"))
+        self.assertEqual(JournalRepo.appended_row_range(result), (2, 2))
+        self.assertEqual(len(client.sheets["Журнал 2026"]), 2)
+        self.assertEqual(repo.partition_epoch, 0)
+
+        result = repo.append_operations([make_op(2, "2026-12-31 23:59:00"), make_op(3, "2027-01-01 00:01:00")])
+        self.assertEqual(client.created, ["Журнал 2027"])
+        self.assertEqual(repo.sheet_name, "Журнал 2027")
+        self.assertEqual(repo.partition_epoch, 1)
+        self.assertEqual(JournalRepo.appended_row_range(result), (2, 3))
+
+    def test_full_history_reads_cover_all_partitions(self):
+        row_2025 = ["2025-05-01 10:00:00", "", "Кафе", 300, "кофе", "text", 1, 10, "ok", False, "", "", "cafe"]
+        row_2026 = ["2026-05-01 10:00:00", "", "Такси", 500, "такси", "text", 1, 11, "ok", False, "", "", "taxi"]
+        client = FakeSheetsClient(
+            {
+                "Журнал 2025": [JOURNAL_COLUMNS, row_2025],
+                "Журнал 2026": [JOURNAL_COLUMNS, row_2026],
+            }
+        )
+        repo = JournalRepo(client, "sheet-id", "Журнал", partition="year")
+
+        self.assertEqual(repo.list_labelled_examples(), [(1, "кофе", "cafe"), (1, "такси", "taxi")])
+
+    def test_pending_rows_of_previous_partition_stay_reachable(self):
+        def pending(created_at: str, mid: int) -> list:
+            return [created_at, created_at[:10], "", 300, "кофе", "text", 1, mid, "pending", True, "", "", "", f"op1-{mid}"]
+
+        client = FakeSheetsClient(
+            {
+                "Журнал 2024": [JOURNAL_COLUMNS, pending("2024-12-31 10:00:00", 9)],
+                "Журнал 2025": [JOURNAL_COLUMNS, pending("2025-12-31 23:50:00", 10)],
+                "Журнал 2026": [JOURNAL_COLUMNS],
+            }
+        )
+        repo = JournalRepo(client, "sheet-id", "Журнал", partition="year")
+
+        self.assertEqual(repo.pending_partitions(), ["Журнал 2025", "Журнал 2026"])
+        rows = repo.list_pending_rows()
+        self.assertEqual([(r.sheet_name, r.row_index, r.op_id) for r in rows], [("Журнал 2025", 2, "op1-10")])
+        self.assertEqual(repo.find_last_pending_row(1), ("Журнал 2025", 2))
+        # Партиции старше предыдущей не читаются
+        self.assertNotIn("Журнал 2024", {split_range(r)[0] for ranges in client.requests for r in ranges})
+
+        self.assertEqual(repo.resolve_pending_op("op1-10", "Кафе", "cafe", row_hint=2, sheet_name="Журнал 2025"), 2)
+        self.assertEqual(client.sheets["Журнал 2025"][1][2], "Кафе")
+        self.assertEqual(len(client.sheets["Журнал 2026"]), 1)
+
+    def test_duplicates_are_found_in_previous_partition(self):
+        client = FakeSheetsClient({"Журнал 2026": [JOURNAL_COLUMNS]})
+        repo = JournalRepo(client, "sheet-id", "Журнал", partition="year")
+        repo.append_operation(make_op(1, "2026-12-31 23:59:00"))
+        repo.append_operation(make_op(2, "2027-01-01 00:01:00"))
+        self.assertEqual(repo.sheet_name, "Журнал 2027")
+
+        # Повтор пачки из outbox после перехода: строка op1-1 уже лежит в прошлогоднем листе
+        self.assertEqual(repo.find_existing_op_ids({"op1-1", "op1-2", "op1-3"}), {"op1-1", "op1-2"})
+        self.assertTrue(repo.is_duplicate("op1-1"))
+
+        client.requests.clear()
+        self.assertTrue(repo.is_duplicate("op1-2"))
+        # Нашлось в активной партиции — предыдущая не читается
+        self.assertNotIn("Журнал 2026", {split_range(r)[0] for ranges in client.requests for r in ranges})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+
+from app.sheets.category_repo import CategoryRepo
+from app.sheets.journal_repo import JournalRepo
+from app.sheets.sheet_layout import STATUS_PENDING
+
+from journal_fakes import FakeSheetsClient
+
+
+def _journal_row(user: int, mid: int, status: str, comment: str, category_id: str) -> list:
+    return [
+        "2026-02-09 10:00:00", "2026-02-09", "Кафе", 300, comment, "text", user, mid,
+        status, "FALSE", "2026-02", "", category_id, f"op{user}-{mid}",
+    ]
+
+
+class JournalRepoReadsTests(unittest.TestCase):
+    def setUp(self):
+        self.client = FakeSheetsClient(
+            {
+                "Журнал": [
+                    ["header"] * 14,
+                    _journal_row(1, 10, "ok", "кофе", "cafe"),
+                    _journal_row(2, 11, "pending", "обед", ""),
+                    _journal_row(1, 12, "canceled", "такси", "taxi"),
+                    _journal_row(1, 13, "pending", "ужин", ""),
+                ],
+                "Категории": [
+                    ["category_id", "name", "section", "order", "is_active"],
+                    ["cafe", "Кафе", "want", 10, True],
+                    ["taxi", "Такси", "want", 20, False],
+                ],
+            }
+        )
+        self.repo = JournalRepo(self.client, "sheet-id", "Журнал")
+
+    def test_reads_only_needed_columns_page_by_page(self):
+        self.assertEqual(self.repo.list_labelled_examples(), [(1, "кофе", "cafe")])
+        self.assertEqual(self.repo.find_last_pending_row(1), ("Журнал", 5))
+        self.assertEqual(
+            self.client.requests,
+            [
+                ["Журнал!E2:E501", "Журнал!G2:G501", "Журнал!I2:I501", "Журнал!M2:M501"],
+                ["Журнал!E502:E1001", "Журнал!G502:G1001", "Журнал!I502:I1001", "Журнал!M502:M1001"],
+                ["Журнал!G2:G5", "Журнал!I2:I5"],
+            ],
+        )
+
+    def test_reverse_iteration_reads_only_tail_pages(self):
+        journal = self.client.sheets["Журнал"]
+        journal.extend(_journal_row(3, 100 + i, "ok", "шум", "cafe") for i in range(20))
+        journal.append(_journal_row(1, 200, "ok", "кофе", "cafe"))
+        self.client.resize("Журнал", 40)  # пустые строки в конце сетки
+
+        rows = list(self.repo.iter_rows(page_size=10, columns=("tg_user_id",)))
+        self.assertEqual([r.row_index for r in rows], list(range(2, 27)))
+
+        self.client.requests.clear()
+        newest = next(
+            r for r in self.repo.iter_rows_reverse(page_size=10, columns=("tg_user_id",)) if r.tg_user_id == 1
+        )
+        self.assertEqual(newest.row_index, 26)
+        self.assertEqual(self.client.requests, [["Журнал!G31:G40"], ["Журнал!G21:G30"]])
+
+    def test_pending_rows_are_decoded(self):
+        rows = self.repo.list_pending_rows()
+        self.assertEqual([(r.row_index, r.tg_message_id, r.status) for r in rows], [(3, 11, STATUS_PENDING), (5, 13, STATUS_PENDING)])
+
+    def test_last_rows_skip_canceled_and_keep_op_id(self):
+        rows = self.repo.list_last_rows_for_user(1, limit=5)
+        self.assertEqual(
+            rows,
+            [(5, "2026-02-09 · Кафе · 300", "op1-13"), (2, "2026-02-09 · Кафе · 300", "op1-10")],
+        )
+
+    def test_row_and_categories_in_one_request(self):
+        categories_repo = CategoryRepo(self.client, "sheet-id")
+        row, categories = self.repo.get_row_and_categories(3, categories_repo)
+
+        self.assertEqual((row.row_index, row.comment_raw, row.tg_user_id), (3, "обед", 2))
+        self.assertEqual([c.category_id for c in categories], ["cafe"])
+        self.assertEqual(len(self.client.requests), 1)
+        self.assertEqual(categories_repo.get_cached_name("cafe"), "Кафе")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+
+from app.llm.json_repair import JsonRepairError, extract_json_object
+from app.llm.json_stream import JsonObjectScanner
+from app.services.gpt_parse_service import OPERATION_SCHEMA
+
+
+class ExtractJsonObjectTests(unittest.TestCase):
+    def test_plain_json(self):
+        self.assertEqual(extract_json_object('{"amount": 5}'), {"amount": 5})
+
+    def test_code_fence_and_prose(self):
+        content = 'Вот ответ:\n```json\n{"op_date": "2026-02-09", "amount": 3000}\n```\nГотово.'
+        self.assertEqual(
+            extract_json_object(content),
+            {"op_date": "2026-02-09", "amount": 3000},
+        )
+
+    def test_trailing_comma_single_quotes_and_python_literals(self):
+        content = "{'category': 'must_products', needs_review: False, 'amount': 10,}"
+        self.assertEqual(
+            extract_json_object(content),
+            {"category": "must_products", "needs_review": False, "amount": 10},
+        )
+
+    def test_truncated_object_is_closed(self):
+        content = '{"op_date": "2026-02-09", "amount": 3000, "category": "must_pro'
+        self.assertEqual(extract_json_object(content)["category"], "must_pro")
+
+    def test_schema_mismatch_raises(self):
+        with self.assertRaises(JsonRepairError):
+            extract_json_object('{"amount": 5}', OPERATION_SCHEMA)
+
+    def test_no_object_raises(self):
+        with self.assertRaises(JsonRepairError):
+            extract_json_object("не знаю")
+
+
+class JsonObjectScannerTests(unittest.TestCase):
+    def test_returns_object_when_closing_brace_arrives(self):
+        scanner = JsonObjectScanner()
+        self.assertIsNone(scanner.feed('ok {"a": "x}'))
+        self.assertIsNone(scanner.feed('y", "b": {"c": 1}'))
+        self.assertEqual(scanner.feed("} trailing"), '{"a": "x}y", "b": {"c": 1}}')
+
+
+if __name__ == "__main__":
+    unittest.main()
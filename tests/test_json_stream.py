@@ -0,0 +1,113 @@
+import json
+import unittest
+
+import httpx
+
+from app.llm.client import LLMClient
+from app.llm.json_stream import read_json_text_from_sse
+
+
+def _event(content: str) -> str:
+    return "data: " + json.dumps({"choices": [{"delta": {"content": content}}]}, ensure_ascii=False)
+
+
+class _Lines:
+    """Асинхронный источник строк SSE; считает, сколько строк у него забрали."""
+
+    def __init__(self, lines: list[str]):
+        self.lines = lines
+        self.consumed = 0
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> str:
+        if self.consumed >= len(self.lines):
+            raise StopAsyncIteration
+        line = self.lines[self.consumed]
+        self.consumed += 1
+        return line
+
+
+class _ChunkStream(httpx.AsyncByteStream):
+    def __init__(self, chunks: list[bytes]):
+        self.chunks = chunks
+        self.sent = 0
+        self.closed = False
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            self.sent += 1
+            yield chunk
+
+    async def aclose(self) -> None:
+        self.closed = True
+
+
+class ReadJsonTextFromSseTests(unittest.IsolatedAsyncioTestCase):
+    async def test_ignores_non_data_lines_and_joins_split_object(self):
+        lines = _Lines(
+            [
+                ": keep-alive",
+                "event: message",
+                "",
+                'data:{"choices": [{"delta": {"role": "assistant"}}]}',
+                "data: not json",
+                _event('{"amount": 5'),
+                _event('00, "comment": "скобки }{ в '),
+                _event('строке \\" тоже"}'),
+            ]
+        )
+
+        text = await read_json_text_from_sse(lines)
+
+        self.assertEqual(json.loads(text), {"amount": 500, "comment": 'скобки }{ в строке " тоже'})
+
+    async def test_skips_events_that_are_not_objects(self):
+        lines = _Lines(
+            [
+                'data: ["choices"]',
+                'data: "text"',
+                'data: {"choices": ["x"]}',
+                'data: {"choices": [{"delta": ["x"]}]}',
+                _event('{"amount": 5}'),
+            ]
+        )
+        self.assertEqual(await read_json_text_from_sse(lines), '{"amount": 5}')
+
+    async def test_done_before_object_closes_returns_accumulated_text(self):
+        lines = _Lines([_event('{"amount": 1'), "data: [DONE]", _event("}")])
+
+        text = await read_json_text_from_sse(lines)
+
+        self.assertEqual(text, '{"amount": 1')
+        self.assertEqual(lines.consumed, 2)
+
+    async def test_stops_reading_once_object_closes(self):
+        lines = _Lines([_event('{"a": {"b": 1}}'), _event(" лишний текст"), "data: [DONE]"])
+
+        self.assertEqual(await read_json_text_from_sse(lines), '{"a": {"b": 1}}')
+        self.assertEqual(lines.consumed, 1)
+
+    async def test_client_closes_stream_without_reading_tail(self):
+        body = [
+            (_event('{"amount": ') + "\n\n").encode(),
+            (_event("300}") + "\n\n").encode(),
+            (_event("хвост, который не нужен") + "\n\n").encode(),
+            b"data: [DONE]\n\n",
+        ]
+        stream = _ChunkStream(body)
+        transport = httpx.MockTransport(lambda request: httpx.Response(200, stream=stream))
+
+        async with httpx.AsyncClient(transport=transport) as client:
+            text = await LLMClient._stream_content(
+                LLMClient.__new__(LLMClient), client, "http://llm.test/v1/chat/completions", {}, {}
+            )
+
+        self.assertEqual(text, '{"amount": 300}')
+        self.assertTrue(stream.closed)
+        self.assertLess(stream.sent, len(body))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import asyncio
+import unittest
+
+from app.llm.scheduler import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_TEXT,
+    PRIORITY_VOICE,
+    RateLimiter,
+    RequestScheduler,
+    SchedulerOverloadedError,
+)
+
+
+class RequestSchedulerTest(unittest.TestCase):
+    def test_released_slot_goes_to_highest_priority(self) -> None:
+        async def scenario() -> list[str]:
+            scheduler = RequestScheduler(max_in_flight=1)
+            order: list[str] = []
+            gate = asyncio.Event()
+
+            async def job(name: str, priority: int, hold: bool = False) -> None:
+                async with scheduler.slot(priority):
+                    order.append(name)
+                    if hold:
+                        await gate.wait()
+
+            first = asyncio.create_task(job("first", PRIORITY_TEXT, hold=True))
+            await asyncio.sleep(0)
+            others = [
+                asyncio.create_task(job("background", PRIORITY_BACKGROUND)),
+                asyncio.create_task(job("voice", PRIORITY_VOICE)),
+                asyncio.create_task(job("text", PRIORITY_TEXT)),
+            ]
+            await asyncio.sleep(0)
+            self.assertEqual(scheduler.queue_depth(), 3)
+
+            gate.set()
+            await asyncio.gather(first, *others)
+            self.assertEqual(scheduler.in_flight, 0)
+            return order
+
+        self.assertEqual(asyncio.run(scenario()), ["first", "text", "voice", "background"])
+
+    def test_full_queue_sheds_request(self) -> None:
+        async def scenario() -> None:
+            scheduler = RequestScheduler(max_in_flight=1, max_queue={PRIORITY_BACKGROUND: 1})
+            gate = asyncio.Event()
+
+            async def hold() -> None:
+                async with scheduler.slot(PRIORITY_TEXT):
+                    await gate.wait()
+
+            async def background() -> None:
+                async with scheduler.slot(PRIORITY_BACKGROUND):
+                    pass
+
+            holder = asyncio.create_task(hold())
+            await asyncio.sleep(0)
+            queued = asyncio.create_task(background())
+            await asyncio.sleep(0)
+
+            with self.assertRaises(SchedulerOverloadedError):
+                await background()
+            self.assertEqual(scheduler.stats[PRIORITY_BACKGROUND].shed, 1)
+
+            gate.set()
+            await asyncio.gather(holder, queued)
+
+        asyncio.run(scenario())
+
+    def test_cancelled_waiter_does_not_leak_slot(self) -> None:
+        async def scenario() -> None:
+            scheduler = RequestScheduler(max_in_flight=1)
+            gate = asyncio.Event()
+
+            async def hold() -> None:
+                async with scheduler.slot(PRIORITY_TEXT):
+                    await gate.wait()
+
+            holder = asyncio.create_task(hold())
+            await asyncio.sleep(0)
+            waiter = asyncio.create_task(hold())
+            await asyncio.sleep(0)
+            waiter.cancel()
+            gate.set()
+            await holder
+            with self.assertRaises(asyncio.CancelledError):
+                await waiter
+            self.assertEqual(scheduler.in_flight, 0)
+
+        asyncio.run(scenario())
+
+
+class RateLimiterTest(unittest.TestCase):
+    def test_rpm_and_tpm_delays(self) -> None:
+        now = [0.0]
+        limiter = RateLimiter(rpm=2, tpm=1000, clock=lambda: now[0])
+        limiter._events.extend([(0.0, 100), (10.0, 100)])
+
+        self.assertEqual(limiter._delay(100, 20.0), 40.0)  # третий запрос за минуту
+        limiter._events.popleft()
+        self.assertEqual(limiter._delay(950, 20.0), 50.0)  # не хватает токенов до истечения (10, 100)
+        self.assertEqual(limiter._delay(100, 20.0), 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
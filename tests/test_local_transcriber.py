@@ -0,0 +1,73 @@
+import asyncio
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from unittest import mock
+
+from app.services import local_transcriber
+from app.services.local_transcriber import LocalWhisperTranscriber
+from app.services.transcribe_service import TranscribeResult
+
+
+class _FakeModel:
+    def __init__(self, text: str = "", fail: bool = False):
+        self.text = text
+        self.fail = fail
+
+    def transcribe(self, file_path, **kwargs):
+        if self.fail:
+            raise RuntimeError("model crashed")
+        segments = [SimpleNamespace(text=f" {word}") for word in self.text.split()]
+        return iter(segments), SimpleNamespace(duration_after_vad=1.5 if self.text else 0.0)
+
+
+class _FakeRemote:
+    def __init__(self) -> None:
+        self.calls: list[str] = []
+
+    async def transcribe_ogg(self, file_path, priority=1, tg_user_id=0, audio_seconds=0.0):
+        self.calls.append(file_path)
+        return TranscribeResult(text="remote")
+
+
+def _transcriber(remote: _FakeRemote, max_seconds: float = 60.0) -> LocalWhisperTranscriber:
+    # Пул потоков вместо процессов: модель подменяется в глобале модуля.
+    transcriber = LocalWhisperTranscriber.__new__(LocalWhisperTranscriber)
+    transcriber.model_name = "fake"
+    transcriber.max_seconds = max_seconds
+    transcriber.fallback = remote
+    transcriber.usage_store = None
+    transcriber._pool = ThreadPoolExecutor(max_workers=1)
+    return transcriber
+
+
+class LocalWhisperTranscriberTest(unittest.TestCase):
+    def test_transcribes_locally(self) -> None:
+        remote = _FakeRemote()
+        with mock.patch.object(local_transcriber, "_MODEL", _FakeModel("кофе 200")):
+            result = asyncio.run(_transcriber(remote).transcribe_ogg("a.ogg", audio_seconds=3))
+
+        self.assertEqual(result.text, "кофе 200")
+        self.assertFalse(result.silent)
+        self.assertEqual(remote.calls, [])
+
+    def test_long_notes_and_errors_go_to_remote(self) -> None:
+        remote = _FakeRemote()
+        transcriber = _transcriber(remote, max_seconds=30)
+        with mock.patch.object(local_transcriber, "_MODEL", _FakeModel(fail=True)):
+            long_result = asyncio.run(transcriber.transcribe_ogg("long.ogg", audio_seconds=90))
+            failed_result = asyncio.run(transcriber.transcribe_ogg("short.ogg", audio_seconds=5))
+
+        self.assertEqual(long_result.text, "remote")
+        self.assertEqual(failed_result.text, "remote")
+        self.assertEqual(remote.calls, ["long.ogg", "short.ogg"])
+
+    def test_silence_is_reported(self) -> None:
+        with mock.patch.object(local_transcriber, "_MODEL", _FakeModel("")):
+            result = asyncio.run(_transcriber(_FakeRemote()).transcribe_ogg("a.ogg", audio_seconds=3))
+
+        self.assertTrue(result.silent)
+
+
+if __name__ == "__main__":
+    unittest.main()
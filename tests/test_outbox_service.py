@@ -0,0 +1,169 @@
+import asyncio
+import dataclasses
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from app.models.operation import Operation
+from app.services.outbox_service import OperationOutbox, OutboxReplayer
+
+from journal_fakes import make_op
+
+
+class _FakeJournalRepo:
+    def __init__(self, existing=None, fail: bool = False, bad_ids=()):
+        self.existing = set(existing or [])
+        self.fail = fail
+        self.bad_ids = set(bad_ids)  # строки, которые Sheets не принимает никогда
+        self.appended: list[list[Operation]] = []
+        self.partition_epoch = 0
+
+    def find_existing_op_ids(self, op_ids):
+        if self.fail:
+            raise RuntimeError("sheets down")
+        return {op_id for op_id in op_ids if op_id in self.existing}
+
+    def append_operations(self, ops):
+        if any(op.tg_message_id in self.bad_ids for op in ops):
+            raise RuntimeError("exceeds grid limits")
+        self.appended.append(list(ops))
+        self.existing.update(op.op_id for op in ops)
+
+
+class OutboxTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.outbox = OperationOutbox(os.path.join(self._tmp.name, "outbox.sqlite3"))
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_record_is_idempotent_by_op_id(self):
+        self.assertTrue(self.outbox.record(make_op(1)))
+        self.assertFalse(self.outbox.record(make_op(1)))
+        self.assertTrue(self.outbox.contains("op1-1"))
+        self.assertEqual(self.outbox.unsent_count(), 1)
+
+    async def test_same_message_id_of_two_users_is_kept(self):
+        self.assertTrue(self.outbox.record(make_op(1, tg_user_id=1)))
+        self.assertTrue(self.outbox.record(make_op(1, tg_user_id=2)))
+        self.assertFalse(self.outbox.contains("op3-1"))
+        repo = _FakeJournalRepo()
+
+        self.assertTrue(await OutboxReplayer(self.outbox, repo).flush())
+        self.assertEqual([op.op_id for batch in repo.appended for op in batch], ["op1-1", "op2-1"])
+
+    def test_old_outbox_keyed_by_message_id_is_migrated(self):
+        path = os.path.join(self._tmp.name, "old.sqlite3")
+        conn = sqlite3.connect(path)
+        conn.execute(
+            """
+            CREATE TABLE operations (
+                tg_message_id INTEGER PRIMARY KEY, payload TEXT NOT NULL, recorded_at TEXT NOT NULL,
+                sent_at TEXT, attempts INTEGER NOT NULL DEFAULT 0, last_error TEXT NOT NULL DEFAULT ''
+            )
+            """
+        )
+        for mid, sent_at in ((1, "2026-02-09 10:00:01"), (2, None)):
+            payload = json.dumps(dataclasses.asdict(make_op(mid, tg_user_id=5)), ensure_ascii=False)
+            conn.execute(
+                "INSERT INTO operations (tg_message_id, payload, recorded_at, sent_at) VALUES (?, ?, ?, ?)",
+                (mid, payload, "2026-02-09 10:00:00", sent_at),
+            )
+        conn.commit()
+        conn.close()
+
+        outbox = OperationOutbox(path)
+
+        self.assertTrue(outbox.contains("op5-1"))
+        self.assertEqual(outbox.fetch_unsent(10), [make_op(2, tg_user_id=5)])
+        self.assertTrue(outbox.record(make_op(2, tg_user_id=6)))
+
+    def test_fetch_unsent_roundtrips_operation(self):
+        self.outbox.record(make_op(7, status="pending"))
+        ops = self.outbox.fetch_unsent(10)
+        self.assertEqual(len(ops), 1)
+        self.assertEqual(ops[0], make_op(7, status="pending"))
+
+    async def test_flush_skips_rows_already_in_sheet(self):
+        for mid in (1, 2, 3):
+            self.outbox.record(make_op(mid))
+        repo = _FakeJournalRepo(existing={"op1-2"})
+        replayer = OutboxReplayer(self.outbox, repo, batch_size=2)
+
+        self.assertTrue(await replayer.flush())
+
+        appended_ids = [op.tg_message_id for batch in repo.appended for op in batch]
+        self.assertEqual(appended_ids, [1, 3])
+        self.assertEqual(self.outbox.unsent_count(), 0)
+
+    async def test_failed_drain_keeps_operations(self):
+        self.outbox.record(make_op(1))
+        replayer = OutboxReplayer(self.outbox, _FakeJournalRepo(fail=True))
+
+        self.assertFalse(await replayer.flush())
+        self.assertEqual(self.outbox.unsent_count(), 1)
+
+    async def test_bad_row_is_parked_without_blocking_others(self):
+        outbox = OperationOutbox(os.path.join(self._tmp.name, "parked.sqlite3"), max_attempts=2)
+        for mid in (1, 2, 3):
+            outbox.record(make_op(mid))
+        repo = _FakeJournalRepo(bad_ids={1})
+        replayer = OutboxReplayer(outbox, repo, batch_size=10, interval_s=0)
+
+        for _ in range(4):
+            await replayer.flush()
+
+        self.assertEqual([op.tg_message_id for batch in repo.appended for op in batch], [2, 3])
+        self.assertEqual(outbox.parked_count(), 1)
+        self.assertEqual(outbox.fetch_unsent(10), [])
+        self.assertEqual(outbox.requeue_parked(), 1)
+        self.assertEqual([op.tg_message_id for op in outbox.fetch_unsent(10)], [1])
+
+    def test_failed_operation_waits_for_retry_at(self):
+        self.outbox.record(make_op(1))
+        now = datetime(2026, 2, 9, 10, 0, 0)
+        self.outbox.mark_failed(["op1-1"], "boom", base_delay_s=10, now=now)
+        self.outbox.mark_failed(["op1-1"], "boom", base_delay_s=10, now=now)
+
+        self.assertEqual(self.outbox.fetch_unsent(10, now=now + timedelta(seconds=19)), [])
+        self.assertEqual(len(self.outbox.fetch_unsent(10, now=now + timedelta(seconds=20))), 1)
+
+    async def test_run_survives_flush_errors(self):
+        replayer = OutboxReplayer(self.outbox, _FakeJournalRepo(), interval_s=0.01)
+        calls = 0
+
+        async def flaky_flush():
+            nonlocal calls
+            calls += 1
+            if calls == 1:
+                raise sqlite3.OperationalError("database is locked")
+            return True
+
+        replayer.flush = flaky_flush
+        task = asyncio.create_task(replayer.run())
+        while calls < 3:
+            await asyncio.sleep(0.01)
+        self.assertFalse(task.done())  # ошибка первой итерации не завершила реплеер
+        task.cancel()
+
+    async def test_resolve_pending_updates_unsent_operation(self):
+        self.outbox.record(make_op(5, status="pending"))
+        self.outbox.record(make_op(6))
+        replayer = OutboxReplayer(self.outbox, _FakeJournalRepo())
+
+        self.assertIsNone(await replayer.resolve_pending("op2-5", "Кафе", "cafe"))  # то же сообщение в чужом чате
+        op = await replayer.resolve_pending("op1-5", "Кафе", "cafe")
+        self.assertEqual((op.status, op.category, op.category_id), ("ok", "Кафе", "cafe"))
+        self.assertIsNone(await replayer.resolve_pending("op1-6", "Кафе", "cafe"))  # не pending
+
+        await replayer.flush()
+        self.assertIsNone(await replayer.resolve_pending("op1-5", "Кафе", "cafe"))  # уже в Sheets
+        self.assertEqual(self.outbox.fetch_unsent(10), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
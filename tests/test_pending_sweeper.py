@@ -0,0 +1,164 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from app.models.operation import Operation
+from app.services.alias_service import AliasStore
+from app.services.pending_index import PendingIndex
+from app.services.pending_sweeper import PendingSweeper
+from app.sheets.category_repo import Category
+from app.sheets.journal_repo import JournalRepo
+from app.sheets.sheet_layout import JOURNAL_COLUMNS
+
+from journal_fakes import FakeSheetsClient
+
+
+def _row(mid: int, comment: str, amount: str = "300", user: str = "1") -> list:
+    return [
+        "2026-02-01 10:00:00", "2026-02-01", "", amount, comment, "text", user, str(mid),
+        "pending", True, "2026-02", "", "", f"op{user}-{mid}",
+    ]
+
+
+def _journal(rows: list[list]) -> tuple[FakeSheetsClient, JournalRepo]:
+    client = FakeSheetsClient({"Журнал": [list(JOURNAL_COLUMNS), *rows]})
+    return client, JournalRepo(client, "sheet-id", "Журнал")
+
+
+class _FakeCategoryRepo:
+    def list_active_or_cached(self):
+        return [
+            Category("must_products", "Продукты", "must", 1, True),
+            Category("must_transport", "Транспорт", "must", 2, True),
+        ]
+
+
+class _FakeLLM:
+    def __init__(self, on_call=None):
+        self.calls = 0
+        self.on_call = on_call  # что "происходит с таблицей", пока LLM думает
+
+    def is_available(self) -> bool:
+        return True
+
+    async def chat_json(self, system, user, tier, schema=None, priority=None):
+        self.calls += 1
+        if self.on_call is not None:
+            self.on_call()
+        items = []
+        for line in user.splitlines():
+            item_id, text = line.split(": ", 1)
+            items.append({"id": int(item_id), "category": "must_transport" if "такси" in text else ""})
+        return {"items": items}
+
+
+class PendingIndexTest(unittest.TestCase):
+    def test_add_appended_uses_row_range(self) -> None:
+        index = PendingIndex()
+        index.load([])
+        ops = [
+            Operation("2026-02-01 10:00:00", "2026-02-01", "", 300, "такси", "text", 1, 10, "pending", "TRUE", "2026-02"),
+            Operation("2026-02-01 10:00:00", "2026-02-01", "Продукты", 500, "хлеб", "text", 1, 11, "ok", "FALSE", "2026-02"),
+        ]
+        result = {"updates": {"updatedRange": "'Журнал 2026'!A15:M16"}}
+        index.add_appended(ops, JournalRepo.appended_row_range(result), JournalRepo.appended_sheet_name(result))
+
+        self.assertEqual(index.last_row_for_user(1).key, ("Журнал 2026", 15))
+        self.assertNotIn(("Журнал 2026", 16), index)
+
+        # Новая партиция: строки прежнего листа остаются в индексе под своим листом
+        index.add_appended(ops[:1], (2, 2), "Журнал 2027")
+        self.assertIn(("Журнал 2026", 15), index)
+        self.assertEqual(index.last_row_for_user(1).key, ("Журнал 2027", 2))
+
+        index.add_appended(ops, None, None)
+        self.assertFalse(index.loaded)
+
+
+class PendingSweeperTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.aliases = AliasStore(os.path.join(self.tmp.name, "aliases.sqlite3"))
+        self.aliases.learn(1, "пятёрочка", "must_products")
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def _sweeper(self, journal: JournalRepo, llm: _FakeLLM, index: PendingIndex, notify=None) -> PendingSweeper:
+        return PendingSweeper(
+            index, journal, _FakeCategoryRepo(), llm=llm, alias_store=self.aliases, notifier=notify, min_age_s=0
+        )
+
+    def test_sweep_resolves_in_one_batch_and_sends_digest(self) -> None:
+        client, journal = _journal(
+            [_row(10, "пятёрочка"), _row(11, "такси"), _row(12, "непонятно"), _row(13, "такси", amount="0")]
+        )
+        llm = _FakeLLM()
+        digests: list[tuple[int, str]] = []
+
+        async def notify(tg_user_id: int, text: str) -> None:
+            digests.append((tg_user_id, text))
+
+        index = PendingIndex()
+        resolved = asyncio.run(self._sweeper(journal, llm, index, notify).sweep_once())
+
+        self.assertEqual(resolved, 2)
+        self.assertEqual(llm.calls, 1)
+        sheet = client.sheets["Журнал"]
+        self.assertEqual(
+            [(r[2], r[8], r[12]) for r in sheet[1:3]],
+            [("Продукты", "ok", "must_products"), ("Транспорт", "ok", "must_transport")],
+        )
+        self.assertEqual(sheet[3][8], "pending")
+        self.assertEqual(sum(call.startswith("batch_update") for call in client.calls), 1)
+        self.assertEqual(sorted(r for r in (2, 3, 4, 5) if ("Журнал", r) in index), [4, 5])
+        self.assertEqual(len(digests), 1)
+        self.assertIn("(2)", digests[0][1])
+
+    def test_rows_moved_during_llm_call_are_not_overwritten(self) -> None:
+        client, journal = _journal([_row(10, "такси"), _row(11, "такси"), _row(12, "обед в кафе")])
+        sheet = client.sheets["Журнал"]
+
+        def sort_sheet_by_hand() -> None:
+            sheet[1:] = [sheet[3], sheet[2], sheet[1]]
+
+        index = PendingIndex()
+        resolved = asyncio.run(self._sweeper(journal, _FakeLLM(on_call=sort_sheet_by_hand), index).sweep_once())
+
+        # Строка 3 осталась за сообщением 11; строки 2 и 4 теперь чужие — их не трогаем
+        self.assertEqual(resolved, 1)
+        self.assertEqual(
+            [(r[7], r[8], r[2]) for r in sheet[1:]],
+            [("12", "pending", ""), ("11", "ok", "Транспорт"), ("10", "pending", "")],
+        )
+        self.assertFalse(index.loaded)
+
+    def test_previous_partition_rows_are_resolved_after_rollover(self) -> None:
+        client = FakeSheetsClient(
+            {
+                "Журнал 2025": [list(JOURNAL_COLUMNS), _row(10, "такси")],
+                "Журнал 2026": [list(JOURNAL_COLUMNS), _row(11, "такси")],
+            }
+        )
+        journal = JournalRepo(client, "sheet-id", "Журнал", partition="year")
+
+        def roll_over() -> None:
+            journal.append_operation(
+                Operation("2027-01-01 00:01:00", "2027-01-01", "Продукты", 500, "хлеб", "text", 1, 12, "ok", "FALSE", "2027-01")
+            )
+
+        index = PendingIndex()
+        resolved = asyncio.run(self._sweeper(journal, _FakeLLM(on_call=roll_over), index).sweep_once())
+
+        # Журнал перешёл на 2027 посреди разбора, но строки 2025 и 2026 записаны каждая в свой лист
+        self.assertEqual(journal.sheet_name, "Журнал 2027")
+        self.assertEqual(resolved, 2)
+        self.assertEqual(client.sheets["Журнал 2025"][1][2], "Транспорт")
+        self.assertEqual(client.sheets["Журнал 2026"][1][2], "Транспорт")
+        self.assertEqual(len(index), 0)
+        self.assertTrue(index.loaded)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+import asyncio
+import unittest
+
+from app.config import LLMProviderConfig
+from app.llm.providers import TIER_FAST, TIER_STRONG, NoProviderAvailableError, ProviderPool
+from app.llm.scheduler import RequestScheduler
+
+
+def _pool(*names: str, fast_model: str = "") -> ProviderPool:
+    return ProviderPool.from_configs(
+        [
+            LLMProviderConfig(name=n, base_url=f"https://{n}/v1", api_key="k", model="m", fast_model=fast_model)
+            for n in names
+        ],
+        hedge_min_delay_s=0.01,
+        hedge_default_delay_s=0.05,
+    )
+
+
+class ProviderPoolTests(unittest.IsolatedAsyncioTestCase):
+    async def test_hedges_slow_primary_and_cancels_loser(self):
+        pool = _pool("slow", "fast")
+        cancelled = []
+
+        async def fn(provider):
+            try:
+                await asyncio.sleep(1.0 if provider.name == "slow" else 0.01)
+            except asyncio.CancelledError:
+                cancelled.append(provider.name)
+                raise
+            return provider.name
+
+        self.assertEqual(await pool.call(fn), "fast")
+        await asyncio.sleep(0)
+        self.assertEqual(cancelled, ["slow"])
+
+    async def test_cancelled_slow_loser_raises_p95(self):
+        pool = _pool("slow", "fast")
+        slow = pool.providers[0]
+        for _ in range(5):
+            slow.stats.record(0.01, ok=True)  # p95 -> hedge_min_delay_s
+
+        async def fn(provider):
+            await asyncio.sleep(0.2 if provider.name == "slow" else 0.001)
+            return provider.name
+
+        self.assertEqual(await pool.call(fn), "fast")
+        await asyncio.sleep(0)
+
+        self.assertEqual(slow.stats.samples, 6)
+        self.assertGreaterEqual(slow.stats.percentile(1.0), pool.hedge_min_delay_s)
+        self.assertEqual(slow.stats.error_rate(), 0.0)
+        # Резервный ответил первым — его время обычное, не цензурированное
+        self.assertEqual(pool.providers[1].stats.samples, 1)
+
+    async def test_hedge_takes_its_own_scheduler_slot(self):
+        pool = _pool("slow", "fast")
+        scheduler = RequestScheduler(max_in_flight=2)
+        in_flight = []
+
+        async def fn(provider):
+            in_flight.append(scheduler.in_flight)
+            await asyncio.sleep(1.0 if provider.name == "slow" else 0.01)
+            return provider.name
+
+        async with scheduler.slot():
+            self.assertEqual(await pool.call(fn, scheduler=scheduler), "fast")
+            self.assertEqual(in_flight, [1, 2])
+            self.assertEqual(scheduler.in_flight, 1)
+        self.assertEqual(scheduler.in_flight, 0)
+
+    async def test_no_hedge_without_free_slot(self):
+        pool = _pool("slow", "fast")
+        scheduler = RequestScheduler(max_in_flight=1)
+        called = []
+
+        async def fn(provider):
+            called.append(provider.name)
+            await asyncio.sleep(0.1 if provider.name == "slow" else 0.01)
+            return provider.name
+
+        async with scheduler.slot():
+            self.assertEqual(await pool.call(fn, scheduler=scheduler), "slow")
+        self.assertEqual(called, ["slow"])
+        self.assertEqual(scheduler.in_flight, 0)
+
+    async def test_failed_primary_falls_through_without_waiting(self):
+        pool = _pool("broken", "ok")
+
+        async def fn(provider):
+            if provider.name == "broken":
+                raise RuntimeError("500")
+            return provider.name
+
+        self.assertEqual(await pool.call(fn), "ok")
+        self.assertEqual(pool.ordered()[0].name, "ok")
+
+    async def test_all_breakers_open_raises(self):
+        pool = _pool("a")
+        for _ in range(pool.providers[0].breaker.failure_threshold):
+            pool.providers[0].breaker.record_failure("down")
+
+        async def fn(provider):
+            return provider.name
+
+        with self.assertRaises(NoProviderAvailableError):
+            await pool.call(fn)
+
+    async def test_fast_tier_keeps_its_own_stats_and_breaker(self):
+        pool = _pool("a", fast_model="m-mini")
+        provider = pool.providers[0]
+
+        async def fn(provider):
+            return provider.name
+
+        for _ in range(6):
+            await pool.call(fn, tier=TIER_FAST)
+
+        self.assertEqual(provider.fast_stats.samples, 6)
+        self.assertEqual(provider.stats.samples, 0)
+        self.assertEqual(pool.hedge_delay(provider, TIER_STRONG), pool.hedge_default_delay_s)
+
+        for _ in range(provider.fast_breaker.failure_threshold):
+            provider.fast_breaker.record_failure("down")
+        self.assertFalse(pool.has_fast_tier())
+        self.assertEqual(await pool.call(fn, tier=TIER_STRONG), "a")
+        with self.assertRaises(NoProviderAvailableError):
+            await pool.call(fn, tier=TIER_FAST)
+
+    async def test_fast_tier_without_fast_model_uses_main_stats(self):
+        pool = _pool("a")
+        provider = pool.providers[0]
+
+        async def fn(provider):
+            return provider.name
+
+        await pool.call(fn, tier=TIER_FAST)
+
+        self.assertFalse(pool.has_fast_tier())
+        self.assertEqual(provider.stats.samples, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,25 @@
+import threading
+import unittest
+from unittest import mock
+
+from app.sheets import client as sheets_client
+
+
+class SheetsClientThreadsTest(unittest.TestCase):
+    def test_each_thread_gets_its_own_service(self):
+        with mock.patch.object(sheets_client, "build", side_effect=lambda *a, **kw: object()) as build:
+            client = sheets_client.SheetsClient(creds=None)
+            main_service = client._service
+            self.assertIs(client._service, main_service)
+
+            seen = []
+            worker = threading.Thread(target=lambda: seen.append(client._service))
+            worker.start()
+            worker.join()
+
+        self.assertIsNot(seen[0], main_service)
+        self.assertEqual(build.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
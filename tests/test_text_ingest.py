@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+
+from app.services.outbox_service import OperationOutbox, OutboxReplayer
+from app.telegram.handlers import any_text_handler
+
+
+class _FakeMessage:
+    def __init__(self, text: str, message_id: int):
+        self.text = text
+        self.message_id = message_id
+        self.from_user = type("FakeUser", (), {"id": 1})()
+        self.answers = []
+
+    async def answer(self, text, reply_markup=None):
+        self.answers.append(text)
+
+
+class _FakeState:
+    async def get_state(self):
+        return None
+
+
+class _FakeCategoryRepo:
+    def list_active_or_cached(self):
+        return []
+
+
+class _RacingOutbox(OperationOutbox):
+    """Проверка дублей не видит операцию: второй update того же сообщения пришёл одновременно с первым."""
+
+    def contains(self, op_id):
+        return False
+
+
+class TextIngestTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.outbox = _RacingOutbox(os.path.join(self._tmp.name, "outbox.sqlite3"))
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    async def _send(self, text: str, message_id: int) -> _FakeMessage:
+        message = _FakeMessage(text, message_id)
+        await any_text_handler(
+            message,
+            journal_repo=None,
+            category_repo=_FakeCategoryRepo(),
+            outbox=self.outbox,
+            outbox_replayer=OutboxReplayer(self.outbox, journal_repo=None),
+            state=_FakeState(),
+            llm=None,
+            category_classifier=None,
+            alias_store=None,
+            example_index=None,
+        )
+        return message
+
+    async def test_ignored_outbox_insert_is_reported_as_duplicate(self):
+        first = await self._send("кофе 300", 7)
+        second = await self._send("кофе 300", 7)
+
+        self.assertNotIn("Дубль", first.answers[0])
+        self.assertEqual(second.answers, ["Это сообщение уже записано. Дубль пропущен ✅"])
+        self.assertEqual(self.outbox.unsent_count(), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+from app.llm.usage import (
+    KIND_LLM,
+    KIND_WHISPER,
+    OUTCOME_ERROR,
+    OUTCOME_SILENT,
+    OUTCOME_UNAVAILABLE,
+    CallUsage,
+    UsageStore,
+)
+
+
+class UsageStoreTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = UsageStore(os.path.join(self.tmp.name, "usage.sqlite3"))
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_calls_are_aggregated_per_day_user_and_outcome(self) -> None:
+        first = CallUsage(kind=KIND_LLM, tg_user_id=1, attempts=1, wall_s=0.5)
+        first.add_usage({"prompt_tokens": 300, "completion_tokens": 20})
+        second = CallUsage(kind=KIND_LLM, tg_user_id=1, attempts=2, wall_s=1.5)
+        second.add_usage(None, prompt_estimate=280, completion_estimate=15)
+        self.store.record(first, day="2026-02-09")
+        self.store.record(second, day="2026-02-09")
+        self.store.record(CallUsage(kind=KIND_LLM, tg_user_id=1, outcome=OUTCOME_UNAVAILABLE), day="2026-02-09")
+        self.store.record(CallUsage(kind=KIND_WHISPER, tg_user_id=2, attempts=1, audio_seconds=12), day="2026-02-09")
+
+        rows = {(r["tg_user_id"], r["kind"], r["outcome"]): r for r in self.store.dump(days=100000)}
+
+        ok = rows[(1, KIND_LLM, "ok")]
+        self.assertEqual((ok["calls"], ok["attempts"], ok["prompt_tokens"], ok["completion_tokens"]), (2, 3, 580, 35))
+        self.assertEqual(ok["estimated_calls"], 1)
+        self.assertEqual(ok["wall_max_s"], 1.5)
+        self.assertEqual(rows[(1, KIND_LLM, OUTCOME_UNAVAILABLE)]["calls"], 1)
+        self.assertEqual(rows[(2, KIND_WHISPER, "ok")]["audio_seconds"], 12)
+
+        self.assertEqual(len(self.store.dump(days=100000, tg_user_id=2)), 1)
+
+    def test_summary_counts_silent_voices_apart_from_errors(self) -> None:
+        today = datetime.now().strftime("%Y-%m-%d")
+        self.store.record(CallUsage(kind=KIND_WHISPER, tg_user_id=1, attempts=1), day=today)
+        self.store.record(CallUsage(kind=KIND_WHISPER, tg_user_id=1, outcome=OUTCOME_SILENT), day=today)
+        self.store.record(CallUsage(kind=KIND_WHISPER, tg_user_id=1, outcome=OUTCOME_SILENT), day=today)
+        self.store.record(CallUsage(kind=KIND_WHISPER, tg_user_id=1, outcome=OUTCOME_ERROR), day=today)
+        self.store.record(CallUsage(kind=KIND_LLM, tg_user_id=1, attempts=1), day=today)
+
+        lines = self.store.summary_text(days=1).splitlines()
+
+        self.assertIn(f"{today} · {KIND_WHISPER}: вызовов 4 (ошибок 1, без речи 2)", lines[2])
+        self.assertIn(f"{today} · {KIND_LLM}: вызовов 1 (ошибок 0)", lines[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import asyncio
+import unittest
+
+from app.services.voice_queue import VoiceQueue, VoiceQueueFullError
+
+
+class VoiceQueueTest(unittest.TestCase):
+    def test_limits_concurrency_and_depth(self) -> None:
+        async def scenario() -> tuple[int, list[int]]:
+            queue = VoiceQueue(workers=2, max_depth=3)
+            release = asyncio.Event()
+            running = 0
+            peak = 0
+            done: list[int] = []
+
+            def job(n: int):
+                async def run() -> None:
+                    nonlocal running, peak
+                    running += 1
+                    peak = max(peak, running)
+                    await release.wait()
+                    running -= 1
+                    done.append(n)
+
+                return run
+
+            worker = asyncio.create_task(queue.run())
+            queue.submit(job(1))
+            queue.submit(job(2))
+            while queue.busy < 2:  # ждём, пока оба обработчика возьмут задачи
+                await asyncio.sleep(0)
+            for n in (3, 4, 5):
+                queue.submit(job(n))
+            self.assertTrue(queue.full())
+            self.assertEqual(queue.waiting(), 4)
+            with self.assertRaises(VoiceQueueFullError):
+                queue.submit(job(6))
+
+            release.set()
+            await asyncio.wait_for(queue.join(), 1)
+            worker.cancel()
+            return peak, sorted(done)
+
+        peak, done = asyncio.run(scenario())
+        self.assertEqual(peak, 2)
+        self.assertEqual(done, [1, 2, 3, 4, 5])
+
+    def test_failed_job_does_not_stop_worker(self) -> None:
+        async def scenario() -> list[str]:
+            queue = VoiceQueue(workers=1, max_depth=5)
+            done: list[str] = []
+
+            async def broken() -> None:
+                raise RuntimeError("boom")
+
+            async def ok() -> None:
+                done.append("ok")
+
+            worker = asyncio.create_task(queue.run())
+            queue.submit(broken)
+            queue.submit(ok)
+            await asyncio.wait_for(queue.join(), 1)
+            worker.cancel()
+            return done
+
+        self.assertEqual(asyncio.run(scenario()), ["ok"])
+
+
+if __name__ == "__main__":
+    unittest.main()